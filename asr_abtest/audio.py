@@ -0,0 +1,257 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+from math import gcd
+from typing import BinaryIO, Optional, Tuple, Union
+
+import numpy as np
+
+# Whisper feature extractors all expect 16 kHz mono input
+SAMPLING_RATE = 16000
+
+# Size of the chunks fed to ffmpeg's stdin when decoding from a stream
+PIPE_CHUNK_SIZE = 1024 * 1024
+
+# Containers ffmpeg may need to seek in, so they aren't piped through stdin
+SEEKING_CONTAINERS = (".mp4", ".m4a", ".mpeg")
+
+AudioSource = Union[bytes, bytearray, str, BinaryIO]
+
+
+def _pcm_to_float(raw: bytes, sample_width: int) -> Optional[np.ndarray]:
+    if sample_width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if sample_width == 2:
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_width == 3:
+        # Sign-extend little-endian 24-bit samples into int32
+        triples = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = triples[:, 0] | (triples[:, 1] << 8) | (triples[:, 2] << 16)
+        samples = np.where(samples & 0x800000, samples - (1 << 24), samples)
+        return samples.astype(np.float32) / float(1 << 23)
+    if sample_width == 4:
+        return np.frombuffer(raw, dtype="<i4").astype(np.float32) / float(1 << 31)
+    return None
+
+
+def _resample(audio: np.ndarray, rate: int, sampling_rate: int) -> Optional[np.ndarray]:
+    try:
+        from scipy.signal import resample_poly
+    except ImportError:  # scipy is optional; such WAVs then go through ffmpeg
+        return None
+    divisor = gcd(rate, sampling_rate)
+    return resample_poly(audio, sampling_rate // divisor, rate // divisor)
+
+
+def _decode_wav(stream: BinaryIO, sampling_rate: int) -> Optional[np.ndarray]:
+    """Decode PCM WAV with NumPy; returns None when ffmpeg is needed instead"""
+    try:
+        with wave.open(stream, "rb") as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            rate = wav.getframerate()
+            raw = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+    audio = _pcm_to_float(raw, sample_width)
+    if audio is None:
+        return None
+    if channels > 1:
+        audio = audio[:len(audio) - len(audio) % channels].reshape(-1, channels).mean(axis=1)
+    if rate != sampling_rate:
+        audio = _resample(audio, rate, sampling_rate)
+        if audio is None:
+            return None
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def _ffmpeg_command(input_spec: str, sampling_rate: int) -> list:
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", input_spec,
+        "-ac", "1", "-ar", str(sampling_rate),
+        "-f", "f32le", "pipe:1",
+    ]
+
+
+def _run_ffmpeg(source: AudioSource, path: Optional[str], sampling_rate: int) -> Tuple[int, bytes, bytes]:
+    """Run ffmpeg on path, or pipe source through its stdin; returns (returncode, stdout, stderr)"""
+    try:
+        if path is not None:
+            proc = subprocess.run(_ffmpeg_command(path, sampling_rate),
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            return proc.returncode, proc.stdout, proc.stderr
+        if isinstance(source, (bytes, bytearray)):
+            proc = subprocess.run(_ffmpeg_command("pipe:0", sampling_rate), input=bytes(source),
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            return proc.returncode, proc.stdout, proc.stderr
+        proc = subprocess.Popen(_ffmpeg_command("pipe:0", sampling_rate),
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # The feeder owns stdin; communicate() would otherwise flush it as the feeder closes it
+        stdin, proc.stdin = proc.stdin, None
+
+        def feed():
+            try:
+                while True:
+                    chunk = source.read(PIPE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    stdin.write(chunk)
+            except BrokenPipeError:
+                pass
+            finally:
+                try:
+                    stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        # Feed stdin from a thread so a full stdout pipe can't deadlock us
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        output, errors = proc.communicate()
+        feeder.join()
+        return proc.returncode, output, errors
+    except FileNotFoundError as e:
+        raise ValueError("ffmpeg was not found but is required to decode this audio file") from e
+
+
+def _rewind(source: AudioSource) -> bool:
+    """Whether source can be read again from the start (and rewind it if so)"""
+    if isinstance(source, (bytes, bytearray)):
+        return True
+    seekable = getattr(source, "seekable", None)
+    if seekable is None or not seekable():
+        return False
+    source.seek(0)
+    return True
+
+
+def _spool_for_ffmpeg(source: AudioSource, suffix: Optional[str]) -> str:
+    """Copy bytes or a stream to a named temporary file (caller removes it) and return its path"""
+    with tempfile.NamedTemporaryFile(suffix=suffix or "", delete=False) as f:
+        if isinstance(source, (bytes, bytearray)):
+            f.write(source)
+        else:
+            shutil.copyfileobj(source, f, PIPE_CHUNK_SIZE)
+        return f.name
+
+
+def _ffmpeg_decode(source: AudioSource, sampling_rate: int, suffix: Optional[str] = None) -> np.ndarray:
+    """Decode anything ffmpeg understands, reading from a path or piping through stdin.
+
+    Containers ffmpeg has to seek in (mp4/m4a with the moov atom at the
+    end, as phones write them) can't be read from a pipe. Unnamed sources
+    with such a suffix go through a temporary file, as does any piped
+    source ffmpeg failed on that can be read again.
+    """
+    path = source if isinstance(source, str) else None
+    if path is None and not isinstance(source, (bytes, bytearray)):
+        # Files backed by a real on-disk name can be read by ffmpeg directly
+        name = getattr(source, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            path = name
+
+    spooled = None
+    try:
+        if path is None and suffix and suffix.lower() in SEEKING_CONTAINERS and _rewind(source):
+            spooled = path = _spool_for_ffmpeg(source, suffix)
+        returncode, output, errors = _run_ffmpeg(source, path, sampling_rate)
+        if returncode != 0 and path is None and _rewind(source):
+            spooled = _spool_for_ffmpeg(source, suffix)
+            returncode, output, errors = _run_ffmpeg(source, spooled, sampling_rate)
+    finally:
+        if spooled is not None:
+            os.remove(spooled)
+
+    if returncode != 0:
+        raise ValueError(f"ffmpeg could not decode audio: {errors.decode(errors='replace').strip()}")
+    audio = np.frombuffer(output, dtype=np.float32)
+    if audio.size == 0:
+        raise ValueError("Audio file is empty or could not be decoded")
+    return audio
+
+
+def decode_audio(source: AudioSource, sampling_rate: int = SAMPLING_RATE,
+                 suffix: Optional[str] = None) -> np.ndarray:
+    """Decode audio in memory to a mono float32 array at sampling_rate.
+
+    source may be encoded bytes, a file path or a binary file object, and
+    suffix the extension of its original file name. PCM WAV is decoded with
+    NumPy; other formats are piped through ffmpeg. Only containers ffmpeg
+    can't read from a pipe are written to a temporary file.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            audio = _decode_wav(f, sampling_rate)
+    elif isinstance(source, (bytes, bytearray)):
+        audio = _decode_wav(io.BytesIO(source), sampling_rate)
+    else:
+        source.seek(0)
+        audio = _decode_wav(source, sampling_rate)
+        source.seek(0)
+    if audio is not None:
+        return audio
+    return _ffmpeg_decode(source, sampling_rate, suffix)
+
+
+def _wav_duration(stream: BinaryIO) -> Optional[float]:
+    try:
+        with wave.open(stream, "rb") as wav:
+            rate = wav.getframerate()
+            return wav.getnframes() / rate if rate else None
+    except (wave.Error, EOFError):
+        return None
+
+
+def probe_duration(source: AudioSource) -> Optional[float]:
+    """Duration in seconds from the file header, without decoding the audio.
+
+    WAV headers are read directly; other formats ask ffprobe for the
+    container duration. Returns None when the duration can't be determined
+    cheaply (no ffprobe, streams without a usable file name, broken headers).
+    """
+    path = source if isinstance(source, str) else None
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            duration = _wav_duration(f)
+    elif isinstance(source, (bytes, bytearray)):
+        duration = _wav_duration(io.BytesIO(source))
+    else:
+        source.seek(0)
+        duration = _wav_duration(source)
+        source.seek(0)
+        name = getattr(source, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            path = name
+    if duration is not None:
+        return duration
+
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0"]
+    try:
+        if path is not None:
+            proc = subprocess.run(command + [path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        elif isinstance(source, (bytes, bytearray)):
+            proc = subprocess.run(command + ["pipe:0"], input=bytes(source),
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        else:
+            return None
+    except FileNotFoundError:
+        return None
+    try:
+        return float(proc.stdout.decode().strip()) if proc.returncode == 0 else None
+    except ValueError:
+        return None
+
+
+def pipeline_input(audio: np.ndarray, sampling_rate: int = SAMPLING_RATE) -> dict:
+    """Wrap a decoded array for the HF pipeline.
+
+    The pipeline pops keys from dict inputs, so build a fresh dict for every
+    call when the same array is fed to several models.
+    """
+    return {"raw": audio, "sampling_rate": sampling_rate}
@@ -1,4 +1,5 @@
 from .processor import BenchmarkProcessor
 from .evaluator import WERCalculator
+from .store import BenchmarkStore
 
-__all__ = ['BenchmarkProcessor', 'WERCalculator'] 
\ No newline at end of file
+__all__ = ['BenchmarkProcessor', 'WERCalculator', 'BenchmarkStore'] 
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""Memory-linear Levenshtein alignment used by the WER/CER calculator.
+
+Two engines are provided:
+
+* ``edit_distance`` uses Myers' bit-parallel algorithm on Python integers.
+  It only returns the distance but runs one big-integer pass per
+  hypothesis token, which makes it the fast path for CER over long texts.
+* ``edit_counts`` runs a NumPy two-row dynamic program that also carries
+  the substitution/deletion/insertion breakdown of one optimal alignment.
+
+Neither engine ever materialises the full ``len(ref) x len(hyp)`` matrix.
+"""
+from typing import Dict, Hashable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+
+class EditCounts(NamedTuple):
+    distance: int
+    substitutions: int
+    deletions: int
+    insertions: int
+    hits: int
+
+
+def _encode(reference: Sequence[Hashable], hypothesis: Sequence[Hashable]) -> Tuple[List[int], List[int]]:
+    """Map tokens of both sequences onto a shared integer vocabulary"""
+    vocab: Dict[Hashable, int] = {}
+    ref_ids = [vocab.setdefault(tok, len(vocab)) for tok in reference]
+    hyp_ids = [vocab.setdefault(tok, len(vocab)) for tok in hypothesis]
+    return ref_ids, hyp_ids
+
+
+def _trim_common_affixes(reference: Sequence, hypothesis: Sequence) -> Tuple[Sequence, Sequence, int]:
+    """Strip shared prefix/suffix, returning the trimmed pair and the hit count removed"""
+    start = 0
+    limit = min(len(reference), len(hypothesis))
+    while start < limit and reference[start] == hypothesis[start]:
+        start += 1
+    end_ref, end_hyp = len(reference), len(hypothesis)
+    while end_ref > start and end_hyp > start and reference[end_ref - 1] == hypothesis[end_hyp - 1]:
+        end_ref -= 1
+        end_hyp -= 1
+    trimmed = start + (len(reference) - end_ref)
+    return reference[start:end_ref], hypothesis[start:end_hyp], trimmed
+
+
+def edit_distance(reference: Sequence[Hashable], hypothesis: Sequence[Hashable]) -> int:
+    """Levenshtein distance using Myers' bit-parallel algorithm (O(n*m/w) time, O(n) memory)"""
+    reference, hypothesis, _ = _trim_common_affixes(reference, hypothesis)
+    n = len(reference)
+    if n == 0:
+        return len(hypothesis)
+    if not hypothesis:
+        return n
+
+    # One bitmask per distinct reference token marking where it occurs
+    peq: Dict[Hashable, int] = {}
+    for i, tok in enumerate(reference):
+        peq[tok] = peq.get(tok, 0) | (1 << i)
+
+    full = (1 << n) - 1
+    last = 1 << (n - 1)
+    pv = full
+    mv = 0
+    score = n
+    for tok in hypothesis:
+        eq = peq.get(tok, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        # Global alignment: the top row grows by one per hypothesis token
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+
+def edit_counts(reference: Sequence[Hashable], hypothesis: Sequence[Hashable]) -> EditCounts:
+    """Levenshtein distance plus S/D/I counts of one optimal alignment.
+
+    Rows walk the reference, the row vector spans the hypothesis. Only the
+    cost and deletion count are carried per cell; along any path to cell
+    ``(i, j)`` insertions minus deletions equals ``j - i``, so the remaining
+    counts follow from those two. The exact distance from ``edit_distance``
+    bounds how far an optimal path can stray from the main diagonal, so each
+    row only fills a band about ``distance`` cells wide.
+    """
+    reference, hypothesis, trimmed = _trim_common_affixes(reference, hypothesis)
+    n, m = len(reference), len(hypothesis)
+    if n == 0 or m == 0:
+        return EditCounts(n + m, 0, n, m, trimmed)
+
+    # A cell on diagonal x = j - i costs at least |x| + |(m - n) - x|, which
+    # must not exceed the final distance for the cell to lie on an optimal path.
+    delta = m - n
+    slack = (edit_distance(reference, hypothesis) - abs(delta)) // 2
+    band_lo = min(0, delta) - slack
+    band_hi = max(0, delta) + slack
+
+    ref_ids, hyp_ids = _encode(reference, hypothesis)
+    dtype = np.int32 if n + m < 2 ** 30 else np.int64
+    unreachable = np.iinfo(dtype).max // 2
+    hyp_arr = np.asarray(hyp_ids, dtype=dtype)
+    cols = np.arange(m + 1, dtype=dtype)
+    col_idx = np.arange(m + 1, dtype=np.intp)
+
+    cost = np.full(m + 1, unreachable, dtype=dtype)
+    cost[:band_hi + 1] = cols[:band_hi + 1]
+    dels = np.zeros(m + 1, dtype=dtype)
+
+    for i, tok in enumerate(ref_ids, start=1):
+        lo = max(0, i + band_lo)
+        hi = min(m, i + band_hi)
+        # Cells [lo, hi] of this row; the first one has no diagonal when lo == 0
+        first = max(lo, 1)
+        prev_cost = cost[first - 1:hi + 1].copy()
+        prev_dels = dels[first - 1:hi + 1].copy()
+
+        # Substitution/match from the diagonal, deletion from the row above
+        diag = prev_cost[:-1] + (hyp_arr[first - 1:hi] != tok)
+        up = prev_cost[1:] + 1
+        take_diag = diag <= up
+        row_cost = np.where(take_diag, diag, up)
+        row_dels = np.where(take_diag, prev_dels[:-1], prev_dels[1:] + 1)
+        if lo == 0:
+            row_cost = np.concatenate(([i], row_cost)).astype(dtype)
+            row_dels = np.concatenate(([i], row_dels)).astype(dtype)
+
+        # Insertions propagate left-to-right: cost[j] = min_k(c[k] + j - k),
+        # solved with a running minimum over c[k] - k.
+        shifted = row_cost - cols[lo:hi + 1]
+        running = np.minimum.accumulate(shifted)
+        source = np.maximum.accumulate(col_idx[:hi - lo + 1] * (shifted == running))
+        cost[lo:hi + 1] = running + cols[lo:hi + 1]
+        dels[lo:hi + 1] = row_dels[source]
+        if lo > 0:
+            cost[lo - 1] = unreachable
+
+    distance = int(cost[m])
+    deletions = int(dels[m])
+    insertions = deletions + m - n
+    substitutions = distance - deletions - insertions
+    hits = n - substitutions - deletions + trimmed
+    return EditCounts(distance, substitutions, deletions, insertions, hits)
@@ -0,0 +1,418 @@
+"""Offline benchmark runner for directories of audio and reference files.
+
+Audio files are paired with references by name, split into shards and run
+in separate worker processes, each with its own model copies and torch
+thread budget. Every shard streams its results to a JSON Lines file in the
+output directory as files finish; when all shards are done the results are
+aggregated into summary.json and archived in the benchmark store.
+
+    asr-abtest-bench data/nightly --format txt --model openai/whisper-small \\
+        --model NbAiLab/nb-whisper-small --workers 16 --threads-per-worker 4
+
+Rerunning with --resume and the same --output skips files that already
+have a result, so an interrupted nightly run picks up where it stopped.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from .comparison import build_comparison
+from .evaluator import WERCalculator
+from .processor import (build_transcription, generation_kwargs, model_configs, parse_reference,
+                        real_time_factor, transcribe_file)
+from .store import BenchmarkStore
+from ..audio import decode_audio, pipeline_input, probe_duration, SAMPLING_RATE
+from ..longform import long_form, cache_kwargs
+from ..vad import vad, cache_kwargs as vad_cache_kwargs
+from ..model_pool import model_pool, DEFAULT_MODEL_ID, PRECISIONS, cache_kwargs as precision_cache_kwargs
+from ..result_cache import result_cache, audio_digest, cache_key, DEFAULT_CACHE_DIR
+from ..snapshots import snapshots, prefetch, DEFAULT_SNAPSHOT_DIR
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.ogg')
+
+SUMMARY_NAME = "summary.json"
+
+# Rough bytes per second of audio (16 kHz 16-bit mono) for files whose
+# duration can't be probed, so they still get a sensible place in a shard
+FALLBACK_BYTES_PER_SEC = 32000
+
+
+def discover_pairs(audio_dir: str, reference_dir: Optional[str] = None,
+                   pattern: str = "{audio_file}.txt") -> Tuple[List[Dict], List[str]]:
+    """Find (audio, reference) pairs under audio_dir.
+
+    The reference for ``a/b/clip.wav`` is ``pattern`` with ``{audio_file}``
+    replaced by ``clip``, looked up in the same relative directory under
+    reference_dir (audio_dir itself by default). Durations are probed from
+    the file headers. Returns the pairs, keyed by the audio path relative to
+    audio_dir, and the audio files that had no reference.
+    """
+    reference_dir = reference_dir or audio_dir
+    pairs, missing = [], []
+    for root, _, names in os.walk(audio_dir):
+        for name in sorted(names):
+            if not name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            audio_path = os.path.join(root, name)
+            relative = os.path.relpath(audio_path, audio_dir)
+            stem = os.path.splitext(name)[0]
+            reference_path = os.path.join(reference_dir, os.path.dirname(relative), pattern.format(audio_file=stem))
+            if os.path.isfile(reference_path):
+                pairs.append({"file": relative, "audio": audio_path, "reference": reference_path,
+                              "size": os.path.getsize(audio_path), "duration": probe_duration(audio_path)})
+            else:
+                missing.append(relative)
+    pairs.sort(key=lambda pair: pair["file"])
+    return pairs, missing
+
+
+def _seconds(pair: Dict) -> float:
+    return pair["duration"] or pair["size"] / FALLBACK_BYTES_PER_SEC
+
+
+def shard_pairs(pairs: List[Dict], shards: int) -> List[List[Dict]]:
+    """Split pairs into shards of roughly equal total audio duration.
+
+    Longest files are placed first, each into the shard with the least audio
+    so far, which keeps the makespan close to optimal. Every shard is then
+    processed longest first as well.
+    """
+    buckets: List[List[Dict]] = [[] for _ in range(shards)]
+    loads = [0.0] * shards
+    for pair in sorted(pairs, key=_seconds, reverse=True):
+        index = loads.index(min(loads))
+        buckets[index].append(pair)
+        loads[index] += _seconds(pair)
+    return [bucket for bucket in buckets if bucket]
+
+
+def _shard_path(output_dir: str, index: int) -> str:
+    return os.path.join(output_dir, f"shard-{index:03d}.jsonl")
+
+
+def read_results(output_dir: str) -> List[Dict]:
+    """Result rows streamed so far by the shards of a run, one per (file, model).
+
+    A resumed run retries failed pairs, so a completed row replaces an
+    earlier error for the same pair.
+    """
+    latest: Dict[Tuple[str, str], Dict] = {}
+    for name in sorted(os.listdir(output_dir)):
+        if not (name.startswith("shard-") and name.endswith(".jsonl")):
+            continue
+        with open(os.path.join(output_dir, name)) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # Last line of a shard that was killed mid-write
+                    logger.warning(f"Skipping truncated line in {name}")
+                    continue
+                pair = (row["file"], row["label"])
+                if pair not in latest or row["status"] == "completed":
+                    latest[pair] = row
+    return sorted(latest.values(), key=lambda row: (row["file"], row["label"]))
+
+
+def _init_worker(threads: int, use_cache: bool, cache_dir: str, max_models: int, snapshot_dir: str) -> None:
+    """Per-process setup: torch thread budget, model pool size, snapshots and cache"""
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(max(1, threads // 2))
+    except RuntimeError:
+        # Only settable before the first parallel op; a fresh worker has run none
+        pass
+    model_pool.configure(max_models)
+    result_cache.configure(cache_dir=cache_dir, enabled=use_cache)
+    snapshots.configure(snapshot_dir)
+
+
+def _score(pair: Dict, audio, digest: str, reference_text: str, config: Dict) -> Dict:
+    """Transcribe one file with one model (or reuse a cached transcript) and score it"""
+    generate_kwargs = generation_kwargs(config)
+    long_params = long_form.params(pair["duration"], config.get("long_form"))
+    vad_params = vad.params(config.get("vad"))
+    precision = model_pool.resolve_precision(config.get("precision"))
+    key = cache_key(digest, config["model_id"], precision_cache_kwargs(
+        vad_cache_kwargs(cache_kwargs(generate_kwargs, long_params), vad_params), precision
+    ))
+    result = result_cache.get(key)
+    cached = result is not None
+    inference_time = 0.0
+    if not cached:
+        if audio[0] is None:
+            audio[0] = decode_audio(pair["audio"])
+        # Only the transcription is timed, so decoding isn't charged to whichever model missed first
+        start_time = time.time()
+        result = transcribe_file(config["model_id"], pipeline_input(audio[0]), generate_kwargs,
+                                 long_form=long_params, vad=vad_params, precision=precision)
+        inference_time = time.time() - start_time
+        result_cache.put(key, result)
+    duration = len(audio[0]) / SAMPLING_RATE if audio[0] is not None else pair["duration"]
+    transcription = build_transcription(result)
+    error_analysis = WERCalculator.analyze_errors(reference_text, transcription["text"])
+    return {
+        "file": pair["file"],
+        "label": config["label"],
+        "model_id": config["model_id"],
+        "status": "completed",
+        "wer": error_analysis["error_rate"],
+        "inference_time": inference_time,
+        "duration": duration,
+        "rtf": real_time_factor(inference_time, duration),
+        # Word timestamps are left out to keep shard files small
+        "transcription": {"text": transcription["text"]},
+        "reference": reference_text,
+        "error_analysis": error_analysis,
+        "cached": cached,
+        "precision": precision,
+        "speech_sec": result.get("speech_sec"),
+    }
+
+
+def run_shard(index: int, pairs: List[Dict], config: Dict, output_dir: str, done: Set[Tuple[str, str]]) -> int:
+    """Process one shard in a worker process, appending a JSON line per (file, model) as it finishes"""
+    configs = model_configs(config)
+    written = 0
+    with open(_shard_path(output_dir, index), "a") as out:
+        for pair in pairs:
+            todo = [c for c in configs if (pair["file"], c["label"]) not in done]
+            if not todo:
+                continue
+            rows = []
+            try:
+                with open(pair["reference"], "rb") as f:
+                    reference_text = parse_reference(f.read(), config["format"])
+                digest = audio_digest(pair["audio"])
+                audio = [None]  # decoded once, on the first cache miss, and shared by all models
+            except Exception as e:
+                rows = [{"file": pair["file"], "label": c["label"], "model_id": c["model_id"],
+                         "status": "error", "error": str(e)} for c in todo]
+            else:
+                for model_config in todo:
+                    try:
+                        rows.append(_score(pair, audio, digest, reference_text, model_config))
+                    except Exception as e:
+                        logger.error(f"[shard {index}] {pair['file']} with {model_config['label']}: {e}")
+                        rows.append({"file": pair["file"], "label": model_config["label"],
+                                     "model_id": model_config["model_id"], "status": "error", "error": str(e)})
+            for row in rows:
+                row["shard"] = index
+                out.write(json.dumps(row, default=float) + "\n")
+            out.flush()
+            written += len(rows)
+    return written
+
+
+def summarize(results: List[Dict], labels: List[str], total_files: int, elapsed: float) -> Dict:
+    """Per-model and comparison summary of a finished run"""
+    comparison = build_comparison(results, labels)
+    return {
+        "total_files": total_files,
+        "total_results": len(results),
+        "elapsed_sec": elapsed,
+        "models": labels,
+        "summary": comparison["summary"],
+        "comparison": comparison if len(labels) > 1 else None,
+    }
+
+
+def run(pairs: List[Dict], config: Dict, output_dir: str, workers: int, threads: int,
+        use_cache: bool = True, cache_dir: str = DEFAULT_CACHE_DIR, resume: bool = False,
+        snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> Dict:
+    """Shard pairs across worker processes, wait for them and aggregate their results"""
+    os.makedirs(output_dir, exist_ok=True)
+    configs = model_configs(config)
+    labels = [c["label"] for c in configs]
+    # Resolve snapshots once here instead of in every worker at the same time
+    snapshots.configure(snapshot_dir)
+    for model_id, error in prefetch(sorted({c["model_id"] for c in configs})).items():
+        logger.warning(f"Could not resolve a snapshot of {model_id}; its workers will fail to load it: {error}")
+    done: Set[Tuple[str, str]] = set()
+    if resume:
+        done = {(r["file"], r["label"]) for r in read_results(output_dir) if r.get("status") == "completed"}
+        logger.info(f"Resuming: {len(done)} (file, model) results already on disk")
+    else:
+        for name in os.listdir(output_dir):
+            if name.startswith("shard-") and name.endswith(".jsonl"):
+                os.remove(os.path.join(output_dir, name))
+
+    # Shard numbering continues after existing shard files so a resume never
+    # rewrites lines an earlier run streamed
+    first_shard = len([n for n in os.listdir(output_dir) if n.startswith("shard-")])
+    shards = shard_pairs(pairs, workers)
+    # Child processes inherit this, so OpenMP/MKL size their pools before torch loads
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+
+    start = time.time()
+    with ProcessPoolExecutor(
+        max_workers=len(shards),
+        # spawn, not fork: forked workers would inherit this process's torch state
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads, use_cache, cache_dir, len(labels), snapshot_dir),
+    ) as pool:
+        futures = {
+            pool.submit(run_shard, first_shard + i, shard, config, output_dir, done): first_shard + i
+            for i, shard in enumerate(shards)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                logger.info(f"Shard {index} finished: {future.result()} results")
+            except Exception as e:
+                logger.error(f"Shard {index} failed: {e}; rerun with --resume to retry its files")
+    elapsed = time.time() - start
+
+    results = read_results(output_dir)
+    summary = summarize(results, labels, len(pairs), elapsed)
+    summary["config"] = config
+    with open(os.path.join(output_dir, SUMMARY_NAME), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def archive(store: BenchmarkStore, run_id: str, config: Dict, results: List[Dict],
+            labels: List[str], total_files: int, start_time: str) -> None:
+    """Save a CLI run in the benchmark store next to runs started from the server"""
+    benchmark = {
+        "benchmark_id": run_id,
+        "status": "completed",
+        "total_files": total_files,
+        "results": results,
+        "config": config,
+        "start_time": start_time,
+        "end_time": datetime.now().isoformat(),
+    }
+    if len(labels) > 1:
+        benchmark["models"] = labels
+        benchmark["comparison"] = build_comparison(results, labels)
+    store.save_run(run_id, benchmark)
+
+
+def print_summary(summary: Dict) -> None:
+    print(f"\n{summary['total_files']} files, {summary['total_results']} results in {summary['elapsed_sec']:.1f}s")
+    print(f"{'model':<40} {'done':>6} {'failed':>6} {'mean_wer':>9} {'corpus_wer':>10} {'mean_cer':>9} "
+          f"{'infer_s':>8} {'rtf':>7}")
+    for label, row in summary["summary"].items():
+        cells = [f"{row[key]:>{width}.4f}" if row[key] is not None else f"{'-':>{width}}"
+                 for key, width in (("mean_wer", 9), ("corpus_wer", 10), ("mean_cer", 9),
+                                    ("mean_inference_time", 8), ("mean_rtf", 7))]
+        print(f"{label:<40} {row['files_completed']:>6} {row['files_failed']:>6} {' '.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ASR models on a directory of audio and reference files')
+    parser.add_argument('audio_dir', type=str,
+                        help='Directory searched recursively for audio files')
+    parser.add_argument('--references', type=str, default=None,
+                        help='Directory with the reference files, mirroring audio_dir (default: audio_dir)')
+    parser.add_argument('--format', type=str, choices=["txt", "json"], default="txt",
+                        help='Reference file format')
+    parser.add_argument('--pattern', type=str, default=None,
+                        help='Reference file name for an audio file, default "{audio_file}.<format>"')
+    parser.add_argument('--model', type=str, action='append', default=None,
+                        help=f'Model to benchmark; repeat to compare several (default {DEFAULT_MODEL_ID})')
+    parser.add_argument('--language', type=str, default=None,
+                        help='Language passed to the model')
+    parser.add_argument('--temperature', type=float, default=0.0,
+                        help='Sampling temperature')
+    parser.add_argument('--prompt', type=str, default=None,
+                        help='Prompt passed to the model')
+    parser.add_argument('--long-form', type=str, choices=["auto", "on", "off"], default="auto",
+                        help='Windowed long-form transcription: by duration (over 60 s), always or never')
+    parser.add_argument('--precision', type=str, choices=PRECISIONS, default="fp32",
+                        help='Precision to load the models with')
+    parser.add_argument('--compare-precisions', type=str, choices=PRECISIONS, nargs='+', default=None,
+                        help='Run every model once per listed precision as separate arms of the comparison')
+    parser.add_argument('--vad', action='store_true',
+                        help='Trim silence with energy-based VAD before inference')
+    parser.add_argument('--compare-vad', action='store_true',
+                        help='Run every model without and with VAD as two arms of the comparison')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes; each loads its own copy of every model')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='Torch threads per worker (default: CPU count / workers)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Directory for shard result files and summary.json '
+                             '(default: benchmark_results/bench_<timestamp>)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Keep results already in --output and only run what is missing')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help='Transcription cache directory shared with the server')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always run inference instead of reusing cached transcriptions')
+    parser.add_argument('--snapshot-dir', type=str, default=DEFAULT_SNAPSHOT_DIR,
+                        help='Local model snapshot directory shared with the server')
+    parser.add_argument('--store', type=str, default=os.path.join("benchmark_results", "benchmarks.db"),
+                        help='Benchmark store to archive the run in; empty to skip')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Only run the first N pairs (for smoke tests)')
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.resume and not args.output:
+        parser.error("--resume needs the --output directory of the run to continue")
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+
+    pairs, missing = discover_pairs(args.audio_dir, args.references, args.pattern or f"{{audio_file}}.{args.format}")
+    if missing:
+        logger.warning(f"{len(missing)} audio files have no reference and are skipped, e.g. {missing[0]}")
+    if args.limit:
+        pairs = pairs[:args.limit]
+    if not pairs:
+        parser.error(f"no audio/reference pairs found under {args.audio_dir}")
+
+    models = args.model or [DEFAULT_MODEL_ID]
+    config = {
+        "format": args.format,
+        "pattern": args.pattern or f"{{audio_file}}.{args.format}",
+        "model_id": models[0],
+        "language": args.language,
+        "temperature": args.temperature,
+        "prompt": args.prompt,
+        "use_cache": not args.no_cache,
+        "long_form": {"auto": None, "on": True, "off": False}[args.long_form],
+        "precision": args.precision,
+        "compare_precisions": args.compare_precisions,
+        "vad": args.vad,
+        "compare_vad": args.compare_vad,
+        "models": [{"model_id": model_id} for model_id in models],
+        "source": os.path.abspath(args.audio_dir),
+    }
+    start_time = datetime.now()
+    output_dir = args.output or os.path.join("benchmark_results", f"bench_{start_time.strftime('%Y-%m-%d_%H-%M-%S')}")
+    logger.info(f"Benchmarking {len(pairs)} files with {', '.join(models)} on {args.workers} workers "
+                f"x {threads} threads, writing to {output_dir}")
+
+    summary = run(pairs, config, output_dir, args.workers, threads,
+                  use_cache=not args.no_cache, cache_dir=args.cache_dir, resume=args.resume,
+                  snapshot_dir=args.snapshot_dir)
+    print_summary(summary)
+
+    if not any(row["files_completed"] for row in summary["summary"].values()):
+        sys.exit(1)
+    if args.store:
+        run_id = f"cli_{os.path.basename(os.path.normpath(output_dir))}"
+        archive(BenchmarkStore(args.store), run_id, config, read_results(output_dir),
+                summary["models"], len(pairs), start_time.isoformat())
+        print(f"Archived as {run_id} in {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from typing import Dict, List, Optional
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def _metrics(result: Dict) -> Dict:
+    return {
+        "wer": result["wer"],
+        "cer": result["error_analysis"]["cer"],
+        "inference_time": result["inference_time"],
+        "cached": bool(result.get("cached")),
+    }
+
+
+def build_comparison(results: List[Dict], labels: List[str]) -> Dict:
+    """Side-by-side table of a multi-model run.
+
+    ``results`` holds one row per (file, model) with a ``label`` field.
+    Paired deltas compare every model against the first label, using only
+    files that both models completed. Cached results ran no inference and
+    are left out of the latency and RTF figures.
+    """
+    by_file: Dict[str, Dict[str, Dict]] = {}
+    for result in results:
+        if result.get("status") == "completed":
+            by_file.setdefault(result["file"], {})[result["label"]] = _metrics(result)
+
+    summary = {}
+    for label in labels:
+        rows = [r for r in results if r.get("label") == label]
+        completed = [r for r in rows if r.get("status") == "completed"]
+        timed = [r for r in completed if not r.get("cached")]
+        total_errors = sum(r["error_analysis"]["total_errors"] for r in completed)
+        total_words = sum(r["error_analysis"]["total_words"] for r in completed)
+        summary[label] = {
+            "model_id": rows[0]["model_id"] if rows else None,
+            "files_completed": len(completed),
+            "files_failed": len(rows) - len(completed),
+            "files_cached": len(completed) - len(timed),
+            "mean_wer": _mean([r["wer"] for r in completed]),
+            "corpus_wer": total_errors / total_words if total_words else None,
+            "mean_cer": _mean([r["error_analysis"]["cer"] for r in completed]),
+            "mean_inference_time": _mean([r["inference_time"] for r in timed]),
+            "total_inference_time": sum(r["inference_time"] for r in timed),
+            "mean_rtf": _mean([r["rtf"] for r in timed if r.get("rtf") is not None]),
+        }
+
+    baseline = labels[0] if labels else None
+    paired_deltas = {}
+    for label in labels[1:]:
+        pairs = [(m[baseline], m[label]) for m in by_file.values() if baseline in m and label in m]
+        timed_pairs = [(a, b) for a, b in pairs if not a["cached"] and not b["cached"]]
+        paired_deltas[label] = {
+            "baseline": baseline,
+            "files": len(pairs),
+            "mean_wer_delta": _mean([b["wer"] - a["wer"] for a, b in pairs]),
+            "mean_cer_delta": _mean([b["cer"] - a["cer"] for a, b in pairs]),
+            "timed_files": len(timed_pairs),
+            "mean_inference_time_delta": _mean([b["inference_time"] - a["inference_time"] for a, b in timed_pairs]),
+            "wins": sum(1 for a, b in pairs if b["wer"] < a["wer"]),
+            "losses": sum(1 for a, b in pairs if b["wer"] > a["wer"]),
+            "ties": sum(1 for a, b in pairs if b["wer"] == a["wer"]),
+        }
+
+    return {
+        "models": labels,
+        "baseline": baseline,
+        "summary": summary,
+        "paired_deltas": paired_deltas,
+        "per_file": [{"file": name, "models": models} for name, models in by_file.items()],
+    }
+
+
+def comparison_rows(comparison: Dict) -> List[Dict]:
+    """Flatten per-file metrics into one wide row per file for Excel export"""
+    rows = []
+    for entry in comparison["per_file"]:
+        row = {"file": entry["file"]}
+        for label in comparison["models"]:
+            metrics = entry["models"].get(label, {})
+            for key in ("wer", "cer", "inference_time"):
+                row[f"{label} {key}"] = metrics.get(key)
+        rows.append(row)
+    return rows
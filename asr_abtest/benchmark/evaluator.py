@@ -1,4 +1,6 @@
 from typing import List, Dict
+from .alignment import edit_counts, edit_distance
+from ..metrics import stage
 
 class WERCalculator:
     @staticmethod
@@ -6,101 +8,47 @@ class WERCalculator:
         """Calculate Word Error Rate between two texts"""
         ref_words = reference.lower().split()
         hyp_words = hypothesis.lower().split()
-        
-        # Create matrix
-        d = [[0 for _ in range(len(ref_words) + 1)] 
-             for _ in range(len(hyp_words) + 1)]
-        
-        # Initialize first row and column
-        for i in range(len(hyp_words) + 1):
-            d[i][0] = i
-        for j in range(len(ref_words) + 1):
-            d[0][j] = j
-            
-        # Fill matrix
-        for i in range(1, len(hyp_words) + 1):
-            for j in range(1, len(ref_words) + 1):
-                if hyp_words[i-1] == ref_words[j-1]:
-                    d[i][j] = d[i-1][j-1]
-                else:
-                    d[i][j] = min(d[i-1][j], d[i][j-1], d[i-1][j-1]) + 1
-                    
-        return d[len(hyp_words)][len(ref_words)] / len(ref_words)
-    
+        if not ref_words:
+            return 1.0 if hyp_words else 0.0
+        return edit_distance(ref_words, hyp_words) / len(ref_words)
+
+    @staticmethod
+    def calculate_cer(reference: str, hypothesis: str) -> float:
+        """Calculate Character Error Rate between two texts"""
+        ref_chars = reference.lower()
+        hyp_chars = hypothesis.lower()
+        if not ref_chars:
+            return 1.0
+        return edit_distance(ref_chars, hyp_chars) / len(ref_chars)
+
     @staticmethod
     def analyze_errors(reference: str, hypothesis: str, include_cer: bool = True) -> Dict:
-        """Analyze types of errors in the transcription"""
-        ref_words = reference.lower().split()
-        hyp_words = hypothesis.lower().split()
-        
-        # Calculate character-level errors if requested
-        cer = 0
-        if include_cer:
-            ref_chars = list(reference.lower())
-            hyp_chars = list(hypothesis.lower())
-            d = [[0 for _ in range(len(ref_chars) + 1)] 
-                 for _ in range(len(hyp_chars) + 1)]
-            
-            # Initialize first row and column
-            for i in range(len(hyp_chars) + 1):
-                d[i][0] = i
-            for j in range(len(ref_chars) + 1):
-                d[0][j] = j
-            
-            # Fill matrix
-            for i in range(1, len(hyp_chars) + 1):
-                for j in range(1, len(ref_chars) + 1):
-                    if hyp_chars[i-1] == ref_chars[j-1]:
-                        d[i][j] = d[i-1][j-1]
-                    else:
-                        d[i][j] = min(d[i-1][j], d[i][j-1], d[i-1][j-1]) + 1
-            
-            cer = d[len(hyp_chars)][len(ref_chars)] / len(ref_chars) if ref_chars else 1.0
-        
-        # Initialize counters
-        substitutions = 0
-        deletions = 0
-        insertions = 0
-        
-        # Create alignment matrix
-        m = len(hyp_words) + 1
-        n = len(ref_words) + 1
-        d = [[0] * n for _ in range(m)]
-        
-        # Initialize first row and column
-        for i in range(m):
-            d[i][0] = i
-        for j in range(n):
-            d[0][j] = j
-        
-        # Fill the matrix and track operations
-        for i in range(1, m):
-            for j in range(1, n):
-                if hyp_words[i-1] == ref_words[j-1]:
-                    d[i][j] = d[i-1][j-1]
-                else:
-                    substitution = d[i-1][j-1] + 1
-                    deletion = d[i-1][j] + 1
-                    insertion = d[i][j-1] + 1
-                    d[i][j] = min(substitution, deletion, insertion)
-                    
-                    # Count error types
-                    if d[i][j] == substitution:
-                        substitutions += 1
-                    elif d[i][j] == deletion:
-                        deletions += 1
-                    else:
-                        insertions += 1
-        
-        total_errors = substitutions + deletions + insertions
-        total_words = len(ref_words)
-        
-        return {
-            "total_errors": total_errors,
-            "total_words": total_words,
-            "substitutions": substitutions,
-            "deletions": deletions,
-            "insertions": insertions,
-            "error_rate": total_errors / total_words if total_words > 0 else 1.0,
-            "cer": cer
-        } 
\ No newline at end of file
+        """Analyze types of errors in the transcription.
+
+        Runs one alignment pass per token level: a counting pass over words
+        (giving WER and the S/D/I breakdown) and a distance-only pass over
+        characters for CER.
+        """
+        with stage("scoring"):
+            ref_words = reference.lower().split()
+            hyp_words = hypothesis.lower().split()
+
+            # Calculate character-level errors if requested
+            cer = 0
+            if include_cer:
+                cer = WERCalculator.calculate_cer(reference, hypothesis)
+
+            counts = edit_counts(ref_words, hyp_words)
+            total_errors = counts.distance
+            total_words = len(ref_words)
+
+            return {
+                "total_errors": total_errors,
+                "total_words": total_words,
+                "substitutions": counts.substitutions,
+                "deletions": counts.deletions,
+                "insertions": counts.insertions,
+                "hits": counts.hits,
+                "error_rate": total_errors / total_words if total_words > 0 else 1.0,
+                "cer": cer
+            }
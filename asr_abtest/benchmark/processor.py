@@ -1,21 +1,290 @@
 import asyncio
+import base64
+import heapq
+import itertools
 import json
 import os
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from uuid import uuid4
 import time
 from .evaluator import WERCalculator
-import torch
-from transformers import pipeline, AutoTokenizer
+from .comparison import build_comparison, comparison_rows
+from .store import BenchmarkStore
+from ..audio import decode_audio, pipeline_input, probe_duration, SAMPLING_RATE
+from ..executor import inference_executor
+from ..longform import long_form, cache_kwargs, transcribe_windows
+from ..vad import vad as vad_settings, apply_vad, restore_timestamps, NO_SPEECH_RESULT
+from ..vad import cache_kwargs as vad_cache_kwargs
+from ..model_pool import model_pool, cancellable, DEFAULT_MODEL_ID
+from ..model_pool import cache_kwargs as precision_cache_kwargs
+from ..result_cache import result_cache, audio_digest, cache_key
+from ..metrics import stage, record_rtf
+from ..profiling import profiling, run_profiled
 import shutil
 import logging
-import pandas as pd
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class BenchmarkCancelled(Exception):
+    """Raised when inference is interrupted because its benchmark was stopped"""
+
+def transcribe_file(model_id: str, audio: Any, generate_kwargs: Dict,
+                    cancel_event: Optional[threading.Event] = None,
+                    long_form: Optional[Dict] = None, vad: Optional[Dict] = None,
+                    precision: Optional[str] = None) -> Dict:
+    """Blocking model load + inference, run on the inference executor.
+
+    audio is a decoded pipeline input dict (or anything else the pipeline
+    accepts). Models come from
+    the process-wide model pool, so the server and the benchmark share
+    loaded weights; process-pool workers have their own pool. Setting
+    cancel_event stops decoding at the next step and raises
+    BenchmarkCancelled instead of returning a truncated transcript.
+    With long_form (transcribe_windows arguments) the recording is cut
+    into overlapping windows that are decoded in batches and stitched.
+    With vad (apply_vad settings) only the detected speech is transcribed
+    and the result carries ``speech_sec``. precision picks the pooled
+    copy of the model (None: the pool default).
+    """
+    return transcribe_files(model_id, [audio], generate_kwargs, cancel_event, long_form, vad, precision)[0]
+
+def transcribe_files(model_id: str, inputs: List[Any], generate_kwargs: Dict,
+                     cancel_event: Optional[threading.Event] = None,
+                     long_form: Optional[Dict] = None, vad: Optional[Dict] = None,
+                     precision: Optional[str] = None) -> List[Dict]:
+    """transcribe_file for several inputs, run through the pipeline as one padded batch.
+
+    long_form only applies to a single input, which is batched by window instead.
+    """
+    if cancel_event is not None:
+        if cancel_event.is_set():
+            raise BenchmarkCancelled("Benchmark was stopped")
+        generate_kwargs = cancellable(generate_kwargs, cancel_event)
+    
+    layouts: List[Optional[Dict]] = [None] * len(inputs)
+    if vad:
+        inputs = list(inputs)
+        with stage("vad"):
+            for i, audio in enumerate(inputs):
+                trimmed, layouts[i] = apply_vad(audio["raw"], vad, audio["sampling_rate"])
+                inputs[i] = pipeline_input(trimmed, audio["sampling_rate"])
+    # Recordings without any detected speech need no inference at all
+    speech = [i for i, audio in enumerate(inputs) if not isinstance(audio, dict) or len(audio["raw"])]
+    results: List[Dict] = [dict(NO_SPEECH_RESULT) for _ in inputs]
+    
+    if speech:
+        transcriber = model_pool.get(model_id, precision=precision)
+        with stage("inference", model_id):
+            if long_form and len(inputs) == 1:
+                outputs = [transcribe_windows(transcriber, inputs[0]["raw"], generate_kwargs, **long_form)]
+            elif len(speech) == 1:
+                outputs = [transcriber(
+                    inputs[speech[0]],
+                    return_timestamps="word",
+                    generate_kwargs=generate_kwargs
+                )]
+            else:
+                outputs = list(transcriber(
+                    [inputs[i] for i in speech],
+                    batch_size=len(speech),
+                    return_timestamps="word",
+                    generate_kwargs=generate_kwargs
+                ))
+        for i, output in zip(speech, outputs):
+            results[i] = output
+    if cancel_event is not None and cancel_event.is_set():
+        raise BenchmarkCancelled("Benchmark was stopped")
+    
+    for i, layout in enumerate(layouts):
+        if layout is not None:
+            results[i] = {**restore_timestamps(results[i], layout), "speech_sec": layout["speech_sec"]}
+    return results
+
+def timed_decode(source) -> Any:
+    """decode_audio, recorded as the decode stage"""
+    with stage("decode"):
+        return decode_audio(source)
+
+def length_buckets(file_contents: List[Dict], batch_size: int, max_ratio: float = 2.0,
+                   solo: Optional[Callable[[Dict], bool]] = None) -> List[List[Dict]]:
+    """Group file pairs into batches of similar probed duration, longest batch first.
+
+    A batch holds at most batch_size files and its longest file is at most
+    max_ratio times its shortest, so little compute goes to padding. Files
+    whose duration is unknown, and files for which solo is true (long-form
+    recordings batch their own windows), run one by one.
+    """
+    known = sorted((fp for fp in file_contents if fp["audio"].get("duration")),
+                   key=lambda fp: fp["audio"]["duration"], reverse=True)
+    batches: List[List[Dict]] = []
+    for file_pair in known:
+        batch = batches[-1] if batches else None
+        if solo is not None and solo(file_pair):
+            batches.append([file_pair])
+            batches.append([])  # nothing joins a solo batch
+            continue
+        if (batch and len(batch) < batch_size
+                and batch[0]["audio"]["duration"] <= max_ratio * file_pair["audio"]["duration"]):
+            batch.append(file_pair)
+        else:
+            batches.append([file_pair])
+    batches.extend([fp] for fp in file_contents if not fp["audio"].get("duration"))
+    return [batch for batch in batches if batch]
+
+def real_time_factor(inference_time: float, duration: Optional[float]) -> Optional[float]:
+    """Seconds of compute per second of audio (below 1 is faster than real time)"""
+    return inference_time / duration if duration else None
+
+def parse_reference(truth_content: bytes, fmt: str) -> str:
+    """Extract the reference text from a ground truth file"""
+    if fmt == 'json':
+        logger.info("Parsing JSON ground truth...")
+        truth_data = json.loads(truth_content.decode('utf-8'))
+        logger.info(f"Parsed JSON data: {truth_data}")
+        # Handle different possible JSON structures
+        if isinstance(truth_data, dict):
+            reference_text = (
+                truth_data.get('text') or 
+                truth_data.get('transcript') or 
+                truth_data.get('transcription', '')
+            )
+        elif isinstance(truth_data, list) and truth_data:
+            # If it's a list, try to get text from first item
+            reference_text = (
+                truth_data[0].get('text') or
+                truth_data[0].get('transcript') or
+                truth_data[0].get('transcription', '')
+            )
+        else:
+            reference_text = ''
+        
+        if not reference_text:
+            logger.error(f"Could not find text in JSON: {truth_data}")
+            raise ValueError("No text field found in JSON ground truth")
+    else:  # txt format
+        reference_text = truth_content.decode('utf-8')
+    logger.info(f"Reference text length: {len(reference_text)}")
+    return reference_text
+
+def generation_kwargs(config: Dict) -> Dict:
+    """Pipeline generate_kwargs for a benchmark (or per-model) config"""
+    generate_kwargs = {
+        "task": "transcribe",
+        "language": config.get('language'),
+        "temperature": config.get('temperature', 0.0),
+    }
+    if config.get('prompt'):
+        generate_kwargs["prompt"] = config['prompt']
+    return generate_kwargs
+
+def project_fields(result: Dict, fields: List[str]) -> Dict:
+    """Copy only the given fields of a result; dotted names reach into nested dicts"""
+    projected: Dict = {}
+    for field in fields:
+        value: Any = result
+        parts = field.split(".")
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
+
+def running_stats(results: List[Dict]) -> Dict:
+    """Counts and running means over the results finished so far.
+
+    Cached results ran no inference, so they count towards accuracy but
+    not towards latency and RTF.
+    """
+    completed = [r for r in results if r.get("status") == "completed"]
+    count = len(completed)
+    timed = [r for r in completed if not r.get("cached")]
+    rtfs = [r["rtf"] for r in timed if r.get("rtf") is not None]
+    return {
+        "files_completed": count,
+        "files_failed": len(results) - count,
+        "files_cached": count - len(timed),
+        "mean_wer": sum(r["wer"] for r in completed) / count if count else None,
+        "mean_cer": sum(r["error_analysis"]["cer"] for r in completed) / count if count else None,
+        "mean_inference_time": sum(r["inference_time"] for r in timed) / len(timed) if timed else None,
+        "mean_rtf": sum(rtfs) / len(rtfs) if rtfs else None,
+    }
+
+def build_transcription(result: Dict) -> Dict:
+    """Turn raw pipeline output into text plus cleaned-up word timestamps"""
+    # Process words
+    words = []
+    if isinstance(result, dict) and "chunks" in result:
+        for chunk in result["chunks"]:
+            if "text" in chunk and "timestamp" in chunk:
+                words.append({
+                    "text": chunk["text"].strip(),
+                    "start": chunk["timestamp"][0],
+                    "end": chunk["timestamp"][1] if chunk["timestamp"][1] is not None else -1
+                })
+    
+    # Filter and fix timestamps
+    words = [w for w in words if w["text"].strip()]
+    for i in range(len(words)-1):
+        if words[i]["end"] == -1:
+            words[i]["end"] = words[i+1]["start"]
+    if words and words[-1]["end"] == -1:
+        words[-1]["end"] = words[-1]["start"] + 0.5
+    
+    return {
+        "text": result["text"],
+        "words": words
+    }
+
+def _arm_label(model: Dict) -> str:
+    if model.get("label"):
+        return model["label"]
+    return f"{model['model_id']} ({model['precision']})" if model.get("precision") else model["model_id"]
+
+def model_configs(config: Dict) -> List[Dict]:
+    """Expand the models list of a comparison config into full per-model configs.
+
+    Per-model fields left unset inherit from the benchmark config, and each
+    entry gets a unique label (the model id, plus its precision if one is
+    set, unless a label is given). With ``compare_precisions`` every model
+    is run once per listed precision, with ``compare_vad`` once without and
+    once with VAD.
+    """
+    models = config.get("models") or []
+    if config.get("compare_precisions") or config.get("compare_vad"):
+        models = models or [{"model_id": config["model_id"]}]
+    if config.get("compare_precisions"):
+        models = [{**model, "precision": precision, "label": f"{_arm_label(model)} ({precision})"}
+                  for model in models for precision in config["compare_precisions"]]
+    if config.get("compare_vad"):
+        models = [{**model, "vad": vad, "label": f"{_arm_label(model)} ({name})"}
+                  for model in models
+                  for vad, name in ((False, "no VAD"), (True, "VAD"))]
+    expanded = []
+    seen = {}
+    for model in models:
+        merged = {k: v for k, v in config.items() if k not in ("models", "compare_vad", "compare_precisions")}
+        merged.update({k: v for k, v in model.items() if v is not None})
+        label = _arm_label(model)
+        seen[label] = seen.get(label, 0) + 1
+        if seen[label] > 1:
+            label = f"{label} #{seen[label]}"
+        merged["label"] = label
+        expanded.append(merged)
+    return expanded
+
+# Written into a run's spool directory so the run can be resumed after a restart
+MANIFEST_NAME = "manifest.json"
+
 class BenchmarkProcessor:
     def __init__(self):
         self.active_benchmarks: Dict[str, Dict] = {}
@@ -23,7 +292,30 @@ class BenchmarkProcessor:
         self.temp_dir = "temp_audio_files"
         os.makedirs(self.results_dir, exist_ok=True)
         os.makedirs(self.temp_dir, exist_ok=True)
+        self.store = BenchmarkStore(os.path.join(self.results_dir, "benchmarks.db"))
+        # Per-run JSON/Excel dumps next to the store, off unless asked for
+        self.export_files = False
         self.wer_calculator = WERCalculator()
+        # Progress event queues of connected clients, per benchmark
+        self._listeners: Dict[str, List[asyncio.Queue]] = {}
+        # Finished runs still held in memory, least recently used first: id -> (last used, approx bytes).
+        # Everything in here is already archived in the store and can be dropped.
+        self._finished: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self.max_finished_runs = 20
+        self.max_finished_idle_sec: Optional[float] = 3600.0
+        self.max_finished_bytes: Optional[int] = 256 * 1024 * 1024
+        # Run scheduling: at most max_concurrent_runs run at once, the rest wait
+        # in a (priority, FIFO) heap with their files until a slot frees up
+        self.max_concurrent_runs = 1
+        # Single-model runs send files of similar length to the pipeline together
+        self.batch_size = 8
+        self._run_queue: List[Tuple[int, int, str]] = []
+        self._queued_jobs: Dict[str, Tuple[List[Dict], Optional[str]]] = {}
+        self._run_tasks: Dict[str, asyncio.Task] = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._job_counter = itertools.count()
+        # (file index, label) pairs a resumed run already completed before the restart
+        self._resume_skip: Dict[str, set] = {}
         self.transcriber = None
         self.current_model_id = None
         logger.info("BenchmarkProcessor initialized")
@@ -51,27 +343,27 @@ class BenchmarkProcessor:
         # Use default model if none specified
         model_id = model_id or "openai/whisper-small"
         logger.info(f"Using model: {model_id}")
-        
-        if model_id != self.current_model_id:
-            print(f"Loading model: {model_id}")
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            tokenizer = AutoTokenizer.from_pretrained(model_id, use_fast=False)
-            
-            self.transcriber = pipeline("automatic-speech-recognition", 
-                                      model=model_id,
-                                      tokenizer=tokenizer,
-                                      chunk_length_s=30,
-                                      return_timestamps="word",
-                                      device=device)
-            self.current_model_id = model_id
-            print(f"Model loaded successfully: {model_id}")
+        self.transcriber = model_pool.get(model_id)
+        self.current_model_id = model_id
         return self.transcriber
     
-    async def start_benchmark(self, file_contents: List[Dict], config: Dict) -> str:
-        """Start a new benchmark process"""
+    async def start_benchmark(self, file_contents: List[Dict], config: Dict,
+                              spool_dir: Optional[str] = None, priority: int = 0) -> str:
+        """Queue a new benchmark process; it starts as soon as a run slot is free.
+
+        Each file pair's audio is either raw bytes under ``content`` or a
+        spooled file under ``path``. Spooled files are deleted as soon as the
+        run is done with them, and ``spool_dir`` is removed when it finishes.
+        Until then ``spool_dir`` holds a manifest and each finished file is
+        checkpointed to the store, so an interrupted run can be resumed.
+        Higher priority runs leave the queue first, equal priorities in order.
+        """
         benchmark_id = str(uuid4())
+        self._evict_finished()
         self.active_benchmarks[benchmark_id] = {
-            "status": "running",
+            "benchmark_id": benchmark_id,
+            "status": "queued",
+            "priority": priority,
             "progress": 0,
             "current_file": None,
             "total_files": len(file_contents),
@@ -80,164 +372,909 @@ class BenchmarkProcessor:
             "start_time": datetime.now().isoformat()
         }
         
-        # Start processing in background
-        asyncio.create_task(self._process_files(benchmark_id, file_contents))
+        # Register the run so per-file checkpoints can be written, and record
+        # how to rebuild it from the spool directory after a restart
+        benchmark = self.active_benchmarks[benchmark_id]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.store.save_run, benchmark_id, dict(benchmark), False)
+        if spool_dir:
+            await loop.run_in_executor(None, self._write_manifest, spool_dir, benchmark, file_contents)
         
+        self._enqueue(benchmark_id, file_contents, spool_dir, priority)
         return benchmark_id
     
+    def _enqueue(self, benchmark_id: str, file_contents: List[Dict], spool_dir: Optional[str], priority: int) -> None:
+        self._queued_jobs[benchmark_id] = (file_contents, spool_dir)
+        heapq.heappush(self._run_queue, (-priority, next(self._job_counter), benchmark_id))
+        self._dispatch()
+    
+    @staticmethod
+    def _write_manifest(spool_dir: str, benchmark: Dict, file_contents: List[Dict]) -> None:
+        """Checkpoint of everything but results needed to resume a run from its spool directory"""
+        files = []
+        for file_pair in file_contents:
+            files.append({
+                "audio": {
+                    "filename": file_pair["audio"]["filename"],
+                    "path": os.path.basename(file_pair["audio"]["path"]) if "path" in file_pair["audio"] else None,
+                },
+                "truth": {
+                    "filename": file_pair["truth"]["filename"],
+                    "content": base64.b64encode(file_pair["truth"]["content"]).decode("ascii"),
+                },
+            })
+        manifest = {
+            "benchmark_id": benchmark["benchmark_id"],
+            "config": benchmark["config"],
+            "priority": benchmark.get("priority", 0),
+            "start_time": benchmark["start_time"],
+            "files": files,
+        }
+        tmp_path = os.path.join(spool_dir, f"{MANIFEST_NAME}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(spool_dir, MANIFEST_NAME))
+    
+    def _dispatch(self) -> None:
+        """Start queued runs while run slots are free"""
+        while self._run_queue and len(self._run_tasks) < self.max_concurrent_runs:
+            _, _, benchmark_id = heapq.heappop(self._run_queue)
+            file_contents, spool_dir = self._queued_jobs.pop(benchmark_id)
+            benchmark = self.active_benchmarks[benchmark_id]
+            benchmark["status"] = "running"
+            benchmark["run_start_time"] = datetime.now().isoformat()
+            self._cancel_events[benchmark_id] = threading.Event()
+            self._run_tasks[benchmark_id] = asyncio.create_task(
+                self._process_files(benchmark_id, file_contents, spool_dir)
+            )
+            self._publish(benchmark, {"event": "run_started", "benchmark_id": benchmark_id})
+    
+    def queue_position(self, benchmark_id: str) -> Optional[int]:
+        """1-based position of a queued run, None once it has started"""
+        for position, (_, _, queued_id) in enumerate(sorted(self._run_queue), start=1):
+            if queued_id == benchmark_id:
+                return position
+        return None
+    
     def get_status(self, benchmark_id: str) -> Dict:
-        """Get current status of a benchmark process"""
-        if benchmark_id not in self.active_benchmarks:
-            raise KeyError(f"Benchmark {benchmark_id} not found")
-        return self.active_benchmarks[benchmark_id]
+        """Get current status of a benchmark process.
+
+        Finished runs that were evicted from memory are reloaded from the
+        benchmark store (without word timestamps) and kept hot again. That
+        read blocks, so async callers await ensure_loaded first.
+        """
+        self._evict_finished(keep=benchmark_id)
+        if benchmark_id in self.active_benchmarks:
+            if benchmark_id in self._finished:
+                self._finished[benchmark_id] = (time.time(), self._finished[benchmark_id][1])
+                self._finished.move_to_end(benchmark_id)
+            return self.active_benchmarks[benchmark_id]
+        return self._hold_archived(benchmark_id, self.store.load_benchmark(benchmark_id))
     
-    def stop_benchmark(self, benchmark_id: str) -> None:
-        """Stop a running benchmark process"""
+    async def ensure_loaded(self, benchmark_id: str) -> None:
+        """Reload an evicted run from the store off the event loop; raises KeyError for unknown runs"""
         if benchmark_id in self.active_benchmarks:
-            self.active_benchmarks[benchmark_id]["status"] = "stopped"
+            return
+        benchmark = await asyncio.get_running_loop().run_in_executor(None, self.store.load_benchmark, benchmark_id)
+        # Another request may have reloaded it meanwhile
+        if benchmark_id not in self.active_benchmarks:
+            self._hold_archived(benchmark_id, benchmark)
+    
+    def _hold_archived(self, benchmark_id: str, benchmark: Dict) -> Dict:
+        """Keep a run reloaded from the store in memory as a finished run"""
+        if benchmark["status"] in ("queued", "running"):
+            # Archived mid-run by a server that is gone; resume_benchmark picks it up
+            benchmark["status"] = "interrupted"
+        self.active_benchmarks[benchmark_id] = benchmark
+        self._finished[benchmark_id] = (time.time(), self._approx_nbytes(benchmark))
+        self._evict_finished(keep=benchmark_id)
+        return benchmark
+    
+    @staticmethod
+    def _approx_nbytes(benchmark: Dict) -> int:
+        """Rough in-memory footprint of a run, dominated by transcripts and word lists"""
+        total = 0
+        for result in benchmark["results"]:
+            transcription = result.get("transcription") or {}
+            total += 512 + 2 * (len(transcription.get("text") or "") + len(result.get("reference") or ""))
+            total += 200 * len(transcription.get("words") or [])
+        return total
+    
+    def _evict_finished(self, keep: Optional[str] = None) -> None:
+        """Drop archived runs from memory by count, idle time and size budget, least recently used first"""
+        now = time.time()
+        total_bytes = sum(nbytes for _, nbytes in self._finished.values())
+        for benchmark_id, (last_used, nbytes) in list(self._finished.items()):
+            over_count = len(self._finished) > self.max_finished_runs
+            too_old = self.max_finished_idle_sec is not None and now - last_used > self.max_finished_idle_sec
+            over_bytes = self.max_finished_bytes is not None and total_bytes > self.max_finished_bytes
+            if not (over_count or too_old or over_bytes):
+                break
+            if benchmark_id == keep or self._listeners.get(benchmark_id):
+                continue
+            del self._finished[benchmark_id]
+            self.active_benchmarks.pop(benchmark_id, None)
+            total_bytes -= nbytes
+            logger.info(f"Evicted finished benchmark {benchmark_id} from memory")
+    
+    def get_summary(self, benchmark_id: str) -> Dict:
+        """Status, progress and running metrics of a benchmark without its per-file results"""
+        benchmark = self.get_status(benchmark_id)
+        summary = {
+            "benchmark_id": benchmark_id,
+            "status": benchmark["status"],
+            "progress": benchmark["progress"],
+            "current_file": benchmark["current_file"],
+            "total_files": benchmark["total_files"],
+            "results_available": len(benchmark["results"]),
+            "priority": benchmark.get("priority", 0),
+            "queue_position": self.queue_position(benchmark_id),
+            "resumed": benchmark.get("resumed", False),
+            "start_time": benchmark["start_time"],
+            "end_time": benchmark.get("end_time"),
+            "total_audio_sec": benchmark.get("total_audio_sec"),
+            "models": benchmark.get("models"),
+            **running_stats(benchmark["results"]),
+        }
+        if benchmark.get("models"):
+            summary["per_model"] = {
+                label: running_stats([r for r in benchmark["results"] if r.get("label") == label])
+                for label in benchmark["models"]
+            }
+        if "comparison" in benchmark:
+            summary["comparison"] = {
+                key: benchmark["comparison"][key] for key in ("baseline", "summary", "paired_deltas")
+            }
+        return summary
+    
+    def get_results(self, benchmark_id: str, offset: int = 0, limit: Optional[int] = 100,
+                    fields: Optional[List[str]] = None, status: Optional[str] = None,
+                    label: Optional[str] = None) -> Dict:
+        """A page of per-file results, optionally filtered and projected to some fields"""
+        results = self.get_status(benchmark_id)["results"]
+        if status is not None or label is not None:
+            results = [
+                r for r in results
+                if (status is None or r.get("status") == status) and (label is None or r.get("label") == label)
+            ]
+        page = results[offset:offset + limit] if limit is not None else results[offset:]
+        if fields:
+            page = [project_fields(r, fields) for r in page]
+        return {
+            "benchmark_id": benchmark_id,
+            "total": len(results),
+            "offset": offset,
+            "limit": limit,
+            "results": page,
+        }
+    
+    def progress_snapshot(self, benchmark_id: str) -> Dict:
+        """The summary as the first event of a progress stream"""
+        return {"event": "snapshot", **self.get_summary(benchmark_id)}
+    
+    def subscribe(self, benchmark_id: str) -> asyncio.Queue:
+        """Queue receiving this benchmark's progress events until unsubscribe"""
+        self.get_status(benchmark_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(benchmark_id, []).append(queue)
+        return queue
+    
+    def unsubscribe(self, benchmark_id: str, queue: asyncio.Queue) -> None:
+        listeners = self._listeners.get(benchmark_id, [])
+        if queue in listeners:
+            listeners.remove(queue)
+        if not listeners:
+            self._listeners.pop(benchmark_id, None)
+    
+    def _publish(self, benchmark: Dict, event: Dict) -> None:
+        """Push a progress event to every client following this benchmark"""
+        for queue in self._listeners.get(benchmark["benchmark_id"], []):
+            queue.put_nowait(event)
+    
+    def _file_started(self, benchmark: Dict, filename: str, progress: int) -> None:
+        benchmark["current_file"] = filename
+        benchmark["progress"] = progress
+        self._publish(benchmark, {"event": "file_started", "file": filename, "progress": progress})
+    
+    async def _file_finished(self, benchmark: Dict, file_pair: Dict, result: Dict) -> None:
+        """Record and checkpoint a file result and publish its metrics (no transcripts or word lists)"""
+        # Names can repeat within a run; resume tells files apart by their index
+        result["file_index"] = file_pair["index"]
+        benchmark["results"].append(result)
+        if result["status"] == "completed" and not result.get("cached"):
+            record_rtf(result.get("model_id") or benchmark["config"].get("model_id", ""), "benchmark",
+                       result["inference_time"], result.get("duration"))
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.store.append_result, benchmark["benchmark_id"], benchmark, result
+            )
+        except Exception as e:
+            logger.warning(f"Could not checkpoint {result['file']} of {benchmark['benchmark_id']}: {e}")
+        event = {
+            "event": "file_finished",
+            "file": result["file"],
+            "status": result["status"],
+            "index": len(benchmark["results"]) - 1,
+        }
+        for key in ("label", "model_id", "wer", "inference_time", "cached", "profile_id", "error"):
+            if key in result:
+                event[key] = result[key]
+        if "error_analysis" in result:
+            event["cer"] = result["error_analysis"]["cer"]
+        self._publish(benchmark, event)
+    
+    async def stop_benchmark(self, benchmark_id: str) -> None:
+        """Stop a queued or running benchmark process.
+
+        A queued run is dropped from the queue. A running run stops decoding
+        at the next step of the file in flight (thread executor; process
+        workers finish that file in the background) and keeps the results it
+        already has.
+        """
+        await self.ensure_loaded(benchmark_id)
+        benchmark = self.get_status(benchmark_id)
+        if benchmark["status"] == "queued":
+            benchmark["status"] = "stopped"
+            self._run_queue = [entry for entry in self._run_queue if entry[2] != benchmark_id]
+            heapq.heapify(self._run_queue)
+            file_contents, spool_dir = self._queued_jobs.pop(benchmark_id)
+            self._release_files(file_contents, spool_dir)
+            await self._finish_run(benchmark_id)
+        elif benchmark["status"] == "running":
+            benchmark["status"] = "stopped"
+            self._cancel_events[benchmark_id].set()
+            self._run_tasks[benchmark_id].cancel()
+        elif benchmark["status"] == "interrupted":
+            # Give up on resuming: drop the checkpoint and archive what was done
+            checkpoint = self._find_checkpoint(benchmark_id)
+            if checkpoint:
+                shutil.rmtree(checkpoint[0], ignore_errors=True)
+            benchmark["status"] = "stopped"
+            await self._finish_run(benchmark_id)
+    
+    def _checkpoints(self) -> List[Tuple[str, Dict]]:
+        """(spool dir, manifest) of every run whose spooled files are still on disk"""
+        checkpoints = []
+        if not os.path.isdir(self.temp_dir):
+            return checkpoints
+        for name in sorted(os.listdir(self.temp_dir)):
+            spool_dir = os.path.join(self.temp_dir, name)
+            try:
+                with open(os.path.join(spool_dir, MANIFEST_NAME)) as f:
+                    checkpoints.append((spool_dir, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return checkpoints
+    
+    def _find_checkpoint(self, benchmark_id: str) -> Optional[Tuple[str, Dict]]:
+        for spool_dir, manifest in self._checkpoints():
+            if manifest.get("benchmark_id") == benchmark_id:
+                return spool_dir, manifest
+        return None
+    
+    def resumable_runs(self) -> List[Dict]:
+        """Checkpointed runs that are not queued or running in this process"""
+        runs = []
+        for _, manifest in self._checkpoints():
+            benchmark_id = manifest["benchmark_id"]
+            if benchmark_id in self._queued_jobs or benchmark_id in self._run_tasks:
+                continue
+            runs.append({
+                "benchmark_id": benchmark_id,
+                "start_time": manifest["start_time"],
+                "total_files": len(manifest["files"]),
+                "priority": manifest.get("priority", 0),
+            })
+        return runs
+    
+    async def resume_benchmark(self, benchmark_id: str, priority: Optional[int] = None) -> str:
+        """Queue an interrupted run again, skipping the files it already finished.
+
+        The run keeps its id. Results checkpointed before the interruption are
+        reloaded from the store; only (file, model) pairs without one are run.
+        Raises KeyError if no checkpoint exists and ValueError if the run is
+        still queued or running here.
+        """
+        if benchmark_id in self._queued_jobs or benchmark_id in self._run_tasks:
+            raise ValueError(f"Benchmark {benchmark_id} is already {self.active_benchmarks[benchmark_id]['status']}")
+        checkpoint = self._find_checkpoint(benchmark_id)
+        if checkpoint is None:
+            raise KeyError(benchmark_id)
+        spool_dir, manifest = checkpoint
+        
+        file_contents = []
+        for entry in manifest["files"]:
+            audio = {"filename": entry["audio"]["filename"]}
+            if entry["audio"]["path"]:
+                audio["path"] = os.path.join(spool_dir, entry["audio"]["path"])
+            file_contents.append({
+                "audio": audio,
+                "truth": {
+                    "filename": entry["truth"]["filename"],
+                    "content": base64.b64decode(entry["truth"]["content"]),
+                },
+            })
+        
+        loop = asyncio.get_running_loop()
+        try:
+            previous = await loop.run_in_executor(None, self.store.load_benchmark, benchmark_id)
+            results = [r for r in previous["results"] if r["status"] == "completed"]
+        except KeyError:
+            results = []
+        # Failed files are retried; completed ones are carried over. Rows
+        # checkpointed without an index are matched by name where that is unique.
+        names = Counter(entry["audio"]["filename"] for entry in manifest["files"])
+        unique_names = {entry["audio"]["filename"]: index for index, entry in enumerate(manifest["files"])
+                        if names[entry["audio"]["filename"]] == 1}
+        self._resume_skip[benchmark_id] = {
+            (r["file_index"] if r.get("file_index") is not None else unique_names.get(r["file"]), r.get("label"))
+            for r in results
+        }
+        
+        priority = manifest.get("priority", 0) if priority is None else priority
+        self._finished.pop(benchmark_id, None)
+        self.active_benchmarks[benchmark_id] = {
+            "benchmark_id": benchmark_id,
+            "status": "queued",
+            "priority": priority,
+            "progress": 0,
+            "current_file": None,
+            "total_files": len(file_contents),
+            "results": results,
+            "config": manifest["config"],
+            "start_time": manifest["start_time"],
+            "resumed": True
+        }
+        # Rewrite the stored run so it holds exactly the carried-over results
+        await loop.run_in_executor(None, self.store.save_run, benchmark_id, dict(self.active_benchmarks[benchmark_id]))
+        logger.info(f"Resuming benchmark {benchmark_id}: {len(results)} results carried over")
+        
+        self._enqueue(benchmark_id, file_contents, spool_dir, priority)
+        return benchmark_id
+    
+    async def resume_interrupted(self) -> List[str]:
+        """Resume every checkpointed run, e.g. on startup after a crash"""
+        resumed = []
+        for run in self.resumable_runs():
+            try:
+                resumed.append(await self.resume_benchmark(run["benchmark_id"]))
+            except Exception as e:
+                logger.error(f"Could not resume benchmark {run['benchmark_id']}: {e}", exc_info=True)
+        return resumed
+    
+    def _release_files(self, file_contents: List[Dict], spool_dir: Optional[str]) -> None:
+        for file_pair in file_contents:
+            self._release_audio(file_pair)
+        if spool_dir:
+            shutil.rmtree(spool_dir, ignore_errors=True)
     
-    async def _process_files(self, benchmark_id: str, file_contents: List[Dict]) -> None:
+    async def _process_files(self, benchmark_id: str, file_contents: List[Dict],
+                             spool_dir: Optional[str] = None) -> None:
         """Process all files in the benchmark"""
         benchmark = self.active_benchmarks[benchmark_id]
-        total_files = len(file_contents)
+        # Position in the upload (and manifest) order identifies a file across a resume
+        for index, file_pair in enumerate(file_contents):
+            file_pair["index"] = index
         
-        for i, file_pair in enumerate(file_contents):
-            if benchmark["status"] == "stopped":
-                break
-                
-            benchmark["current_file"] = file_pair["audio"]["filename"]
-            benchmark["progress"] = int((i / total_files) * 100)
+        try:
+            try:
+                # Header-only probe: orders the work and gives each result its real-time factor
+                await asyncio.get_running_loop().run_in_executor(None, self._probe_durations, file_contents)
+                benchmark["total_audio_sec"] = sum(fp["audio"].get("duration") or 0.0 for fp in file_contents)
+                config = benchmark["config"]
+                if config.get("models") or config.get("compare_vad") or config.get("compare_precisions"):
+                    await self._process_comparison(benchmark, file_contents)
+                else:
+                    await self._process_single_model(benchmark, file_contents)
+            except (asyncio.CancelledError, BenchmarkCancelled):
+                # Cancelled by stop_benchmark; anything else (e.g. shutdown) propagates
+                if benchmark["status"] != "stopped":
+                    raise
             
+            # Files skipped by a stop are still on disk. An interrupted run
+            # never gets here, so it keeps its spooled files and manifest.
+            self._release_files(file_contents, spool_dir)
+            await self._finish_run(benchmark_id)
+        finally:
+            self._run_tasks.pop(benchmark_id, None)
+            self._cancel_events.pop(benchmark_id, None)
+            self._resume_skip.pop(benchmark_id, None)
+            self._dispatch()
+    
+    async def _finish_run(self, benchmark_id: str) -> None:
+        """Mark a run finished, notify followers and archive it"""
+        benchmark = self.active_benchmarks[benchmark_id]
+        if benchmark["status"] != "stopped":
+            benchmark["status"] = "completed"
+            benchmark["progress"] = 100
+        benchmark["current_file"] = None
+        benchmark["end_time"] = datetime.now().isoformat()
+        if benchmark.get("models") and "comparison" not in benchmark:
+            # Stopped comparison runs still get a table of what finished
+            benchmark["comparison"] = build_comparison(benchmark["results"], benchmark["models"])
+        self._publish(benchmark, {**self.progress_snapshot(benchmark_id), "event": "run_finished"})
+        
+        # Archive the run off the event loop; only archived runs may leave memory
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._save_results, benchmark_id)
+        except Exception as e:
+            logger.error(f"Failed to archive benchmark {benchmark_id}, keeping it in memory: {e}", exc_info=True)
+            return
+        self._finished[benchmark_id] = (time.time(), self._approx_nbytes(benchmark))
+        self._evict_finished()
+    
+    async def _process_single_model(self, benchmark: Dict, file_contents: List[Dict]) -> None:
+        """Run every file through the one model in the benchmark config.
+
+        Files are bucketed by duration and each bucket is transcribed as one
+        batch. Buckets run longest first, up to one per inference worker at a
+        time, so the longest recordings don't end up alone at the tail.
+        """
+        total_files = len(file_contents)
+        skip = self._resume_skip.get(benchmark["benchmark_id"], set())
+        pending = []
+        for file_pair in file_contents:
+            if (file_pair["index"], None) in skip:
+                self._release_audio(file_pair)
+            else:
+                pending.append(file_pair)
+        cancel_event = self._cancel_events.get(benchmark["benchmark_id"])
+        slots = asyncio.Semaphore(max(1, inference_executor.workers))
+        
+        async def run_batch(batch: List[Dict]) -> None:
+            async with slots:
+                if benchmark["status"] == "stopped":
+                    return
+                for file_pair in batch:
+                    self._file_started(benchmark, file_pair["audio"]["filename"],
+                                       int((len(benchmark["results"]) / total_files) * 100))
+                outcomes = await self._process_batch(batch, benchmark["config"], cancel_event)
+                for file_pair, outcome in zip(batch, outcomes):
+                    if isinstance(outcome, BenchmarkCancelled):
+                        raise outcome
+                    if isinstance(outcome, Exception):
+                        print(f"Error processing {file_pair['audio']['filename']}: {str(outcome)}")
+                        outcome = {
+                            "file": file_pair["audio"]["filename"],
+                            "status": "error",
+                            "error": str(outcome)
+                        }
+                    await self._file_finished(benchmark, file_pair, outcome)
+                    # Not released when cancelled: an interrupted run resumes from this file
+                    self._release_audio(file_pair)
+        
+        tasks = [asyncio.ensure_future(run_batch(batch))
+                 for batch in length_buckets(pending, max(1, self.batch_size),
+                                             solo=lambda fp: self._inference_options(fp, benchmark["config"])["long_form"] is not None)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _process_batch(self, batch: List[Dict], config: Dict,
+                             cancel_event: Optional[threading.Event] = None) -> List[Any]:
+        """Transcribe a bucket of files in one pipeline call and score each file.
+
+        Returns a result or the exception that failed it, per file. Cached
+        files skip inference; the batch's inference time is split across the
+        rest in proportion to their duration. If the batch call itself fails,
+        its files are retried one by one so one bad file can't fail the rest.
+        """
+        loop = asyncio.get_running_loop()
+        outcomes: List[Any] = [None] * len(batch)
+        references: Dict[int, str] = {}
+        for i, file_pair in enumerate(batch):
             try:
-                result = await self._process_single_file(file_pair, benchmark["config"])
-                benchmark["results"].append(result)
+                references[i] = parse_reference(file_pair["truth"]["content"], config["format"])
             except Exception as e:
-                print(f"Error processing {file_pair['audio']['filename']}: {str(e)}")
-                benchmark["results"].append({
-                    "file": file_pair["audio"]["filename"],
-                    "status": "error",
-                    "error": str(e)
-                })
+                outcomes[i] = e
         
-        # Save final results
-        benchmark["status"] = "completed"
-        benchmark["progress"] = 100
-        benchmark["current_file"] = None
-        benchmark["end_time"] = datetime.now().isoformat()
+        # Files the probe couldn't time are alone in their batch (see length_buckets); decode them first
+        predecoded: Dict[int, Any] = {}
+        for i in list(references):
+            try:
+                decoded_audio = await self._decode_unprobed(batch[i])
+            except Exception as e:
+                outcomes[i] = e
+                del references[i]
+                continue
+            if decoded_audio is not None:
+                predecoded[i] = decoded_audio
+        
+        live = list(references)
+        lookups = await asyncio.gather(*[self._cache_lookup(batch[i], [config]) for i in live],
+                                       return_exceptions=True)
+        keys: Dict[int, Optional[str]] = {}
+        raw: Dict[int, Dict] = {}
+        for i, lookup in zip(live, lookups):
+            if isinstance(lookup, Exception):
+                outcomes[i] = lookup
+                continue
+            keys[i] = lookup[0][0]
+            if lookup[1][0] is not None:
+                raw[i] = lookup[1][0]
+        cached = set(raw)
+        # Decided on the probed (or decoded) duration, like the cache keys
+        options = {i: self._inference_options(batch[i], config) for i in keys}
+        
+        misses = [i for i in keys if i not in raw]
+        audio: Dict[int, Any] = {i: predecoded[i] for i in misses if i in predecoded}
+        misses = [i for i in misses if i not in audio]
+        decoded = await asyncio.gather(
+            *[loop.run_in_executor(None, timed_decode, self._audio_source(batch[i])) for i in misses],
+            return_exceptions=True
+        )
+        for i, result in zip(misses, decoded):
+            if isinstance(result, Exception):
+                outcomes[i] = result
+            else:
+                audio[i] = result
+                # The decoded length is exact; the probe only read a header
+                batch[i]["audio"]["duration"] = len(result) / SAMPLING_RATE
+        
+        inference_time: Dict[int, float] = {i: 0.0 for i in raw}
+        batch_sizes: Dict[int, int] = {}
+        todo = list(audio)
+        if todo:
+            start_time = time.time()
+            try:
+                # Long-form files are always alone in their batch (see length_buckets)
+                results = await self._transcribe_many(
+                    [keys[i] for i in todo], config.get("model_id"), [audio[i] for i in todo],
+                    generation_kwargs(config), cancel_event,
+                    options[todo[0]] if len(todo) == 1 else {**options[todo[0]], "long_form": None},
+                    self._profile_context(config, [batch[i]["audio"]["filename"] for i in todo])
+                )
+            except BenchmarkCancelled:
+                raise
+            except Exception as e:
+                if len(todo) == 1:
+                    outcomes[todo[0]] = e
+                    todo = []
+                else:
+                    logger.warning(f"Batch of {len(todo)} failed ({e}), retrying files one by one")
+                    for i in todo:
+                        start_time = time.time()
+                        try:
+                            raw[i] = (await self._transcribe_many([keys[i]], config.get("model_id"), [audio[i]],
+                                                                  generation_kwargs(config), cancel_event,
+                                                                  options[i]))[0]
+                            inference_time[i] = time.time() - start_time
+                            batch_sizes[i] = 1
+                        except BenchmarkCancelled:
+                            raise
+                        except Exception as file_error:
+                            outcomes[i] = file_error
+                    todo = []
+            else:
+                elapsed = time.time() - start_time
+                total_audio = sum(len(audio[i]) for i in todo)
+                for i, result in zip(todo, results):
+                    raw[i] = result
+                    inference_time[i] = elapsed * len(audio[i]) / total_audio if total_audio else elapsed / len(todo)
+                    batch_sizes[i] = len(todo)
         
-        # Save to file
-        self._save_results(benchmark_id)
+        for i, result in raw.items():
+            try:
+                transcription = build_transcription(result)
+                error_analysis = await loop.run_in_executor(
+                    None, self.wer_calculator.analyze_errors, references[i], transcription['text']
+                )
+            except Exception as e:
+                outcomes[i] = e
+                continue
+            duration = batch[i]["audio"].get("duration")
+            outcomes[i] = {
+                "file": batch[i]["audio"]["filename"],
+                "status": "completed",
+                "wer": error_analysis["error_rate"],
+                "inference_time": inference_time[i],
+                "duration": duration,
+                "rtf": real_time_factor(inference_time[i], duration),
+                "batch_size": batch_sizes.get(i, 0),
+                "long_form": options[i]["long_form"] is not None,
+                "precision": options[i]["precision"],
+                "speech_sec": result.get("speech_sec"),
+                "profile_id": result.get("profile_id"),
+                "transcription": transcription,
+                "reference": references[i],
+                "error_analysis": error_analysis,
+                "cached": i in cached
+            }
+        return outcomes
     
-    async def _process_single_file(self, file_pair: Dict, config: Dict) -> Dict:
-        """Process a single file pair and evaluate results"""
+    @staticmethod
+    def _probe_durations(file_contents: List[Dict]) -> None:
+        """Fill in each file's duration from its header where it isn't known yet"""
+        for file_pair in file_contents:
+            audio = file_pair["audio"]
+            if audio.get("duration") is None and ("path" in audio or "content" in audio):
+                try:
+                    audio["duration"] = probe_duration(audio["path"] if "path" in audio else audio["content"])
+                except OSError:
+                    audio["duration"] = None
+    
+    @staticmethod
+    def _release_audio(file_pair: Dict) -> None:
+        """Free a file's audio once the run no longer needs it"""
+        audio = file_pair["audio"]
+        audio.pop("content", None)
+        path = audio.pop("path", None)
+        if path and os.path.exists(path):
+            os.remove(path)
+    
+    @staticmethod
+    def _audio_source(file_pair: Dict):
+        """Spooled path or raw bytes of a file pair's audio, for decode_audio"""
+        audio = file_pair["audio"]
+        return audio["path"] if "path" in audio else audio["content"]
+    
+    async def _process_comparison(self, benchmark: Dict, file_contents: List[Dict]) -> None:
+        """Run every file through several models and build a side-by-side comparison.
+
+        Each file is decoded once and the shared audio is fanned out to the
+        models in parallel (bounded by the inference executor). When there are
+        more models than the model pool holds, models are processed in groups
+        of pool size so files don't force a reload per model; audio is then
+        decoded once per group.
+        """
+        configs = model_configs(benchmark["config"])
+        labels = [c["label"] for c in configs]
+        group_size = max(1, model_pool.max_models)
+        groups = [configs[i:i + group_size] for i in range(0, len(configs), group_size)]
+        total_steps = len(groups) * len(file_contents)
+        benchmark["models"] = labels
+        loop = asyncio.get_running_loop()
+        cancel_event = self._cancel_events.get(benchmark["benchmark_id"])
+        skip = self._resume_skip.get(benchmark["benchmark_id"], set())
+        
+        step = 0
+        for group_index, all_models in enumerate(groups):
+            last_group = group_index == len(groups) - 1
+            for file_pair in file_contents:
+                if benchmark["status"] == "stopped":
+                    break
+                filename = file_pair["audio"]["filename"]
+                step += 1
+                # Models a resumed run already finished for this file are not rerun
+                group = [c for c in all_models if (file_pair["index"], c["label"]) not in skip]
+                if not group:
+                    if last_group:
+                        self._release_audio(file_pair)
+                    continue
+                self._file_started(benchmark, filename, int(((step - 1) / total_steps) * 100))
+                
+                try:
+                    reference_text = parse_reference(file_pair["truth"]["content"], benchmark["config"]["format"])
+                    audio = await self._decode_unprobed(file_pair)
+                    keys, cached = await self._cache_lookup(file_pair, group)
+                    # Only decode when at least one model actually has to run
+                    if audio is None and any(result is None for result in cached):
+                        audio = await loop.run_in_executor(None, timed_decode, self._audio_source(file_pair))
+                except Exception as e:
+                    logger.error(f"Error preparing {filename}: {str(e)}", exc_info=True)
+                    rows = [e] * len(group)
+                else:
+                    rows = await asyncio.gather(
+                        *[self._transcribe_and_score(filename, audio, reference_text, c, key, result, cancel_event,
+                                                     file_pair["audio"].get("duration"), self._inference_options(file_pair, c))
+                          for c, key, result in zip(group, keys, cached)],
+                        return_exceptions=True
+                    )
+                
+                for model_config, row in zip(group, rows):
+                    if isinstance(row, BenchmarkCancelled):
+                        raise row
+                    if isinstance(row, Exception):
+                        row = {
+                            "file": filename,
+                            "label": model_config["label"],
+                            "model_id": model_config["model_id"],
+                            "status": "error",
+                            "error": str(row)
+                        }
+                    await self._file_finished(benchmark, file_pair, row)
+                
+                if last_group:
+                    self._release_audio(file_pair)
+        
+        benchmark["comparison"] = build_comparison(benchmark["results"], labels)
+    
+    async def _decode_unprobed(self, file_pair: Dict) -> Optional[Any]:
+        """Decode a file whose header gave no duration, so the long-form choice and cache keys see its length.
+
+        Returns the decoded audio for reuse, or None when the duration was already known.
+        """
+        if file_pair["audio"].get("duration") is not None:
+            return None
+        audio = await asyncio.get_running_loop().run_in_executor(None, timed_decode, self._audio_source(file_pair))
+        file_pair["audio"]["duration"] = len(audio) / SAMPLING_RATE
+        return audio
+    
+    @staticmethod
+    def _inference_options(file_pair: Dict, config: Dict) -> Dict[str, Any]:
+        """Long-form and VAD settings (None where they're off) and precision for a file under a config"""
+        return {
+            "long_form": long_form.params(file_pair["audio"].get("duration"), config.get("long_form")),
+            "vad": vad_settings.params(config.get("vad")),
+            "precision": model_pool.resolve_precision(config.get("precision")),
+        }
+    
+    @staticmethod
+    def _cache_kwargs(generate_kwargs: Dict, options: Dict[str, Any]) -> Dict:
+        return precision_cache_kwargs(
+            vad_cache_kwargs(cache_kwargs(generate_kwargs, options["long_form"]), options["vad"]), options["precision"]
+        )
+    
+    async def _cache_lookup(self, file_pair: Dict, configs: List[Dict]) -> Tuple[List[Optional[str]], List[Optional[Dict]]]:
+        """Cache keys and cached pipeline results (None on a miss) for one file under each config"""
+        if not result_cache.enabled or not all(c.get('use_cache', True) for c in configs):
+            return [None] * len(configs), [None] * len(configs)
+        loop = asyncio.get_running_loop()
+        digest = await loop.run_in_executor(None, audio_digest, self._audio_source(file_pair))
+        keys = [cache_key(digest, c.get('model_id') or DEFAULT_MODEL_ID,
+                          self._cache_kwargs(generation_kwargs(c), self._inference_options(file_pair, c)))
+                for c in configs]
+        cached = await loop.run_in_executor(None, lambda: [result_cache.get(key) for key in keys])
+        return keys, cached
+    
+    @staticmethod
+    async def _run_inference(function: Callable, args: tuple, options: Optional[Dict],
+                             profile: Optional[Dict]) -> Tuple[Any, Optional[str]]:
+        """function(*args, **options) on the inference executor, and the profile_id if it was profiled.
+
+        profile is what the report is saved with; None (or no free
+        profiling slot) runs the call as usual.
+        """
+        if profile is None or profiling.acquire() is not None:
+            return await inference_executor.run(function, *args, **(options or {})), None
+        try:
+            result, report = await inference_executor.run(run_profiled, function, *args, **(options or {}))
+            profile_id = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: profiling.save(report, **profile)
+            )
+        finally:
+            profiling.release()
+        return result, profile_id
+    
+    @staticmethod
+    def _profile_context(config: Dict, files: List[str]) -> Optional[Dict]:
+        """What a profiled inference call of a run is saved with, or None when the run doesn't profile"""
+        if not config.get("profile"):
+            return None
+        return {"source": "benchmark", "label": config.get("label"), "model_id": config.get("model_id"),
+                "files": files}
+    
+    async def _transcribe(self, key: Optional[str], model_id: str, audio, generate_kwargs: Dict,
+                          cancel_event: Optional[threading.Event] = None,
+                          options: Optional[Dict] = None, profile: Optional[Dict] = None) -> Dict:
+        """Run inference on decoded audio and cache the raw result under key.
+
+        A profiled result carries the ``profile_id`` of its report.
+        """
+        if inference_executor.mode != "thread":
+            # Events don't cross into process workers; those finish the file after a stop
+            cancel_event = None
+        result, profile_id = await self._run_inference(
+            transcribe_file, (model_id, pipeline_input(audio), generate_kwargs, cancel_event), options, profile
+        )
+        if key is not None:
+            await asyncio.get_running_loop().run_in_executor(None, result_cache.put, key, result)
+        return {**result, "profile_id": profile_id} if profile_id else result
+    
+    async def _transcribe_many(self, keys: List[Optional[str]], model_id: str, audios: List[Any],
+                               generate_kwargs: Dict, cancel_event: Optional[threading.Event] = None,
+                               options: Optional[Dict] = None, profile: Optional[Dict] = None) -> List[Dict]:
+        """_transcribe for a batch of decoded files in one pipeline call, profiled as one"""
+        if inference_executor.mode != "thread":
+            cancel_event = None
+        results, profile_id = await self._run_inference(
+            transcribe_files, (model_id, [pipeline_input(audio) for audio in audios], generate_kwargs, cancel_event),
+            options, profile
+        )
+        loop = asyncio.get_running_loop()
+        for key, result in zip(keys, results):
+            if key is not None:
+                await loop.run_in_executor(None, result_cache.put, key, result)
+        return [{**result, "profile_id": profile_id} for result in results] if profile_id else results
+    
+    async def _transcribe_and_score(self, filename: str, audio, reference_text: str, config: Dict,
+                                    key: Optional[str] = None, cached: Optional[Dict] = None,
+                                    cancel_event: Optional[threading.Event] = None,
+                                    duration: Optional[float] = None, options: Optional[Dict] = None) -> Dict:
+        """Transcribe already-decoded audio with one model (unless cached) and score it"""
         start_time = time.time()
-        temp_audio = None
+        result = cached
+        if result is None:
+            result = await self._transcribe(key, config["model_id"], audio, generation_kwargs(config), cancel_event,
+                                            options, self._profile_context(config, [filename]))
+        # Latency here is inference only, decoding is shared across models
+        inference_time = time.time() - start_time
+        duration = len(audio) / SAMPLING_RATE if audio is not None else duration
+        transcription = build_transcription(result)
+        error_analysis = await asyncio.get_running_loop().run_in_executor(
+            None, self.wer_calculator.analyze_errors, reference_text, transcription['text']
+        )
+        return {
+            "file": filename,
+            "label": config["label"],
+            "model_id": config["model_id"],
+            "status": "completed",
+            "wer": error_analysis["error_rate"],
+            "inference_time": inference_time,
+            "duration": duration,
+            "rtf": real_time_factor(inference_time, duration),
+            "transcription": transcription,
+            "reference": reference_text,
+            "error_analysis": error_analysis,
+            "cached": cached is not None,
+            "long_form": (options or {}).get("long_form") is not None,
+            "precision": (options or {}).get("precision"),
+            "speech_sec": result.get("speech_sec"),
+            "profile_id": result.get("profile_id")
+        }
+    
+    async def _process_single_file(self, file_pair: Dict, config: Dict,
+                                   cancel_event: Optional[threading.Event] = None) -> Dict:
+        """Process a single file pair and evaluate results"""
         logger.info(f"Starting to process file: {file_pair['audio']['filename']}")
         
         try:
             logger.info(f"File object details - audio_file: {type(file_pair['audio'])}, truth_file: {type(file_pair['truth'])}")
-            logger.info(f"File attributes - content size: {len(file_pair['audio']['content'])}")
             
-            # Create unique temp file path
-            temp_audio = os.path.join(self.temp_dir, f"temp_audio_{str(uuid4())}_{file_pair['audio']['filename']}")
-            logger.info(f"Created temp path: {temp_audio}")
-        
-            # Save audio file content
-            with open(temp_audio, "wb") as f:
-                f.write(file_pair["audio"]["content"])
-            logger.info("File copied successfully")
-        
             # Process ground truth content
             logger.info("Processing ground truth content...")
             truth_content = file_pair['truth']['content']
             logger.info(f"Ground truth content length: {len(truth_content)}")
-        
-            if config['format'] == 'json':
-                logger.info("Parsing JSON ground truth...")
-                truth_data = json.loads(truth_content.decode('utf-8'))
-                logger.info(f"Parsed JSON data: {truth_data}")
-                # Handle different possible JSON structures
-                if isinstance(truth_data, dict):
-                    reference_text = (
-                        truth_data.get('text') or 
-                        truth_data.get('transcript') or 
-                        truth_data.get('transcription', '')
-                    )
-                elif isinstance(truth_data, list) and truth_data:
-                    # If it's a list, try to get text from first item
-                    reference_text = (
-                        truth_data[0].get('text') or
-                        truth_data[0].get('transcript') or
-                        truth_data[0].get('transcription', '')
+            reference_text = parse_reference(truth_content, config['format'])
+            
+            audio = await self._decode_unprobed(file_pair)
+            options = self._inference_options(file_pair, config)
+            keys, cached = await self._cache_lookup(file_pair, [config])
+            result = cached[0]
+            inference_time = 0.0
+            if result is None:
+                # Decode in memory, straight from the spooled file or uploaded bytes
+                if audio is None:
+                    audio = await asyncio.get_running_loop().run_in_executor(
+                        None, timed_decode, self._audio_source(file_pair)
                     )
-                else:
-                    reference_text = ''
+                logger.info(f"Decoded {len(audio) / SAMPLING_RATE:.1f}s of audio")
+                file_pair["audio"]["duration"] = len(audio) / SAMPLING_RATE
                 
-                if not reference_text:
-                    logger.error(f"Could not find text in JSON: {truth_data}")
-                    raise ValueError("No text field found in JSON ground truth")
-            else:  # txt format
-                reference_text = truth_content.decode('utf-8')
-            logger.info(f"Reference text length: {len(reference_text)}")
-        
-            # Load model and transcribe
-            logger.info(f"Loading model: {config.get('model_id')}")
-            transcriber = self.load_model(config.get('model_id'))
-            
-            # Prepare generation kwargs
-            generate_kwargs = {
-                "task": "transcribe",
-                "language": config.get('language'),
-                "temperature": config.get('temperature', 0.0),
-            }
-            if config.get('prompt'):
-                generate_kwargs["prompt"] = config['prompt']
+                # Load model and transcribe off the event loop
+                logger.info(f"Loading model: {config.get('model_id')}")
+                # Latency here is inference only, as in the batch and comparison paths
+                start_time = time.time()
+                result = await self._transcribe(keys[0], config.get('model_id'), audio, generation_kwargs(config),
+                                                cancel_event, options,
+                                                self._profile_context(config, [file_pair["audio"]["filename"]]))
+                inference_time = time.time() - start_time
+            transcription = build_transcription(result)
             
-            # Transcribe
-            result = transcriber(
-                temp_audio,
-                return_timestamps="word",
-                generate_kwargs=generate_kwargs
+            # Calculate WER, CER and error breakdown in one alignment pass per token level
+            error_analysis = await asyncio.get_running_loop().run_in_executor(
+                None, self.wer_calculator.analyze_errors, reference_text, transcription['text']
             )
+            wer = error_analysis["error_rate"]
             
-            # Process words
-            words = []
-            if isinstance(result, dict) and "chunks" in result:
-                for chunk in result["chunks"]:
-                    if "text" in chunk and "timestamp" in chunk:
-                        words.append({
-                            "text": chunk["text"].strip(),
-                            "start": chunk["timestamp"][0],
-                            "end": chunk["timestamp"][1] if chunk["timestamp"][1] is not None else -1
-                        })
-            
-            # Filter and fix timestamps
-            words = [w for w in words if w["text"].strip()]
-            for i in range(len(words)-1):
-                if words[i]["end"] == -1:
-                    words[i]["end"] = words[i+1]["start"]
-            if words and words[-1]["end"] == -1:
-                words[-1]["end"] = words[-1]["start"] + 0.5
-            
-            transcription = {
-                "text": result["text"],
-                "words": words
-            }
-            
-            # Calculate WER
-            wer = self.wer_calculator.calculate(reference_text, transcription['text'])
-            
-            # Calculate processing time
-            processing_time = time.time() - start_time
-            
+            duration = file_pair["audio"].get("duration")
             result = {
                 "file": file_pair["audio"]["filename"],
                 "status": "completed",
                 "wer": wer,
-                "inference_time": processing_time,
+                "inference_time": inference_time,
+                "duration": duration,
+                "rtf": real_time_factor(inference_time, duration),
                 "transcription": transcription,
                 "reference": reference_text,
-                "error_analysis": self.wer_calculator.analyze_errors(reference_text, transcription['text'])
+                "error_analysis": error_analysis,
+                "cached": cached[0] is not None,
+                "long_form": options["long_form"] is not None,
+                "precision": options["precision"],
+                "speech_sec": result.get("speech_sec"),
+                "profile_id": result.get("profile_id")
             }
             
             return result
@@ -245,15 +1282,17 @@ class BenchmarkProcessor:
         except Exception as e:
             logger.error(f"Error processing {file_pair['audio']['filename']}: {str(e)}", exc_info=True)
             raise
-        finally:
-            # Clean up temporary file
-            if temp_audio and os.path.exists(temp_audio):
-                logger.info(f"Cleaning up temp file: {temp_audio}")
-                os.remove(temp_audio)
     
     def _save_results(self, benchmark_id: str) -> None:
-        """Save benchmark results to file"""
+        """Archive a finished run in the benchmark store, plus file exports if enabled"""
         results = self.active_benchmarks[benchmark_id]
+        self.store.save_run(benchmark_id, results)
+        logger.info(f"Benchmark {benchmark_id} saved to {self.store.db_path}")
+        if self.export_files:
+            self._export_files(results)
+    
+    def _export_files(self, results: Dict) -> None:
+        """Write a run as JSON and Excel files into results_dir"""
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         base_filename = f"benchmark_{timestamp}"
         
@@ -273,22 +1312,40 @@ class BenchmarkProcessor:
                     'wer': result['wer'],
                     'cer': result['error_analysis']['cer'],
                     'inference_time': result['inference_time'],
+                    'duration': result.get('duration'),
+                    'rtf': result.get('rtf'),
                     'substitutions': result['error_analysis']['substitutions'],
                     'deletions': result['error_analysis']['deletions'],
                     'insertions': result['error_analysis']['insertions'],
-                    'model_id': results['config']['model_id'],
+                    'model_id': result.get('model_id', results['config'].get('model_id')),
+                    'cached': result.get('cached', False),
                     'language': results['config'].get('language', ''),
                     'prompt': results['config'].get('prompt', ''),
                     'temperature': results['config'].get('temperature', 0.0),
                     'response_format': results['config'].get('response_format', 'json')
                 }
+                if 'label' in result:
+                    row['label'] = result['label']
                 rows.append(row)
         
         # Create and save Excel file
         if rows:
+            import pandas as pd  # only needed for exports, which are off by default
             df = pd.DataFrame(rows)
             excel_path = os.path.join(self.results_dir, f"{base_filename}.xlsx")
-            df.to_excel(excel_path, index=False)
+            if 'comparison' in results:
+                # Multi-model runs also get side-by-side and summary sheets
+                comparison = results['comparison']
+                summary = pd.DataFrame([
+                    {'model': label, **stats, **comparison['paired_deltas'].get(label, {})}
+                    for label, stats in comparison['summary'].items()
+                ])
+                with pd.ExcelWriter(excel_path) as writer:
+                    df.to_excel(writer, sheet_name='results', index=False)
+                    pd.DataFrame(comparison_rows(comparison)).to_excel(writer, sheet_name='comparison', index=False)
+                    summary.to_excel(writer, sheet_name='summary', index=False)
+            else:
+                df.to_excel(excel_path, index=False)
             logger.info(f"Results saved to {json_path} and {excel_path}")
         else:
             logger.warning("No completed results to save to Excel") 
\ No newline at end of file
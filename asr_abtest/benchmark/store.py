@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_DB_PATH = os.path.join("benchmark_results", "benchmarks.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    status TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    total_files INTEGER,
+    config TEXT,
+    models TEXT,
+    comparison TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    run_date TEXT,
+    file TEXT,
+    label TEXT,
+    model_id TEXT,
+    status TEXT,
+    wer REAL,
+    cer REAL,
+    inference_time REAL,
+    substitutions INTEGER,
+    deletions INTEGER,
+    insertions INTEGER,
+    hits INTEGER,
+    total_errors INTEGER,
+    total_words INTEGER,
+    cached INTEGER,
+    language TEXT,
+    prompt TEXT,
+    temperature REAL,
+    transcription TEXT,
+    reference TEXT,
+    error TEXT,
+    duration REAL,
+    rtf REAL,
+    precision TEXT,
+    profile_id TEXT,
+    file_index INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_results_model_file_date ON results(model_id, file, run_date);
+CREATE INDEX IF NOT EXISTS idx_results_file_date ON results(file, run_date);
+CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id);
+CREATE INDEX IF NOT EXISTS idx_results_date ON results(run_date);
+CREATE INDEX IF NOT EXISTS idx_runs_start ON runs(start_time);
+"""
+
+# Columns added after the first schema; stores created before them get them on open
+_ADDED_COLUMNS = (("results", "duration", "REAL"), ("results", "rtf", "REAL"), ("results", "precision", "TEXT"),
+                  ("results", "profile_id", "TEXT"), ("results", "file_index", "INTEGER"))
+
+# Columns callers may filter, group and sort on; anything else is rejected
+# before it gets near SQL
+GROUP_COLUMNS = ("model_id", "label", "file", "run_id", "language", "temperature", "precision", "status", "day")
+SORT_COLUMNS = ("run_date", "wer", "cer", "inference_time", "rtf", "duration", "file", "model_id")
+_SUMMARY_COLUMNS = ("id", "run_id", "run_date", "file", "label", "model_id", "status", "wer", "cer",
+                    "inference_time", "substitutions", "deletions", "insertions", "hits",
+                    "total_errors", "total_words", "cached", "language", "prompt", "temperature", "error",
+                    "duration", "rtf", "precision", "profile_id", "file_index")
+
+
+def _json_or_none(value) -> Optional[str]:
+    return json.dumps(value) if value is not None else None
+
+
+class BenchmarkStore:
+    """SQLite archive of benchmark runs with one indexed row per file result.
+
+    Runs keep their config and comparison blobs; results are flattened so
+    history queries ("WER of model X on file Y over the last 50 runs") and
+    aggregates hit indexes instead of re-reading every run. Connections are
+    opened per call, so the store can be used from any thread or process.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    directory = os.path.dirname(self.db_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with sqlite3.connect(self.db_path) as conn:
+                        # WAL lets readers query while a finished run is written
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.executescript(_SCHEMA)
+                        for table, column, kind in _ADDED_COLUMNS:
+                            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                            if column not in existing:
+                                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+                    self._initialized = True
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _result_row(run_id: str, benchmark: Dict, result: Dict) -> tuple:
+        config = benchmark.get("config") or {}
+        analysis = result.get("error_analysis") or {}
+        return (
+            run_id, benchmark.get("start_time"), result.get("file"), result.get("label"),
+            result.get("model_id") or config.get("model_id"), result.get("status"),
+            result.get("wer"), analysis.get("cer"), result.get("inference_time"),
+            analysis.get("substitutions"), analysis.get("deletions"), analysis.get("insertions"),
+            analysis.get("hits"), analysis.get("total_errors"), analysis.get("total_words"),
+            int(bool(result.get("cached"))),
+            result.get("language", config.get("language")), result.get("prompt", config.get("prompt")),
+            result.get("temperature", config.get("temperature")),
+            (result.get("transcription") or {}).get("text"), result.get("reference"), result.get("error"),
+            result.get("duration"), result.get("rtf"), result.get("precision", config.get("precision")),
+            result.get("profile_id"), result.get("file_index"),
+        )
+
+    def _insert_results(self, conn: sqlite3.Connection, rows: List[tuple]) -> None:
+        conn.executemany(
+            "INSERT INTO results (run_id, run_date, file, label, model_id, status, wer, cer, inference_time, "
+            "substitutions, deletions, insertions, hits, total_errors, total_words, cached, "
+            "language, prompt, temperature, transcription, reference, error, duration, rtf, precision, profile_id, "
+            "file_index) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def save_run(self, run_id: str, benchmark: Dict, include_results: bool = True) -> None:
+        """Insert or replace a run, and unless include_results is False all of its file results"""
+        benchmark = {**benchmark, "start_time": benchmark.get("start_time") or datetime.now().isoformat()}
+        with self._connect() as conn:
+            conn.execute(
+                # Upsert rather than REPLACE, which would cascade-delete checkpointed results
+                "INSERT INTO runs (run_id, status, start_time, end_time, total_files, config, models, comparison) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET status = excluded.status, start_time = excluded.start_time, "
+                "end_time = excluded.end_time, total_files = excluded.total_files, config = excluded.config, "
+                "models = excluded.models, comparison = excluded.comparison",
+                (run_id, benchmark.get("status"), benchmark["start_time"], benchmark.get("end_time"),
+                 benchmark.get("total_files"), _json_or_none(benchmark.get("config") or {}),
+                 _json_or_none(benchmark.get("models")), _json_or_none(benchmark.get("comparison")))
+            )
+            if include_results:
+                conn.execute("DELETE FROM results WHERE run_id = ?", (run_id,))
+                self._insert_results(conn, [self._result_row(run_id, benchmark, r) for r in benchmark.get("results", [])])
+
+    def append_result(self, run_id: str, benchmark: Dict, result: Dict) -> None:
+        """Checkpoint one file result of a run in progress"""
+        with self._connect() as conn:
+            self._insert_results(conn, [self._result_row(run_id, benchmark, result)])
+
+    @staticmethod
+    def _where(model_id: Optional[str] = None,
+               file: Optional[str] = None,
+               label: Optional[str] = None,
+               run_id: Optional[str] = None,
+               since: Optional[str] = None,
+               until: Optional[str] = None,
+               status: Optional[str] = "completed",
+               last_runs: Optional[int] = None) -> Tuple[str, list]:
+        clauses, params = [], []
+        for column, value in (("model_id", model_id), ("file", file), ("label", label),
+                              ("run_id", run_id), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("run_date >= ?")
+            params.append(since)
+        if until:
+            clauses.append("run_date < ?")
+            params.append(until)
+        if last_runs:
+            # Restrict to the most recent runs that match the other filters
+            inner = " AND ".join(clauses) or "1"
+            clauses.append(
+                f"run_id IN (SELECT run_id FROM results WHERE {inner} "
+                f"GROUP BY run_id ORDER BY MAX(run_date) DESC LIMIT ?)"
+            )
+            params = params + params + [last_runs]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query_results(self,
+                      limit: int = 100,
+                      offset: int = 0,
+                      sort: str = "run_date",
+                      descending: bool = True,
+                      include_text: bool = False,
+                      **filters) -> Dict:
+        """Filtered per-file result rows, newest first by default"""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort!r}; choose from {', '.join(SORT_COLUMNS)}")
+        columns = _SUMMARY_COLUMNS + (("transcription", "reference") if include_text else ())
+        where, params = self._where(**filters)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM results{where} "
+                f"ORDER BY {sort} {'DESC' if descending else 'ASC'}, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return {"total": total, "offset": offset, "limit": limit, "results": [dict(row) for row in rows]}
+
+    def aggregate(self, group_by: Sequence[str] = ("model_id",), **filters) -> List[Dict]:
+        """Mean and corpus-level metrics per group of result rows"""
+        group_by = list(group_by) or ["model_id"]
+        unknown = [column for column in group_by if column not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot group by {', '.join(unknown)}; choose from {', '.join(GROUP_COLUMNS)}")
+        selected = ["substr(run_date, 1, 10) AS day" if column == "day" else column for column in group_by]
+        where, params = self._where(**filters)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(selected)}, COUNT(*) AS files, COUNT(DISTINCT run_id) AS runs, "
+                f"AVG(wer) AS mean_wer, MIN(wer) AS min_wer, MAX(wer) AS max_wer, "
+                f"CAST(SUM(total_errors) AS REAL) / NULLIF(SUM(total_words), 0) AS corpus_wer, "
+                f"AVG(cer) AS mean_cer, SUM(cached) AS files_cached, "
+                # Cache hits ran no inference; AVG skips the NULLs they map to
+                f"AVG(CASE WHEN cached = 0 THEN inference_time END) AS mean_inference_time, "
+                f"AVG(CASE WHEN cached = 0 THEN rtf END) AS mean_rtf, SUM(duration) AS total_audio_sec, "
+                f"MIN(run_date) AS first_run, MAX(run_date) AS last_run "
+                f"FROM results{where} GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}",
+                params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_runs(self, limit: int = 50, offset: int = 0, model_id: Optional[str] = None) -> Dict:
+        """Run summaries, newest first"""
+        where, params = "", []
+        if model_id:
+            where = " WHERE run_id IN (SELECT run_id FROM results WHERE model_id = ?)"
+            params.append(model_id)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM runs{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT runs.run_id, status, start_time, end_time, total_files, models, "
+                f"(SELECT COUNT(*) FROM results WHERE results.run_id = runs.run_id AND results.status = 'completed') AS files_completed, "
+                f"(SELECT AVG(wer) FROM results WHERE results.run_id = runs.run_id) AS mean_wer "
+                f"FROM runs{where} ORDER BY start_time DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["models"] = json.loads(run["models"]) if run["models"] else None
+            runs.append(run)
+        return {"total": total, "offset": offset, "limit": limit, "runs": runs}
+
+    def get_run(self, run_id: str) -> Dict:
+        """A stored run's metadata plus all of its result rows"""
+        with self._connect() as conn:
+            run = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if run is None:
+                raise KeyError(f"Benchmark {run_id} not found")
+            results = conn.execute("SELECT * FROM results WHERE run_id = ? ORDER BY id", (run_id,)).fetchall()
+        run = dict(run)
+        for key in ("config", "models", "comparison"):
+            run[key] = json.loads(run[key]) if run[key] else None
+        run["results"] = [dict(row) for row in results]
+        return run
+
+    def load_benchmark(self, run_id: str) -> Dict:
+        """A stored run in the shape BenchmarkProcessor keeps in memory, minus word timestamps"""
+        run = self.get_run(run_id)
+        results = []
+        for row in run["results"]:
+            result = {"file": row["file"], "status": row["status"]}
+            for key in ("label", "model_id", "file_index"):
+                if row[key] is not None:
+                    result[key] = row[key]
+            if row["status"] == "completed":
+                result.update({
+                    "wer": row["wer"],
+                    "inference_time": row["inference_time"],
+                    "transcription": {"text": row["transcription"]},
+                    "reference": row["reference"],
+                    "error_analysis": {
+                        "total_errors": row["total_errors"],
+                        "total_words": row["total_words"],
+                        "substitutions": row["substitutions"],
+                        "deletions": row["deletions"],
+                        "insertions": row["insertions"],
+                        "hits": row["hits"],
+                        "error_rate": row["wer"],
+                        "cer": row["cer"],
+                    },
+                    "cached": bool(row["cached"]),
+                })
+                for key in ("duration", "rtf", "precision", "profile_id"):
+                    if row[key] is not None:
+                        result[key] = row[key]
+            elif row["error"] is not None:
+                result["error"] = row["error"]
+            results.append(result)
+
+        benchmark = {
+            "benchmark_id": run_id,
+            "status": run["status"],
+            "progress": 100,
+            "current_file": None,
+            "total_files": run["total_files"],
+            "results": results,
+            "config": run["config"] or {},
+            "start_time": run["start_time"],
+            "end_time": run["end_time"],
+        }
+        if run["models"] is not None:
+            benchmark["models"] = run["models"]
+        if run["comparison"] is not None:
+            benchmark["comparison"] = run["comparison"]
+        return benchmark
+
+    def import_json(self, path: str) -> str:
+        """Load a benchmark JSON dump written by older versions into the store"""
+        with open(path, "r") as f:
+            benchmark = json.load(f)
+        run_id = benchmark.get("benchmark_id") or os.path.splitext(os.path.basename(path))[0]
+        self.save_run(run_id, benchmark)
+        return run_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import benchmark JSON dumps into the benchmark store')
+    parser.add_argument('files', nargs='+', help='benchmark_*.json files to import')
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH,
+                        help='Path of the SQLite benchmark store')
+    args = parser.parse_args()
+
+    store = BenchmarkStore(args.db)
+    for path in args.files:
+        try:
+            print(f"{path} -> {store.import_json(path)}")
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {e}")
+
+
+if __name__ == "__main__":
+    main()
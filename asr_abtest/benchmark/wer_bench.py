@@ -0,0 +1,82 @@
+"""Micro-benchmark for the WER/CER alignment engine.
+
+Usage: python -m asr_abtest.benchmark.wer_bench --sizes 10,100,1000,10000,100000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Dict, List
+
+from .evaluator import WERCalculator
+
+
+def synthesize_pair(num_words: int, error_rate: float, seed: int = 0):
+    """Build a reference text and a hypothesis with roughly error_rate word edits"""
+    rng = random.Random(seed)
+    vocab = [f"ord{i}" for i in range(5000)]
+    reference = [rng.choice(vocab) for _ in range(num_words)]
+    hypothesis = []
+    for word in reference:
+        roll = rng.random()
+        if roll >= error_rate:
+            hypothesis.append(word)
+        elif roll < error_rate / 3:
+            hypothesis.append(rng.choice(vocab))  # substitution
+        elif roll < 2 * error_rate / 3:
+            continue  # deletion
+        else:
+            hypothesis.extend([word, rng.choice(vocab)])  # insertion
+    return " ".join(reference), " ".join(hypothesis)
+
+
+def run(sizes: List[int], error_rate: float, cer_max_words: int) -> List[Dict]:
+    rows = []
+    for size in sizes:
+        reference, hypothesis = synthesize_pair(size, error_rate)
+        include_cer = size <= cer_max_words
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        wer = WERCalculator.calculate(reference, hypothesis)
+        wer_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analysis = WERCalculator.analyze_errors(reference, hypothesis, include_cer=include_cer)
+        analyze_time = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rows.append({
+            "words": size,
+            "chars": len(reference),
+            "wer": wer,
+            "cer": analysis["cer"] if include_cer else None,
+            "wer_sec": wer_time,
+            "analyze_sec": analyze_time,
+            "peak_mb": peak / (1024 * 1024),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark WER/CER alignment scaling')
+    parser.add_argument('--sizes', type=str, default="10,100,1000,10000,100000",
+                        help='Comma separated reference lengths in words')
+    parser.add_argument('--error-rate', type=float, default=0.1,
+                        help='Fraction of reference words to perturb')
+    parser.add_argument('--cer-max-words', type=int, default=20000,
+                        help='Skip the character-level pass above this many words '
+                             '(CER is O(n*m/64) and dominates at very large sizes)')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(f"{'words':>8} {'chars':>9} {'wer':>7} {'cer':>7} {'wer_s':>9} {'analyze_s':>10} {'peak_mb':>9}")
+    for row in run(sizes, args.error_rate, args.cer_max_words):
+        cer = f"{row['cer']:>7.4f}" if row['cer'] is not None else f"{'-':>7}"
+        print(f"{row['words']:>8} {row['chars']:>9} {row['wer']:>7.4f} {cer} "
+              f"{row['wer_sec']:>9.4f} {row['analyze_sec']:>10.4f} {row['peak_mb']:>9.2f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Check that concurrent uploads to a running server never get each other's transcripts.
+
+Each file is first transcribed on its own to get a baseline, then all files
+are uploaded again in parallel (several rounds, in shuffled order) and every
+response must match the baseline for the file that was sent. Start the
+server with --no-cache, otherwise the concurrent phase is answered from
+the transcription cache.
+
+    python -m asr_abtest.concurrency_check --audio-dir samples/ --concurrency 16
+"""
+import argparse
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.ogg')
+
+
+def transcribe(server: str, path: str, model_id: str) -> str:
+    with open(path, 'rb') as f:
+        response = requests.post(
+            f"{server}/audio/transcriptions",
+            files={'file': (os.path.basename(path), f)},
+            data={'model_id': model_id, 'temperature': '0.0'},
+        )
+    response.raise_for_status()
+    return response.json()['text']
+
+
+def check(server: str, files: List[str], model_id: str, concurrency: int, rounds: int) -> List[Tuple[str, str, str]]:
+    """Return (file, expected, got) for every concurrent response that differs from its baseline"""
+    baseline: Dict[str, str] = {path: transcribe(server, path, model_id) for path in files}
+
+    jobs = [path for _ in range(rounds) for path in files]
+    random.shuffle(jobs)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        texts = list(pool.map(lambda path: transcribe(server, path, model_id), jobs))
+
+    return [(path, baseline[path], text) for path, text in zip(jobs, texts) if text != baseline[path]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check transcription isolation under concurrent uploads')
+    parser.add_argument('--server', type=str, default="http://localhost:8000",
+                        help='URL of a running ASR server')
+    parser.add_argument('--audio-dir', type=str, required=True,
+                        help='Directory of audio files; use files with distinct content')
+    parser.add_argument('--model', type=str, default="openai/whisper-small",
+                        help='Model to transcribe with')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of uploads in flight at once')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='How many times each file is sent during the concurrent phase')
+    args = parser.parse_args()
+
+    files = sorted(
+        os.path.join(args.audio_dir, name) for name in os.listdir(args.audio_dir)
+        if name.lower().endswith(AUDIO_EXTENSIONS)
+    )
+    if len(files) < 2:
+        parser.error("need at least two audio files to detect cross-talk")
+
+    mismatches = check(args.server.rstrip('/'), files, args.model, args.concurrency, args.rounds)
+    total = len(files) * args.rounds
+    if mismatches:
+        for path, expected, got in mismatches:
+            print(f"MISMATCH {path}\n  expected: {expected}\n  got:      {got}")
+        print(f"{len(mismatches)}/{total} concurrent transcriptions did not match their baseline")
+        sys.exit(1)
+    print(f"OK: {total} concurrent transcriptions of {len(files)} files matched their baselines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ["thread", "process"]
+
+
+class InferenceExecutor:
+    """Runs blocking model loads and inference off the asyncio event loop.
+
+    In ``thread`` mode work runs in a thread pool and shares the models
+    loaded in this process. In ``process`` mode work runs in spawned worker
+    processes, each holding its own copy of the models it has loaded, so
+    submitted callables and their arguments must be picklable (module-level
+    functions, plain data). Spawned workers don't share this process's
+    settings; ``initializer(*initargs)`` runs in each of them to apply them.
+    """
+
+    def __init__(self, mode: str = "thread", workers: int = 1):
+        self.mode = mode
+        self.workers = workers
+        self.initializer: Optional[Callable[..., None]] = None
+        self.initargs: Tuple = ()
+        self._pool: Optional[Executor] = None
+
+    def configure(self, mode: str, workers: int, initializer: Optional[Callable[..., None]] = None,
+                  initargs: Tuple = ()) -> None:
+        """Switch pool type or size; the old pool finishes its queued work first"""
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode: {mode}")
+        if workers < 1:
+            raise ValueError("Executor needs at least one worker")
+        self.shutdown()
+        self.mode = mode
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                # spawn, not fork: forking after torch has started its thread pools can deadlock
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                    initargs=self.initargs
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="inference"
+                )
+            logger.info(f"Inference executor started ({self.mode}, {self.workers} workers)")
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+# Shared by the server and the benchmark processor so all inference
+# competes for the same, bounded set of workers.
+inference_executor = InferenceExecutor()
@@ -0,0 +1,80 @@
+"""Check that the entry points import fast and without the inference stack.
+
+Each module is imported in a fresh interpreter, as a new server replica,
+UI container or benchmark worker would. The check fails when an import
+takes longer than the budget or pulls in torch, transformers, pandas or
+the other heavy packages, which are meant to load only when inference or
+an Excel export first runs.
+
+    python -m asr_abtest.import_check --budget-ms 1000
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+MODULES = ("asr_abtest.server", "asr_abtest.ui.app", "asr_abtest.benchmark", "asr_abtest.benchmark.cli")
+
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub", "pandas", "scipy", "openpyxl", "optimum")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int = 3) -> Dict:
+    """Fastest of repeat cold imports of module, and the heavy modules it loaded"""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if proc.returncode != 0:
+            return {"module": module, "error": proc.stderr.decode(errors="replace").strip().splitlines()[-1]}
+        sample = json.loads(proc.stdout.decode().strip().splitlines()[-1])
+        if best is None or sample["seconds"] < best["seconds"]:
+            best = sample
+    return {"module": module, **best}
+
+
+def failures(results: List[Dict], budget_ms: float) -> List[str]:
+    problems = []
+    for result in results:
+        if "error" in result:
+            problems.append(f"{result['module']} failed to import: {result['error']}")
+            continue
+        if result["heavy"]:
+            problems.append(f"{result['module']} imports {', '.join(result['heavy'])} at import time")
+        if result["seconds"] * 1000 > budget_ms:
+            problems.append(f"{result['module']} took {result['seconds'] * 1000:.0f} ms (budget {budget_ms:.0f} ms)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check import time and heavy imports of the entry points')
+    parser.add_argument('--module', type=str, action='append', default=None,
+                        help='Module to check; repeat for several (default: server, UI and benchmark entry points)')
+    parser.add_argument('--budget-ms', type=float, default=1000,
+                        help='Maximum cold import time per module')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Imports per module; the fastest one counts')
+    args = parser.parse_args()
+
+    results = [measure(module, max(1, args.repeat)) for module in args.module or MODULES]
+    for result in results:
+        if "error" not in result:
+            print(f"{result['module']:<30} {result['seconds'] * 1000:>8.0f} ms")
+    problems = failures(results, args.budget_ms)
+    if problems:
+        for problem in problems:
+            print(f"FAIL {problem}")
+        sys.exit(1)
+    print(f"OK: {len(results)} modules import within {args.budget_ms:.0f} ms without heavy dependencies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+"""Load generator for a running ASR server: throughput and latency under load.
+
+The benchmark package measures how accurate models are; this measures the
+service. Uploads go to /audio/transcriptions (or whole runs to
+/benchmark/start) at a fixed concurrency (closed loop) or a fixed arrival
+rate (open loop, Poisson or constant), one step per level, and every step
+reports throughput, latency percentiles, error rates and real-time factor.
+Audio is synthesized, so nothing but the local server is needed, or
+replayed from a directory. Keep the JSON summary of a commit and check a
+later one against it:
+
+    python -m asr_abtest.loadtest --concurrency 1,4,16 --output base.json
+    python -m asr_abtest.loadtest --concurrency 1,4,16 --baseline base.json
+    python -m asr_abtest.loadtest --rate 1,2,4 --duration-sec 60 --form vad=true
+
+Synthesized clips differ in every request, so the result cache never
+answers them; start the server with --no-cache when replaying files.
+Open-loop latency counts from when a request was due, not when a free
+connection sent it, so a saturated server shows up as latency rather
+than as a lower request rate.
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import wave
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from .concurrency_check import AUDIO_EXTENSIONS
+
+SAMPLING_RATE = 16000
+
+# Bumped when the summary layout changes, so old baselines aren't misread
+SUMMARY_VERSION = 1
+
+# Transcript sent with every synthesized benchmark file
+SYNTHETIC_REFERENCE = b"synthetic load test audio"
+
+Record = Dict
+
+
+def synthesize_clip(seconds: float, seed: int, sampling_rate: int = SAMPLING_RATE) -> bytes:
+    """A mono 16-bit WAV of speech-like sound: voiced syllables in phrases, with pauses and low noise"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sampling_rate)
+    t = np.arange(n) / sampling_rate
+    pitch = rng.uniform(90, 220)
+    voice = sum(np.sin(2 * np.pi * pitch * k * t + rng.uniform(0, 2 * np.pi)) / k for k in range(1, 6))
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * t))
+    # Phrases of 1-3 s with 0.3-0.8 s of silence between them, so VAD has something to trim
+    phrases = np.zeros(n)
+    position = 0.0
+    while position < seconds:
+        length = rng.uniform(1.0, 3.0)
+        phrases[int(position * sampling_rate):int(min(position + length, seconds) * sampling_rate)] = 1.0
+        position += length + rng.uniform(0.3, 0.8)
+    samples = 0.15 * voice * syllables * phrases + rng.normal(0, 0.003, n)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sampling_rate)
+        w.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def _unique(clip: bytes, salt: int, index: int) -> bytes:
+    """clip with its last eight samples set from salt and index: inaudible, but a different cache key"""
+    mark = salt.to_bytes(4, "little") + index.to_bytes(4, "little")
+    return clip[:-16] + np.frombuffer(mark, np.uint8).astype("<i2").tobytes()
+
+
+def _wav_duration(data: bytes) -> Optional[float]:
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            return w.getnframes() / w.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+class AudioSource:
+    """Clips the load generator sends, in turn: synthesized ones, or the files of audio_dir"""
+
+    def __init__(self, audio_dir: Optional[str] = None, durations: Tuple[float, ...] = (5.0, 15.0),
+                 variants: int = 4, seed: int = 0):
+        self.synthetic = audio_dir is None
+        if self.synthetic:
+            self.clips = [(f"synthetic_{seconds:g}s_{variant}.wav", synthesize_clip(seconds, seed + variant), seconds)
+                          for variant in range(variants) for seconds in durations]
+        else:
+            self.clips = []
+            for name in sorted(os.listdir(audio_dir)):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    with open(os.path.join(audio_dir, name), "rb") as f:
+                        data = f.read()
+                    # Only WAV headers are read here; other formats report no RTF
+                    self.clips.append((name, data, _wav_duration(data)))
+            if not self.clips:
+                raise ValueError(f"No audio files in {audio_dir}")
+        # Differs between runs too, so a run never hits results cached by the one before
+        self._salt = random.SystemRandom().getrandbits(32)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def next(self) -> Tuple[str, bytes, Optional[float]]:
+        with self._lock:
+            index = next(self._counter)
+        name, data, duration = self.clips[index % len(self.clips)]
+        return name, _unique(data, self._salt, index) if self.synthetic else data, duration
+
+
+_sessions = threading.local()
+
+
+def _session() -> requests.Session:
+    """A keep-alive session per sending thread"""
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def _error_kind(response: requests.Response) -> str:
+    try:
+        detail = response.json().get("detail")
+    except ValueError:
+        detail = None
+    code = detail.get("code") if isinstance(detail, dict) else None
+    return f"{response.status_code} {code}" if code else str(response.status_code)
+
+
+def send_transcription(server: str, source: AudioSource, form: Dict[str, str], timeout: float,
+                       due: float) -> Record:
+    """Upload one clip; latency counts from due"""
+    name, data, duration = source.next()
+    sent = time.perf_counter()
+    record = {"due": due, "sent": sent, "audio_sec": duration, "ok": False}
+    try:
+        response = _session().post(f"{server}/audio/transcriptions", files={"file": (name, data)},
+                                   data=form, timeout=timeout)
+    except requests.RequestException as e:
+        record.update(latency=time.perf_counter() - due, error=type(e).__name__)
+        return record
+    record["latency"] = time.perf_counter() - due
+    if response.status_code != 200:
+        record["error"] = _error_kind(response)
+        return record
+    body = response.json()
+    record.update(ok=True, server_sec=body.get("processing_duration_sec"))
+    return record
+
+
+def send_benchmark(server: str, source: AudioSource, form: Dict[str, str], timeout: float, due: float,
+                   files: int = 4, poll_sec: float = 0.25) -> Record:
+    """Start a benchmark run of files clips and wait for it to finish; latency counts from due"""
+    clips = [source.next() for _ in range(files)]
+    config = {"format": "txt", "pattern": "", "use_cache": False, **form}
+    upload = ([("audio_files", (name, data)) for name, data, _ in clips]
+              + [("truth_files", (f"{os.path.splitext(name)[0]}.txt", SYNTHETIC_REFERENCE)) for name, _, _ in clips])
+    sent = time.perf_counter()
+    record = {"due": due, "sent": sent, "ok": False,
+              "audio_sec": sum(d for _, _, d in clips) if all(d for _, _, d in clips) else None}
+    try:
+        response = _session().post(f"{server}/benchmark/start", files=upload,
+                                   data={"config": json.dumps(config)}, timeout=timeout)
+        if response.status_code != 200:
+            record.update(latency=time.perf_counter() - due, error=_error_kind(response))
+            return record
+        benchmark_id = response.json()["benchmark_id"]
+        while True:
+            summary = _session().get(f"{server}/benchmark/status/{benchmark_id}", timeout=timeout).json()
+            if summary["status"] not in ("queued", "running"):
+                break
+            if time.perf_counter() - sent > timeout:
+                record.update(latency=time.perf_counter() - due, error="Timeout")
+                return record
+            time.sleep(poll_sec)
+    except requests.RequestException as e:
+        record.update(latency=time.perf_counter() - due, error=type(e).__name__)
+        return record
+    record["latency"] = time.perf_counter() - due
+    if summary["status"] != "completed" or summary["files_failed"]:
+        record["error"] = f"run {summary['status']}, {summary['files_failed']} files failed"
+        return record
+    inference = summary.get("mean_inference_time")
+    record.update(ok=True, server_sec=inference * summary["files_completed"] if inference is not None else None)
+    return record
+
+
+def run_closed_loop(send: Callable[[float], Record], concurrency: int, duration_sec: float,
+                    max_requests: Optional[int] = None) -> List[Record]:
+    """concurrency senders, each sending its next request as soon as the last one returns"""
+    records: List[Record] = []
+    lock = threading.Lock()
+    sent = itertools.count()
+    deadline = time.perf_counter() + duration_sec
+
+    def sender():
+        while time.perf_counter() < deadline and (max_requests is None or next(sent) < max_requests):
+            record = send(time.perf_counter())
+            with lock:
+                records.append(record)
+
+    threads = [threading.Thread(target=sender, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def run_open_loop(send: Callable[[float], Record], rate: float, duration_sec: float,
+                  max_requests: Optional[int] = None, arrival: str = "poisson", max_in_flight: int = 64,
+                  seed: int = 0) -> List[Record]:
+    """Requests due at rate per second regardless of how fast they return, at most max_in_flight at once"""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    due = started
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while due < started + duration_sec and (max_requests is None or len(futures) < max_requests):
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # Beyond max_in_flight requests wait in the pool, which counts against their latency
+            futures.append(pool.submit(send, due))
+            due += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+    return [future.result() for future in futures]
+
+
+def _percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean": round(float(np.mean(values)), 4), "p50": round(float(p50), 4), "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4), "max": round(float(max(values)), 4)}
+
+
+def summarize(records: List[Record]) -> Dict:
+    """Throughput, latency, error and real-time factor statistics of one step"""
+    ok = [r for r in records if r["ok"]]
+    wall_sec = (max(r["due"] + r["latency"] for r in records) - min(r["due"] for r in records)) if records else 0.0
+    audio_sec = sum(r["audio_sec"] or 0.0 for r in ok)
+    timed = [r for r in ok if r["audio_sec"]]
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "error_rate": round((len(records) - len(ok)) / len(records), 4) if records else 0.0,
+        "errors_by_kind": dict(Counter(r["error"] for r in records if not r["ok"])),
+        "wall_sec": round(wall_sec, 3),
+        "throughput_rps": round(len(ok) / wall_sec, 4) if wall_sec else 0.0,
+        "audio_sec_per_sec": round(audio_sec / wall_sec, 4) if wall_sec else 0.0,
+        "latency_sec": _percentiles([r["latency"] for r in ok]),
+        # Client side (with queueing and transfer) and as the server measured it
+        "rtf": _percentiles([r["latency"] / r["audio_sec"] for r in timed]),
+        "server_rtf": _percentiles([r["server_sec"] / r["audio_sec"] for r in timed if r.get("server_sec") is not None]),
+    }
+
+
+def _scheduler_metrics(server: str) -> Optional[Dict]:
+    try:
+        response = requests.get(f"{server}/scheduler/metrics", timeout=10)
+        return response.json() if response.status_code == 200 else None
+    except requests.RequestException:
+        return None
+
+
+def _scheduler_delta(before: Optional[Dict], after: Optional[Dict]) -> Optional[Dict]:
+    """What the server's batching scheduler did during a step"""
+    if not before or not after:
+        return None
+    delta = {key: after[key] - before[key]
+             for key in ("requests_completed", "requests_failed", "requests_rejected", "batches_run")}
+    served = delta["requests_completed"] + delta["requests_failed"]
+    delta["mean_batch_size"] = round(served / delta["batches_run"], 3) if delta["batches_run"] else None
+    return delta
+
+
+def wait_until_ready(server: str, timeout: float) -> None:
+    """Wait for the server's warm-up load; servers without /ready count as ready once they answer"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            status = requests.get(f"{server}/ready", timeout=10).status_code
+            if status != 503:
+                return
+        except requests.RequestException:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{server} was not ready within {timeout:.0f}s")
+        time.sleep(1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _step_key(step: Dict) -> Tuple:
+    return step["scenario"], step["mode"], step["level"]
+
+
+def compare(baseline: Dict, current: Dict, max_regression_pct: float) -> Tuple[List[Dict], List[str]]:
+    """Per-step changes against baseline, and the ones beyond max_regression_pct.
+
+    Steps match on scenario, mode and level. Lower throughput, higher p95
+    or p99 latency, and an error rate more than one point higher count as
+    regressions.
+    """
+    base_steps = {_step_key(step): step for step in baseline.get("steps", [])}
+    rows, regressions = [], []
+    for step in current["steps"]:
+        base = base_steps.get(_step_key(step))
+        if base is None:
+            continue
+        label = f"{step['scenario']} {step['mode']}={step['level']:g}"
+        row = {"step": label}
+        for name, now, then, higher_is_worse in (
+            ("throughput_rps", step["throughput_rps"], base["throughput_rps"], False),
+            ("p95_sec", (step["latency_sec"] or {}).get("p95"), (base["latency_sec"] or {}).get("p95"), True),
+            ("p99_sec", (step["latency_sec"] or {}).get("p99"), (base["latency_sec"] or {}).get("p99"), True),
+        ):
+            if not now or not then:
+                continue
+            change = 100 * (now - then) / then
+            row[name] = {"baseline": then, "current": now, "change_pct": round(change, 1)}
+            if (change if higher_is_worse else -change) > max_regression_pct:
+                regressions.append(f"{label}: {name} {then:g} -> {now:g} ({change:+.1f}%)")
+        row["error_rate"] = {"baseline": base["error_rate"], "current": step["error_rate"]}
+        if step["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{label}: error rate {base['error_rate']:.2%} -> {step['error_rate']:.2%}")
+        rows.append(row)
+    return rows, regressions
+
+
+def _levels(text: Optional[str]) -> List[float]:
+    return [float(level) for level in text.split(",") if level.strip()] if text else []
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> Dict:
+    """Run every step of the load test described by args and return the summary"""
+    server = args.server.rstrip('/')
+    form = dict(field.split("=", 1) for field in args.form)
+    form.setdefault("model_id", args.model)
+    if args.scenario == "transcriptions":
+        form.setdefault("temperature", "0.0")
+    concurrency, rates = _levels(args.concurrency), _levels(args.rate)
+    if not concurrency and not rates:
+        concurrency = [1, 4, 16]
+    try:
+        source = AudioSource(args.audio_dir, tuple(_levels(args.durations)), args.variants, args.seed)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.scenario == "transcriptions":
+        def send(due: float) -> Record:
+            return send_transcription(server, source, form, args.timeout_sec, due)
+    else:
+        def send(due: float) -> Record:
+            return send_benchmark(server, source, form, args.timeout_sec, due, args.benchmark_files)
+
+    wait_until_ready(server, args.ready_timeout_sec)
+    for _ in range(args.warmup):
+        send(time.perf_counter())
+
+    steps = [("concurrency", level) for level in concurrency] + [("rate", level) for level in rates]
+    print(f"{'step':<28} {'requests':>8} {'ok':>6} {'err%':>6} {'rps':>8} {'p50_s':>8} {'p95_s':>8} "
+          f"{'p99_s':>8} {'rtf_p50':>8}")
+    results = []
+    for mode, level in steps:
+        before = _scheduler_metrics(server) if args.scenario == "transcriptions" else None
+        if mode == "concurrency":
+            records = run_closed_loop(send, int(level), args.duration_sec, args.requests)
+        else:
+            records = run_open_loop(send, level, args.duration_sec, args.requests, args.arrival,
+                                    args.max_in_flight, args.seed)
+        step = {"scenario": args.scenario, "mode": mode, "level": level, **summarize(records)}
+        if args.scenario == "transcriptions":
+            step["scheduler"] = _scheduler_delta(before, _scheduler_metrics(server))
+        results.append(step)
+        latency, rtf = step["latency_sec"] or {}, step["rtf"] or {}
+        print(f"{args.scenario + ' ' + mode + '=' + format(level, 'g'):<28} {step['requests']:>8} {step['ok']:>6} "
+              f"{100 * step['error_rate']:>6.1f} {step['throughput_rps']:>8.3f} {latency.get('p50', 0):>8.3f} "
+              f"{latency.get('p95', 0):>8.3f} {latency.get('p99', 0):>8.3f} {rtf.get('p50', 0):>8.3f}", flush=True)
+
+    summary = {
+        "version": SUMMARY_VERSION,
+        "created": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "server": server,
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "current", "max_regression_pct")},
+        "audio": {"synthetic": source.synthetic, "clips": len(source.clips)},
+        "steps": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to {args.output}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure throughput and latency of a running ASR server under load')
+    parser.add_argument('--server', type=str, default="http://localhost:8000",
+                        help='URL of a running ASR server')
+    parser.add_argument('--scenario', type=str, choices=("transcriptions", "benchmark"), default="transcriptions",
+                        help='Upload single files, or start whole benchmark runs and wait for them')
+    parser.add_argument('--model', type=str, default="openai/whisper-small",
+                        help='Model to transcribe with')
+    parser.add_argument('--form', type=str, action='append', default=[],
+                        help='Extra KEY=VALUE request field (transcriptions) or config entry (benchmark), '
+                             'e.g. vad=true or precision=int8; repeat for several')
+    parser.add_argument('--concurrency', type=str, default=None,
+                        help='Comma separated closed-loop levels: requests kept in flight (default: 1,4,16)')
+    parser.add_argument('--rate', type=str, default=None,
+                        help='Comma separated open-loop levels: requests started per second')
+    parser.add_argument('--arrival', type=str, choices=("poisson", "constant"), default="poisson",
+                        help='Spacing of open-loop arrivals')
+    parser.add_argument('--max-in-flight', type=int, default=64,
+                        help='Open-loop requests sent at once; later ones wait and count as latency')
+    parser.add_argument('--duration-sec', type=float, default=30.0,
+                        help='How long each step sends requests')
+    parser.add_argument('--requests', type=int, default=None,
+                        help='Stop a step after this many requests, even before --duration-sec')
+    parser.add_argument('--warmup', type=int, default=2,
+                        help='Requests sent and discarded before the first step')
+    parser.add_argument('--audio-dir', type=str, default=None,
+                        help='Replay the audio files of this directory instead of synthesizing clips')
+    parser.add_argument('--durations', type=str, default="5,15",
+                        help='Comma separated lengths in seconds of the synthesized clips')
+    parser.add_argument('--variants', type=int, default=4,
+                        help='Synthesized clips per length')
+    parser.add_argument('--benchmark-files', type=int, default=4,
+                        help='Files per benchmark run in the benchmark scenario')
+    parser.add_argument('--timeout-sec', type=float, default=300.0,
+                        help='Timeout of one request, or of one benchmark run')
+    parser.add_argument('--ready-timeout-sec', type=float, default=600.0,
+                        help='How long to wait for the server to finish its warm-up load')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the synthesized audio and of the Poisson arrivals')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the JSON summary here')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='JSON summary of an earlier run to compare against; regressions exit with status 1')
+    parser.add_argument('--current', type=str, default=None,
+                        help='Compare this JSON summary with --baseline instead of running a load test')
+    parser.add_argument('--max-regression-pct', type=float, default=10.0,
+                        help='Allowed throughput drop or p95/p99 latency rise against --baseline')
+    args = parser.parse_args()
+
+    if args.current:
+        if not args.baseline:
+            parser.error("--current needs --baseline")
+        with open(args.current) as f:
+            summary = json.load(f)
+    else:
+        summary = run(args, parser)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("version") != summary["version"]:
+            parser.error(f"{args.baseline} has summary version {baseline.get('version')}, not {summary['version']}")
+        rows, regressions = compare(baseline, summary, args.max_regression_pct)
+        if not rows:
+            print(f"FAIL: no steps in common with {args.baseline}")
+            sys.exit(1)
+        for row in rows:
+            changes = ", ".join(f"{name} {row[name]['change_pct']:+.1f}%"
+                                for name in ("throughput_rps", "p95_sec", "p99_sec") if name in row)
+            print(f"{row['step']:<28} {changes}")
+        if regressions:
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            sys.exit(1)
+        print(f"OK: {len(rows)} steps within {args.max_regression_pct:g}% of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Long-form transcription: overlapping windows batched through the pipeline.
+
+The pipeline's own chunking decodes the 30 s chunks of a recording one
+after another unless it is given a batch size, and its merge works on
+tokens. Here a long recording is cut into overlapping windows up front,
+the windows go through the pipeline as one batched list of inputs, and
+the per-window word timestamps are shifted and stitched back together:
+every word belongs to the window whose centre region (the window minus
+half the overlap on each inner edge) contains its midpoint, so words in
+an overlap are kept exactly once.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio import SAMPLING_RATE
+
+# Whisper's encoder sees at most 30 s at a time
+MAX_WINDOW_S = 30.0
+
+
+def split_windows(num_samples: int, sampling_rate: int = SAMPLING_RATE,
+                  window_s: float = MAX_WINDOW_S, overlap_s: float = 5.0) -> List[Tuple[int, int]]:
+    """(start, end) sample offsets of overlapping windows covering num_samples"""
+    window = int(window_s * sampling_rate)
+    step = window - int(overlap_s * sampling_rate)
+    if window <= 0 or step <= 0:
+        raise ValueError("Long-form window must be positive and longer than its overlap")
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window, num_samples)
+        windows.append((start, end))
+        if end >= num_samples:
+            return windows
+        start += step
+
+
+def stitch(outputs: List[Dict], windows: List[Tuple[int, int]], sampling_rate: int = SAMPLING_RATE,
+           overlap_s: float = 5.0) -> Dict:
+    """Merge per-window pipeline outputs into one output with absolute word timestamps"""
+    margin = overlap_s / 2
+    chunks = []
+    for index, (output, (start, end)) in enumerate(zip(outputs, windows)):
+        offset = start / sampling_rate
+        low = offset + margin if index > 0 else float("-inf")
+        high = end / sampling_rate - margin if index < len(windows) - 1 else float("inf")
+        words = output.get("chunks")
+        if words is None:
+            # No word timestamps: keep the whole window's text, overlaps and all
+            chunks.append({"text": output.get("text", ""), "timestamp": (offset, end / sampling_rate)})
+            continue
+        for word in words:
+            word_start, word_end = word["timestamp"]
+            if word_start is None:
+                continue
+            word_start += offset
+            word_end = word_end + offset if word_end is not None else None
+            middle = (word_start + word_end) / 2 if word_end is not None else word_start
+            if low <= middle < high:
+                chunks.append({"text": word["text"], "timestamp": (word_start, word_end)})
+    return {"text": "".join(chunk["text"] for chunk in chunks).strip(), "chunks": chunks}
+
+
+def transcribe_windows(transcriber, audio: np.ndarray, generate_kwargs: Dict,
+                       batch_size: int = 8, window_s: float = MAX_WINDOW_S, overlap_s: float = 5.0,
+                       sampling_rate: int = SAMPLING_RATE) -> Dict:
+    """Blocking long-form transcription of a decoded recording with a loaded pipeline"""
+    windows = split_windows(len(audio), sampling_rate, window_s, overlap_s)
+    inputs = [{"raw": audio[start:end], "sampling_rate": sampling_rate} for start, end in windows]
+    outputs = list(transcriber(
+        inputs,
+        batch_size=batch_size,
+        # Windows are already at most 30 s; the pipeline must not chunk them again
+        chunk_length_s=0,
+        return_timestamps="word",
+        generate_kwargs=generate_kwargs
+    ))
+    return stitch(outputs, windows, sampling_rate, overlap_s)
+
+
+class LongFormSettings:
+    """When and how recordings are transcribed in long-form mode.
+
+    Recordings longer than ``threshold_s`` switch to long-form automatically
+    (a threshold of None leaves it to the caller); callers can also force it
+    on or off per request.
+    """
+
+    def __init__(self,
+                 threshold_s: Optional[float] = 60.0,
+                 batch_size: int = 8,
+                 window_s: float = MAX_WINDOW_S,
+                 overlap_s: float = 5.0):
+        self.threshold_s = threshold_s
+        self.batch_size = batch_size
+        self.window_s = window_s
+        self.overlap_s = overlap_s
+
+    def configure(self, threshold_s: Optional[float], batch_size: int, window_s: float, overlap_s: float) -> None:
+        if not 0 < window_s <= MAX_WINDOW_S:
+            raise ValueError(f"Long-form window must be between 0 and {MAX_WINDOW_S:g} seconds")
+        if not 0 <= overlap_s < window_s:
+            raise ValueError("Long-form overlap must be shorter than the window")
+        if batch_size < 1:
+            raise ValueError("Long-form batch size must be at least 1")
+        self.threshold_s = threshold_s or None
+        self.batch_size = batch_size
+        self.window_s = window_s
+        self.overlap_s = overlap_s
+
+    def params(self, duration: Optional[float], requested: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+        """transcribe_windows arguments for a recording, or None for a plain pipeline call"""
+        if requested is None:
+            requested = bool(self.threshold_s and duration and duration > self.threshold_s)
+        if not requested:
+            return None
+        return {"batch_size": self.batch_size, "window_s": self.window_s, "overlap_s": self.overlap_s}
+
+
+def cache_kwargs(generate_kwargs: Dict, params: Optional[Dict]) -> Dict:
+    """Options to key a cached result on; long-form output differs from a plain call"""
+    if not params:
+        return generate_kwargs
+    # Batch size only changes speed, not the transcript
+    return {**generate_kwargs, "long_form": {k: v for k, v in params.items() if k != "batch_size"}}
+
+
+# Configured from the server command line; benchmark runs use the same settings
+long_form = LongFormSettings()
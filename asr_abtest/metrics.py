@@ -0,0 +1,219 @@
+"""Process-wide latency and throughput metrics in the Prometheus text format.
+
+A small registry of counters, gauges and histograms with labels, rendered
+by the server's /metrics endpoint. Request handlers, the benchmark, the
+model pool and the instrumented pipelines all record into the module
+level instruments below; gauges that mirror existing state (queue depth,
+pooled models) read it when they are rendered.
+
+With the process executor, stages that run inside the inference workers
+(feature extraction, encoder, decoder, post-processing, and the VAD and
+inference of benchmark files) are recorded in those worker processes and
+don't show up here; use the thread executor where that breakdown matters.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds, from a cached lookup up to a long-form recording
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {', '.join(self.labelnames) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function: Callable[[], object]) -> None:
+        """Read the value(s) from function at render time instead of recording them.
+
+        function returns a number for an unlabelled metric, or a dict from
+        label value tuples to numbers.
+        """
+        self._function = function
+
+    def _function_samples(self) -> List[str]:
+        values = self._function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values.items() if value is not None]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        try:
+            samples = self._function_samples() if self._function is not None else self.samples()
+        except Exception:  # a broken callback must not take /metrics down
+            samples = []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + samples
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (last one is +Inf), sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+        lines = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Named metrics of one process, rendered in registration order"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-registering (e.g. a module imported twice) returns the live instance
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "asr_stage_seconds",
+    "Time spent per processing stage (upload_io, decode, vad, queue_wait, inference, feature_extraction, "
+    "encoder, decoder, postprocess, word_postprocess, scoring)",
+    ("stage", "model"),
+)
+REQUEST_SECONDS = registry.histogram(
+    "asr_request_seconds", "End-to-end transcription request latency", ("endpoint", "status")
+)
+REAL_TIME_FACTOR = registry.histogram(
+    "asr_real_time_factor", "Processing time divided by audio duration", ("model", "source"), RTF_BUCKETS
+)
+AUDIO_SECONDS = registry.counter(
+    "asr_audio_seconds_total", "Seconds of audio transcribed", ("model", "source")
+)
+MODEL_LOAD_SECONDS = registry.histogram(
+    "asr_model_load_seconds", "Model load time per phase (total, resolve, processors, weights, pipeline, quantize)",
+    ("model", "phase"),
+)
+
+
+def stage(name: str, model: str = "") -> ContextManager[None]:
+    """Time a block as one processing stage, optionally for one model"""
+    return STAGE_SECONDS.time(stage=name, model=model or "")
+
+
+def record_rtf(model: str, source: str, seconds: float, duration: Optional[float]) -> None:
+    """Real-time factor and audio throughput of one transcription of duration seconds"""
+    if duration:
+        REAL_TIME_FACTOR.observe(seconds / duration, model=model, source=source)
+        AUDIO_SECONDS.inc(duration, model=model, source=source)
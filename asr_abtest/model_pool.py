@@ -0,0 +1,408 @@
+"""Process-wide pool of loaded ASR pipelines.
+
+torch and transformers are imported on first use (the first model load,
+device probe or cancellable generation), not when this module is
+imported, so the server, the UI and the benchmark tools start without
+paying for them. Models load from local snapshots (see snapshots.py),
+with tokenizers and feature extractors built once per process.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import MODEL_LOAD_SECONDS, STAGE_SECONDS
+from .snapshots import snapshots
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_ID = "openai/whisper-small"
+
+ModelKey = Tuple[str, str, str]
+
+# How a model's weights are held and run:
+#   fp32  full precision (the default)
+#   bf16  bfloat16 weights and activations, fast on CPUs with AVX512-BF16/AMX
+#   fp16  half precision, meant for GPUs
+#   int8  dynamic int8 quantization of the linear layers, CPU only
+#   onnx  ONNX Runtime through optimum, if it is installed
+PRECISIONS = ("fp32", "bf16", "fp16", "int8", "onnx")
+DEFAULT_PRECISION = "fp32"
+
+
+def default_device() -> str:
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def check_precision(precision: str) -> str:
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}; choose from {', '.join(PRECISIONS)}")
+    return precision
+
+
+def _onnx_model(path: str):
+    try:
+        from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+    except ImportError as e:  # optional; only needed for the onnx precision
+        raise ValueError("The onnx precision needs optimum[onnxruntime] to be installed") from e
+    # Exported from the PyTorch checkpoint on first load
+    return ORTModelForSpeechSeq2Seq.from_pretrained(path, export=True, use_cache=True,
+                                                    provider="CPUExecutionProvider")
+
+
+@functools.lru_cache(maxsize=8)
+def _processors(path: str) -> Tuple[Any, Any]:
+    """Tokenizer and feature extractor of a snapshot, built once per process.
+
+    Shared by every precision of the model and kept when its pipelines are
+    evicted; building the slow tokenizer is a large part of a load.
+    """
+    from transformers import AutoFeatureExtractor, AutoTokenizer
+    return AutoTokenizer.from_pretrained(path, use_fast=False), AutoFeatureExtractor.from_pretrained(path)
+
+
+def _load_weights(path: str, dtype=None):
+    from transformers import AutoConfig, AutoModelForCTC, AutoModelForSpeechSeq2Seq
+    config = AutoConfig.from_pretrained(path)
+    # Whisper-style models are encoder-decoders; wav2vec2-style ones are CTC
+    model_class = AutoModelForSpeechSeq2Seq if config.is_encoder_decoder else AutoModelForCTC
+    kwargs = {"torch_dtype": dtype} if dtype is not None else {}
+    # safetensors are read through mmap straight into the parameters, so
+    # repeated and concurrent loads of a snapshot hit the page cache
+    return model_class.from_pretrained(path, config=config, low_cpu_mem_usage=True,
+                                       use_safetensors=snapshots.uses_safetensors(path), **kwargs)
+
+
+class _StageClock(threading.local):
+    """Encoder time spent inside the current thread's generate() call"""
+    encoder_started = 0.0
+    encoder_sec = 0.0
+
+
+def _timed_iterator(iterator, stage: str, model_id: str):
+    """Yield from iterator, recording the time spent producing items as one stage observation"""
+    spent = 0.0
+    iterator = iter(iterator)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            STAGE_SECONDS.observe(spent + time.perf_counter() - started, stage=stage, model=model_id)
+            return
+        spent += time.perf_counter() - started
+        yield item
+
+
+def instrument_pipeline(transcriber, model_id: str) -> None:
+    """Record feature extraction, encoder, decoder and post-processing time of a pipeline.
+
+    Feature extraction is the pipeline's preprocess step, post-processing
+    turns tokens into text and word timestamps. For encoder-decoder models
+    the encoder is timed with forward hooks and the decoder is the rest of
+    generate(); CTC models have no decoder, their whole forward pass counts
+    as encoder.
+    """
+    preprocess, postprocess = transcriber.preprocess, transcriber.postprocess
+    transcriber.preprocess = lambda *args, **kwargs: _timed_iterator(
+        preprocess(*args, **kwargs), "feature_extraction", model_id
+    )
+
+    def timed_postprocess(*args, **kwargs):
+        with STAGE_SECONDS.time(stage="postprocess", model=model_id):
+            return postprocess(*args, **kwargs)
+    transcriber.postprocess = timed_postprocess
+
+    model = transcriber.model
+    if not hasattr(model, "register_forward_hook"):
+        return  # ONNX Runtime models aren't torch modules
+    clock = _StageClock()
+    encoder = model.get_encoder() if getattr(model.config, "is_encoder_decoder", False) else model
+
+    def encoder_started(module, inputs):
+        clock.encoder_started = time.perf_counter()
+
+    def encoder_finished(module, inputs, outputs):
+        elapsed = time.perf_counter() - clock.encoder_started
+        clock.encoder_sec += elapsed
+        STAGE_SECONDS.observe(elapsed, stage="encoder", model=model_id)
+    encoder.register_forward_pre_hook(encoder_started)
+    encoder.register_forward_hook(encoder_finished)
+
+    if encoder is not model:
+        generate = model.generate
+
+        def timed_generate(*args, **kwargs):
+            clock.encoder_sec = 0.0
+            started = time.perf_counter()
+            try:
+                return generate(*args, **kwargs)
+            finally:
+                decoder_sec = time.perf_counter() - started - clock.encoder_sec
+                STAGE_SECONDS.observe(max(decoder_sec, 0.0), stage="decoder", model=model_id)
+        model.generate = timed_generate
+
+
+def build_pipeline(model_id: str, device: str, precision: str = DEFAULT_PRECISION):
+    """Build the word-timestamped ASR pipeline used everywhere in the app.
+
+    The returned pipeline carries ``load_phases``, the seconds spent
+    resolving the snapshot, building processors, loading weights, building
+    the pipeline and (for int8) quantizing.
+    """
+    check_precision(precision)
+    if precision in ("int8", "onnx") and device != "cpu":
+        raise ValueError(f"The {precision} precision only runs on CPU")
+    phases = {}
+    started = time.perf_counter()
+
+    def phase(name: str) -> None:
+        nonlocal started
+        now = time.perf_counter()
+        phases[name] = round(now - started, 4)
+        started = now
+
+    path = snapshots.resolve(model_id)
+    phase("resolve_sec")
+    import torch
+    from transformers import pipeline
+    tokenizer, feature_extractor = _processors(path)
+    phase("processors_sec")
+    if precision == "onnx":
+        model = _onnx_model(path)
+    else:
+        half = {"bf16": "bfloat16", "fp16": "float16"}.get(precision)
+        model = _load_weights(path, getattr(torch, half) if half else None)
+    phase("weights_sec")
+    transcriber = pipeline("automatic-speech-recognition",
+                           model=model,
+                           tokenizer=tokenizer,
+                           feature_extractor=feature_extractor,
+                           chunk_length_s=30,
+                           return_timestamps="word",
+                           device=device)
+    phase("pipeline_sec")
+    if precision == "int8":
+        # Weights of nn.Linear become int8, activations are quantized on the fly
+        transcriber.model = torch.ao.quantization.quantize_dynamic(
+            transcriber.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        phase("quantize_sec")
+    instrument_pipeline(transcriber, model_id)
+    transcriber.load_phases = phases
+    return transcriber
+
+
+@functools.lru_cache(maxsize=None)
+def _cancel_generation_class():
+    import torch
+    from transformers import StoppingCriteria
+
+    class CancelGeneration(StoppingCriteria):
+        """Ends generate() at the next decoding step once event is set"""
+
+        def __init__(self, event: threading.Event):
+            self.event = event
+
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    return CancelGeneration
+
+
+def cancellable(generate_kwargs: Dict, event: threading.Event) -> Dict:
+    """generate_kwargs that stop decoding (and so every remaining chunk) once event is set"""
+    from transformers import StoppingCriteriaList
+    return {**generate_kwargs, "stopping_criteria": StoppingCriteriaList([_cancel_generation_class()(event)])}
+
+
+def pipeline_nbytes(transcriber) -> int:
+    """Approximate resident size of a pipeline's weights and buffers"""
+    model = getattr(transcriber, "model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    nbytes = sum(t.numel() * t.element_size() for t in tensors)
+    # Dynamically quantized linear layers keep their packed weights outside parameters()
+    for module in model.modules():
+        weight = getattr(module, "weight", None)
+        if callable(weight) and hasattr(module, "_packed_params"):
+            packed = weight()
+            nbytes += packed.numel() * packed.element_size()
+    return nbytes
+
+
+class _PoolEntry:
+    __slots__ = ("pipeline", "nbytes", "loaded_at", "last_used", "uses", "load_sec", "load_phases")
+
+    def __init__(self, transcriber, nbytes: int, load_sec: float):
+        self.pipeline = transcriber
+        self.nbytes = nbytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+        self.load_sec = load_sec
+        self.load_phases = getattr(transcriber, "load_phases", None)
+
+
+class ModelPool:
+    """Process-wide registry of loaded pipelines with LRU eviction.
+
+    Pipelines are keyed by (model_id, device, precision) and shared by every
+    caller in the process; callers that don't name a precision get
+    ``default_precision``. The pool holds at most ``max_models`` pipelines
+    and, if ``max_bytes`` is set, at most that many bytes of weights; the
+    least recently used entries are dropped first. Concurrent requests for
+    a model that is still loading wait for that single load instead of
+    starting their own.
+    """
+
+    def __init__(self,
+                 max_models: int = 2,
+                 max_bytes: Optional[int] = None,
+                 loader: Callable[[str, str, str], Any] = build_pipeline,
+                 default_precision: str = DEFAULT_PRECISION):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.default_precision = default_precision
+        self._models: "OrderedDict[ModelKey, _PoolEntry]" = OrderedDict()
+        self._loading: Dict[ModelKey, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def resolve_precision(self, precision: Optional[str] = None) -> str:
+        """The precision a request for precision (None: the pool default) loads with"""
+        return check_precision(precision or self.default_precision)
+
+    def _key(self, model_id: Optional[str], device: Optional[str], precision: Optional[str]) -> ModelKey:
+        return model_id or DEFAULT_MODEL_ID, device or default_device(), self.resolve_precision(precision)
+
+    def get(self, model_id: Optional[str], device: Optional[str] = None, precision: Optional[str] = None):
+        """Return the pipeline for model_id, loading it if it isn't pooled yet"""
+        key = self._key(model_id, device, precision)
+        while True:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    entry.last_used = time.time()
+                    entry.uses += 1
+                    self.hits += 1
+                    return entry.pipeline
+                event = self._loading.get(key)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self._loading[key] = event
+                    self.misses += 1
+            if owner:
+                return self._load(key, event)
+            # Someone else is loading this model; use their result (or retry if it failed)
+            event.wait()
+
+    def _load(self, key: ModelKey, event: threading.Event):
+        model_id, device, precision = key
+        try:
+            print(f"Loading model: {model_id} ({device}, {precision})")
+            started = time.perf_counter()
+            transcriber = self.loader(model_id, device, precision)
+            entry = _PoolEntry(transcriber, pipeline_nbytes(transcriber), time.perf_counter() - started)
+            entry.uses = 1
+            MODEL_LOAD_SECONDS.observe(entry.load_sec, model=model_id, phase="total")
+            for name, sec in (entry.load_phases or {}).items():
+                MODEL_LOAD_SECONDS.observe(sec, model=model_id, phase=name[:-4])
+            with self._lock:
+                self._models[key] = entry
+                self.loads += 1
+                self._evict(keep=key)
+            phases = ", ".join(f"{name[:-4]} {sec:.2f}s" for name, sec in (entry.load_phases or {}).items())
+            print(f"Model loaded successfully: {model_id} in {entry.load_sec:.1f}s" + (f" ({phases})" if phases else ""))
+            return transcriber
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def _evict(self, keep: ModelKey) -> None:
+        """Drop least recently used entries until the pool fits its limits (lock held)"""
+        while len(self._models) > 1:
+            over_count = len(self._models) > self.max_models
+            over_bytes = self.max_bytes is not None and self.total_bytes() > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            key = next(iter(self._models))
+            if key == keep:
+                break
+            self._models.pop(key)
+            self.evictions += 1
+            logger.info(f"Evicted model from pool: {key}")
+
+    def total_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._models.values())
+
+    def is_loaded(self, model_id: str, device: Optional[str] = None, precision: Optional[str] = None) -> bool:
+        return self._key(model_id, device, precision) in self._models
+
+    def evict(self, model_id: str, device: Optional[str] = None, precision: Optional[str] = None) -> bool:
+        key = self._key(model_id, device, precision)
+        with self._lock:
+            removed = self._models.pop(key, None)
+        if removed is not None:
+            self.evictions += 1
+        return removed is not None
+
+    def configure(self, max_models: int, max_bytes: Optional[int] = None,
+                  default_precision: Optional[str] = None) -> None:
+        with self._lock:
+            self.max_models = max_models
+            self.max_bytes = max_bytes
+            if default_precision:
+                self.default_precision = check_precision(default_precision)
+            if self._models:
+                self._evict(keep=next(reversed(self._models)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            loaded: List[Dict] = [
+                {
+                    "model_id": model_id,
+                    "device": device,
+                    "precision": precision,
+                    "size_mb": round(entry.nbytes / (1024 * 1024), 1),
+                    "load_sec": round(entry.load_sec, 3),
+                    "load_phases": entry.load_phases,
+                    "uses": entry.uses,
+                    "last_used": entry.last_used,
+                }
+                for (model_id, device, precision), entry in reversed(self._models.items())
+            ]
+            loading = [key[0] for key in self._loading]
+            total_bytes = self.total_bytes()
+        return {
+            "loaded": loaded,
+            "loading": loading,
+            "max_models": self.max_models,
+            "max_bytes": self.max_bytes,
+            "default_precision": self.default_precision,
+            "total_bytes": total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+def cache_kwargs(generate_kwargs: Dict, precision: str) -> Dict:
+    """Options to key a cached result on; lower precisions can transcribe differently"""
+    return generate_kwargs if precision == DEFAULT_PRECISION else {**generate_kwargs, "precision": precision}
+
+
+# Shared by the server endpoints and the benchmark processor
+model_pool = ModelPool()
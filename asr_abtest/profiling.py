@@ -0,0 +1,305 @@
+"""Opt-in profiling of single transcriptions.
+
+A request or benchmark run asking for ``profile`` has its inference run
+under a stack sampler and, when torch is loaded, the torch profiler. The
+compact report (hottest Python functions, hottest torch operators, memory
+peaks) is returned with the response and kept in a directory of JSON
+reports, so benchmark result rows can link to it by ``profile_id``.
+
+Profiling is off unless the server enables it, can require a token, and
+is sampled: only a fraction of profile requests are profiled, one at a
+time and at most once per interval, so leaving it enabled in production
+costs the profiled requests and nothing else.
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = "profiles"
+
+# Header a profiling token is sent in
+TOKEN_HEADER = "X-Profile-Token"
+
+
+def _frame_name(code) -> str:
+    path = code.co_filename
+    parts = path.replace("\\", "/").split("/")
+    short = "/".join(parts[-2:]) if len(parts) > 1 else path
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """Samples the Python stack of one thread every interval seconds"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            self.samples += 1
+            self.self_counts[names[0]] += 1
+            self.total_counts.update(set(names))
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def report(self, top: int) -> List[Dict]:
+        """Hottest functions by time spent in them, with their share of time on the stack"""
+        if not self.samples:
+            return []
+        return [
+            {
+                "function": name,
+                "self_pct": round(100 * count / self.samples, 1),
+                "total_pct": round(100 * self.total_counts[name] / self.samples, 1),
+            }
+            for name, count in self.self_counts.most_common(top)
+        ]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _torch_ops(prof, top: int) -> List[Dict]:
+    """Hottest torch operators by self CPU time"""
+    ops = sorted(prof.key_averages(), key=lambda op: op.self_cpu_time_total, reverse=True)[:top]
+    rows = []
+    for op in ops:
+        row = {
+            "name": op.key,
+            "calls": op.count,
+            "self_cpu_ms": round(op.self_cpu_time_total / 1000, 3),
+            "cpu_ms": round(op.cpu_time_total / 1000, 3),
+            "cpu_memory_mb": round(op.self_cpu_memory_usage / (1024 * 1024), 2),
+        }
+        # Renamed from cuda to device in torch 2.4
+        device_us = getattr(op, "self_device_time_total", None) or getattr(op, "self_cuda_time_total", 0)
+        if device_us:
+            row["self_device_ms"] = round(device_us / 1000, 3)
+        rows.append(row)
+    return rows
+
+
+def run_profiled(function: Callable, *args, interval_ms: float = 5.0, top: int = 20,
+                 **kwargs) -> Tuple[Any, Dict]:
+    """Call function(*args, **kwargs) under the profilers; returns its result and the report.
+
+    Module level so it can also run inside process-pool workers, which
+    profile their own inference and send the report back.
+    """
+    torch = sys.modules.get("torch")
+    cuda = torch is not None and torch.cuda.is_available()
+    if cuda:
+        torch.cuda.reset_peak_memory_stats()
+    rss_before = _peak_rss_mb()
+    sampler = _StackSampler(threading.get_ident(), interval_ms / 1000)
+    torch_profile = None
+    if torch is not None:
+        from torch.profiler import ProfilerActivity, profile
+        activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if cuda else [])
+        torch_profile = profile(activities=activities, profile_memory=True)
+
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        if torch_profile is not None:
+            with torch_profile:
+                result = function(*args, **kwargs)
+        else:
+            result = function(*args, **kwargs)
+    finally:
+        sampler.stop()
+    wall_sec = time.perf_counter() - started
+
+    rss_after = _peak_rss_mb()
+    report = {
+        "wall_sec": round(wall_sec, 4),
+        "sample_interval_ms": interval_ms,
+        "samples": sampler.samples,
+        "python": sampler.report(top),
+        "torch_ops": None,
+        "memory": {
+            "peak_rss_mb": rss_after,
+            # How far this call pushed the process's high-water mark
+            "peak_rss_growth_mb": round(rss_after - rss_before, 1) if rss_after is not None else None,
+            "cuda_peak_mb": round(torch.cuda.max_memory_allocated() / (1024 * 1024), 1) if cuda else None,
+        },
+    }
+    if torch_profile is not None:
+        try:
+            report["torch_ops"] = _torch_ops(torch_profile, top)
+        except Exception as e:
+            logger.warning(f"Could not summarize the torch profile: {e}")
+    return result, report
+
+
+class ProfilingSettings:
+    """Who may profile, how often, and where reports are kept.
+
+    ``token`` (when set) must be sent in the X-Profile-Token header.
+    Of the requests that ask for a profile, a ``sample_rate`` fraction is
+    profiled, never two at once and at most one per ``min_interval_sec``;
+    the others run normally and say why they weren't profiled. The newest
+    ``max_reports`` reports are kept in ``report_dir``.
+    """
+
+    def __init__(self,
+                 enabled: bool = False,
+                 token: Optional[str] = None,
+                 sample_rate: float = 1.0,
+                 min_interval_sec: float = 10.0,
+                 report_dir: str = DEFAULT_PROFILE_DIR,
+                 max_reports: int = 200):
+        self.enabled = enabled
+        self.token = token
+        self.sample_rate = sample_rate
+        self.min_interval_sec = min_interval_sec
+        self.report_dir = report_dir
+        self.max_reports = max_reports
+        self._lock = threading.Lock()
+        self._active = False
+        self._last_started = float("-inf")
+        self.profiled = 0
+        self.skipped: Counter = Counter()
+
+    def configure(self, enabled: bool, token: Optional[str], sample_rate: float, min_interval_sec: float,
+                  report_dir: str, max_reports: int) -> None:
+        self.enabled = enabled
+        self.token = token
+        self.sample_rate = sample_rate
+        self.min_interval_sec = min_interval_sec
+        self.report_dir = report_dir
+        self.max_reports = max_reports
+
+    def access_error(self, token: Optional[str]) -> Optional[str]:
+        """Error code when a profile may not be requested with token, else None"""
+        if not self.enabled:
+            return "profiling_disabled"
+        if self.token and not hmac.compare_digest((token or "").encode(), self.token.encode()):
+            return "invalid_profile_token"
+        return None
+
+    def acquire(self) -> Optional[str]:
+        """Take the profiling slot; returns why not (sampled_out, rate_limited, busy) or None.
+
+        Whoever gets None must call release() once the profiled call is done.
+        """
+        with self._lock:
+            reason = None
+            if random.random() >= self.sample_rate:
+                reason = "sampled_out"
+            elif self._active:
+                reason = "busy"
+            elif time.monotonic() - self._last_started < self.min_interval_sec:
+                reason = "rate_limited"
+            if reason is not None:
+                self.skipped[reason] += 1
+                return reason
+            self._active = True
+            self._last_started = time.monotonic()
+            self.profiled += 1
+            return None
+
+    def release(self) -> None:
+        with self._lock:
+            self._active = False
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.report_dir, f"{profile_id}.json")
+
+    def save(self, report: Dict, **context: Any) -> str:
+        """Keep a report with what was profiled (model, file, ...); returns its profile_id"""
+        profile_id = uuid4().hex
+        report = {"profile_id": profile_id, "created": time.time(), **context, **report}
+        os.makedirs(self.report_dir, exist_ok=True)
+        tmp_path = self._path(profile_id) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f)
+        os.replace(tmp_path, self._path(profile_id))
+        self._prune()
+        return profile_id
+
+    def _prune(self) -> None:
+        names = [name for name in os.listdir(self.report_dir) if name.endswith(".json")]
+        if len(names) <= self.max_reports:
+            return
+        paths = sorted((os.path.join(self.report_dir, name) for name in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_reports]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        # Ids are uuid hex; anything else could walk out of report_dir
+        if len(profile_id) != 32 or not all(c in "0123456789abcdef" for c in profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        """Newest reports first, without their frame and operator tables"""
+        if not os.path.isdir(self.report_dir):
+            return []
+        paths = sorted((os.path.join(self.report_dir, name) for name in os.listdir(self.report_dir)
+                        if name.endswith(".json")), key=os.path.getmtime, reverse=True)[:limit]
+        reports = []
+        for path in paths:
+            try:
+                with open(path) as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+            reports.append({key: value for key, value in report.items() if key not in ("python", "torch_ops")})
+        return reports
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "token_required": bool(self.token),
+                "sample_rate": self.sample_rate,
+                "min_interval_sec": self.min_interval_sec,
+                "report_dir": self.report_dir,
+                "profiled": self.profiled,
+                "skipped": dict(self.skipped),
+            }
+
+
+# Set by --profiling and the --profile-* flags. Only the server process decides what to
+# profile and saves reports; workers just run run_profiled and send the report back.
+profiling = ProfilingSettings()
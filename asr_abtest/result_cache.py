@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Chunk size used when hashing spooled files and upload streams
+HASH_CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_CACHE_DIR = "transcription_cache"
+
+
+def audio_digest(source: Union[bytes, bytearray, str, BinaryIO]) -> str:
+    """SHA-256 of encoded audio given as bytes, a file path or a binary file object"""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+        return digest.hexdigest()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def cache_key(digest: str, model_id: str, generate_kwargs: Dict) -> str:
+    """Key for one transcription: the audio, the model and every decoding option"""
+    material = json.dumps(
+        {"audio": digest, "model_id": model_id, "generate_kwargs": generate_kwargs},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache of raw pipeline results keyed by ``cache_key``.
+
+    Results are stored as JSON: an in-memory LRU tier bounded by
+    ``max_memory_bytes`` in front of a directory of files bounded by
+    ``max_disk_bytes``. Disk entries are evicted oldest-access first and are
+    shared by every process pointed at the same directory, so uvicorn
+    workers and repeated benchmark runs reuse each other's transcripts.
+    """
+
+    def __init__(self,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = 1024 * 1024 * 1024,
+                 enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        # Lazily populated from a scan of cache_dir: key -> (size, last access)
+        self._disk: Optional[Dict[str, list]] = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _disk_index(self) -> Dict[str, list]:
+        """Index of on-disk entries, built on first use (lock held)"""
+        if self._disk is None:
+            self._disk = {}
+            self._disk_bytes = 0
+            if self.cache_dir and os.path.isdir(self.cache_dir):
+                for root, _, names in os.walk(self.cache_dir):
+                    for name in names:
+                        if not name.endswith(".json"):
+                            continue
+                        stat = os.stat(os.path.join(root, name))
+                        self._disk[name[:-len(".json")]] = [stat.st_size, stat.st_mtime]
+                        self._disk_bytes += stat.st_size
+        return self._disk
+
+    def _remember(self, key: str, payload: str) -> None:
+        """Insert into the memory tier and trim it (lock held)"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = payload
+        self._memory_bytes += len(payload)
+        self._trim_memory()
+
+    def _trim_memory(self) -> None:
+        while self._memory and self._memory_bytes > self.max_memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_bytes -= len(dropped)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached result for key, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(payload)
+
+        payload = None
+        if self.cache_dir:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    payload = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                payload = None
+
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            entry = self._disk_index().get(key)
+            if entry is not None:
+                entry[1] = time.time()
+            self._remember(key, payload)
+        return json.loads(payload)
+
+    def put(self, key: str, result: Any) -> None:
+        """Store a JSON-serialisable result in both tiers"""
+        if not self.enabled:
+            return
+        payload = json.dumps(result, default=float)
+        with self._lock:
+            self._remember(key, payload)
+            self.stores += 1
+        if not self.cache_dir:
+            return
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers in other processes never see half a file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            index = self._disk_index()
+            old = index.get(key)
+            if old is not None:
+                self._disk_bytes -= old[0]
+            index[key] = [len(payload.encode("utf-8")), os.path.getmtime(path)]
+            self._disk_bytes += index[key][0]
+            self._evict_disk(keep=key)
+
+    def _evict_disk(self, keep: str) -> None:
+        """Delete least recently used files until the disk tier fits (lock held)"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        for key, (size, _) in sorted(self._disk.items(), key=lambda item: item[1][1]):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._disk[key]
+            self._disk_bytes -= size
+            self.evictions += 1
+
+    def configure(self,
+                  cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                  max_memory_bytes: Optional[int] = None,
+                  max_disk_bytes: Optional[int] = None,
+                  enabled: bool = True) -> None:
+        with self._lock:
+            self.enabled = enabled
+            if cache_dir != self.cache_dir:
+                self.cache_dir = cache_dir
+                self._disk = None
+            if max_memory_bytes is not None:
+                self.max_memory_bytes = max_memory_bytes
+                self._trim_memory()
+            if max_disk_bytes is not None:
+                self.max_disk_bytes = max_disk_bytes
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self.cache_dir:
+                for key in list(self._disk_index()):
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+            self._disk = {}
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            if self.cache_dir:
+                self._disk_index()
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "cache_dir": self.cache_dir,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_entries": len(self._disk or {}),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by the transcription endpoint and the benchmark processor
+result_cache = ResultCache()
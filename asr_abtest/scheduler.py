@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from .executor import InferenceExecutor
+from .metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the inference queue is at capacity"""
+
+
+def _set_exception(future: asyncio.Future, error: Exception) -> None:
+    if not future.done():
+        future.set_exception(error)
+
+
+class _PendingRequest:
+    __slots__ = ("model_id", "audio", "generate_kwargs", "precision", "future", "enqueued_at", "key")
+
+    def __init__(self, model_id: str, audio: Any, generate_kwargs: Dict, future: asyncio.Future,
+                 precision: Optional[str] = None):
+        self.model_id = model_id
+        self.audio = audio
+        self.precision = precision
+        self.generate_kwargs = generate_kwargs
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+        # Only requests with identical model, precision and decoding options can share a batch
+        self.key = (model_id, precision, json.dumps(generate_kwargs, sort_keys=True, default=str))
+
+
+class InferenceScheduler:
+    """Collects transcription requests into batches for the HF pipeline.
+
+    Requests wait in a bounded queue. A single worker takes the first waiting
+    request, then keeps collecting until either ``max_batch_size`` requests
+    are gathered or ``max_wait_ms`` has passed, and hands each group of
+    compatible requests to ``run_batch(model_id, inputs, generate_kwargs, precision)``
+    on the inference executor. Up to one batch per executor worker is in
+    flight at a time.
+    """
+
+    def __init__(self,
+                 run_batch: Callable[[str, List[Any], Dict, Optional[str]], List[Dict]],
+                 executor: InferenceExecutor,
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 50.0,
+                 max_queue_size: int = 256):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: set = set()
+        # Taken off the queue but not yet handed to a batch; kept here so a
+        # stopped worker's batch is picked up again on restart
+        self._held: List[_PendingRequest] = []
+
+        # Metrics
+        self.requests_submitted = 0
+        self.requests_completed = 0
+        self.requests_failed = 0
+        self.requests_rejected = 0
+        self.batches_run = 0
+        self.batch_size_histogram: Counter = Counter()
+        self.last_batch_size = 0
+        self.total_wait_ms = 0.0
+        self.max_observed_wait_ms = 0.0
+        self.total_inference_ms = 0.0
+
+    def start(self) -> None:
+        """Create the queue and worker on the running event loop.
+
+        A restart on the same loop keeps the queue, so requests waiting in it
+        are still served. Requests queued on an earlier loop can't be, and
+        are failed instead.
+        """
+        if self._worker is not None and not self._worker.done():
+            return
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._fail_pending(RuntimeError("Inference scheduler was restarted on another event loop"))
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._slots = asyncio.Semaphore(self.executor.workers)
+            self._loop = loop
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Inference scheduler started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait_ms}, max_queue_size={self.max_queue_size})")
+
+    def _fail_pending(self, error: Exception) -> None:
+        """Fail every request still waiting, on the loop its caller waits on"""
+        if self._queue is None:
+            return
+        waiting = self._held
+        self._held = []
+        while not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for request in waiting:
+            if not request.future.done() and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(_set_exception, request.future, error)
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, model_id: str, audio: Any, generate_kwargs: Dict,
+                     precision: Optional[str] = None) -> Dict:
+        """Queue one transcription and wait for its result"""
+        if self._worker is None or self._worker.done():
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        request = _PendingRequest(model_id, audio, generate_kwargs, future, precision)
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.requests_rejected += 1
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_size} requests waiting)")
+        self.requests_submitted += 1
+        return await future
+
+    async def _collect_batch(self) -> None:
+        """Move the next batch of requests from the queue into _held"""
+        self._held.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+        while len(self._held) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._held.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        while True:
+            if not self._held:
+                await self._collect_batch()
+            groups: Dict[tuple, List[_PendingRequest]] = {}
+            for request in self._held:
+                groups.setdefault(request.key, []).append(request)
+            for requests in groups.values():
+                await self._slots.acquire()
+                self._held = [r for r in self._held if r not in requests]
+                task = asyncio.create_task(self._run_group(requests))
+                self._inflight.add(task)
+                task.add_done_callback(self._group_done)
+
+    def _group_done(self, task: asyncio.Task) -> None:
+        self._inflight.discard(task)
+        self._slots.release()
+
+    async def _run_group(self, requests: List[_PendingRequest]) -> None:
+        # Callers that disconnected while queued don't need inference
+        requests = [r for r in requests if not r.future.done()]
+        if not requests:
+            return
+
+        started = time.perf_counter()
+        model_id = requests[0].model_id
+        for request in requests:
+            wait_ms = (started - request.enqueued_at) * 1000
+            self.total_wait_ms += wait_ms
+            self.max_observed_wait_ms = max(self.max_observed_wait_ms, wait_ms)
+            STAGE_SECONDS.observe(wait_ms / 1000, stage="queue_wait", model=model_id)
+        self.batches_run += 1
+        self.last_batch_size = len(requests)
+        self.batch_size_histogram[len(requests)] += 1
+
+        generate_kwargs = requests[0].generate_kwargs
+        inputs = [r.audio for r in requests]
+        try:
+            results = await self.executor.run(self.run_batch, model_id, inputs, generate_kwargs,
+                                              requests[0].precision)
+        except Exception as e:
+            logger.error(f"Batch of {len(requests)} failed for {model_id}: {e}", exc_info=True)
+            self.requests_failed += len(requests)
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self.total_inference_ms += (time.perf_counter() - started) * 1000
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="inference", model=model_id)
+
+        self.requests_completed += len(requests)
+        for request, result in zip(requests, results):
+            if not request.future.done():
+                request.future.set_result(result)
+
+    def metrics(self) -> Dict:
+        """Snapshot of queue and batching statistics"""
+        served = self.requests_completed + self.requests_failed
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "requests_submitted": self.requests_submitted,
+            "requests_completed": self.requests_completed,
+            "requests_failed": self.requests_failed,
+            "requests_rejected": self.requests_rejected,
+            "batches_run": self.batches_run,
+            "last_batch_size": self.last_batch_size,
+            "mean_batch_size": round(served / self.batches_run, 3) if self.batches_run else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_size_histogram.items())},
+            "mean_wait_ms": round(self.total_wait_ms / served, 3) if served else 0.0,
+            "max_wait_ms_observed": round(self.max_observed_wait_ms, 3),
+            "mean_batch_inference_ms": round(self.total_inference_ms / self.batches_run, 3) if self.batches_run else 0.0,
+        }
@@ -1,23 +1,36 @@
+import asyncio
+import gzip
 import json
-from fastapi import FastAPI, UploadFile, Form, HTTPException, File, Response
+import zlib
+from fastapi import FastAPI, UploadFile, Form, HTTPException, File, Response, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-import torch
-from transformers import pipeline
 import os
 import argparse
 import uvicorn
-from transformers import AutoTokenizer
 import time
 from datetime import datetime
 from enum import Enum
+from collections import Counter
 from typing import Optional, Literal, List, Union
 from pydantic import BaseModel, Field
 from .benchmark import BenchmarkProcessor
+from .scheduler import InferenceScheduler, QueueFullError
+from .executor import inference_executor, EXECUTOR_MODES
+from .model_pool import model_pool, PRECISIONS, cache_kwargs as precision_cache_kwargs
+from .snapshots import snapshots, prefetch, DEFAULT_SNAPSHOT_DIR
+from .audio import decode_audio, pipeline_input, probe_duration, SAMPLING_RATE
+from .longform import long_form as long_form_settings, cache_kwargs, transcribe_windows
+from .vad import vad as vad_settings, apply_vad, restore_timestamps, NO_SPEECH_RESULT
+from .vad import cache_kwargs as vad_cache_kwargs
+from .result_cache import result_cache, audio_digest, cache_key
+from .metrics import registry, stage, record_rtf, REQUEST_SECONDS
+from .profiling import profiling, run_profiled, DEFAULT_PROFILE_DIR
 import logging
 import shutil
+from uuid import uuid4
 from io import BytesIO
-import pandas as pd
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 
 app = FastAPI()
 
@@ -64,30 +77,91 @@ benchmark_processor = BenchmarkProcessor()
 
 logger = logging.getLogger(__name__)
 
+# Uploads are copied to disk in chunks of this size instead of read whole
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Idle progress streams get a comment line this often
+SSE_KEEPALIVE_SEC = 15.0
+
+# Run statuses a progress stream stays open for; any other status is final
+SSE_LIVE_STATUSES = ("queued", "running")
+
 def validate_audio_format(filename: str) -> bool:
     """Validate if the audio file format is supported"""
     ext = os.path.splitext(filename)[1].lower()
     return ext in SUPPORTED_AUDIO_FORMATS
 
-def load_model(model_id):
+async def spool_upload(upload: UploadFile, path: str) -> int:
+    """Stream an upload to path chunk by chunk and return the number of bytes written"""
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+def load_model(model_id, precision: Optional[str] = None):
+    """Fetch model_id from the shared model pool, loading it on first use"""
     global current_model, current_model_id, transcriber
-    if model_id != current_model_id:
-        print(f"Loading model: {model_id}")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        # First load the tokenizer with our specific settings
-        tokenizer = AutoTokenizer.from_pretrained(model_id, use_fast=False)
-        
-        transcriber = pipeline("automatic-speech-recognition", 
-                             model=model_id,
-                             tokenizer=tokenizer,
-                             chunk_length_s=30,
-                             return_timestamps="word",
-                             device=device)
-        current_model_id = model_id
-        current_model = transcriber
-        print(f"Model loaded successfully: {model_id}")
+    transcriber = model_pool.get(model_id, precision=precision)
+    current_model_id = model_id
+    current_model = transcriber
     return transcriber
 
+def transcribe_long(model_id: str, audio, generate_kwargs: dict, params: dict,
+                    precision: Optional[str] = None) -> dict:
+    """Long-form transcription of one decoded recording, batched by window"""
+    return transcribe_windows(load_model(model_id, precision), audio, generate_kwargs, **params)
+
+def transcribe_batch(model_id: str, inputs: list, generate_kwargs: dict, precision: Optional[str] = None) -> list:
+    """Run a batch of inputs through the pipeline for model_id.
+
+    Module level so it can also run inside process-pool workers, where
+    load_model keeps that worker's own copy of the model.
+    """
+    transcriber = load_model(model_id, precision)
+    return list(transcriber(
+        inputs,
+        batch_size=len(inputs),
+        return_timestamps="word",
+        generate_kwargs=generate_kwargs
+    ))
+
+def transcribe_profiled(model_id: str, audio, generate_kwargs: dict, long_form_params: Optional[dict],
+                        precision: Optional[str] = None):
+    """One recording under the profilers, outside the scheduler's batches; returns the result and report"""
+    if long_form_params:
+        return run_profiled(transcribe_long, model_id, audio, generate_kwargs, long_form_params, precision)
+    results, report = run_profiled(transcribe_batch, model_id, [pipeline_input(audio)], generate_kwargs, precision)
+    return results[0], report
+
+def profile_access(token: Optional[str]) -> None:
+    """Reject a profile request unless profiling is enabled and token is right"""
+    error = profiling.access_error(token)
+    if error is not None:
+        raise HTTPException(
+            status_code=403,
+            detail={
+                "error": "Profiling is disabled on this server" if error == "profiling_disabled"
+                         else "Missing or wrong X-Profile-Token header",
+                "code": error,
+                "param": "profile"
+            }
+        )
+
+async def ensure_model(model_id: str) -> None:
+    """Load model_id on the inference executor without blocking the event loop"""
+    global current_model_id
+    await inference_executor.run(load_model, model_id)
+    # In process mode the load happened in a worker; record it here as well
+    current_model_id = model_id
+
+# Batches concurrent /audio/transcriptions requests through the pipeline
+inference_scheduler = InferenceScheduler(transcribe_batch, inference_executor)
+
 def get_available_models():
     with open("models.json") as f:
         return json.load(f)["model_id"]
@@ -97,6 +171,34 @@ async def list_models():
     """Return list of available models"""
     return {"models": get_available_models()}
 
+@app.get("/models/loaded")
+async def list_loaded_models():
+    """Return the models currently held in the model pool"""
+    return model_pool.stats()
+
+@app.get("/models/snapshots")
+async def list_snapshots():
+    """Models resolved into the local snapshot directory, which load without the Hub"""
+    loop = asyncio.get_running_loop()
+    return {"snapshot_dir": snapshots.root, "offline": snapshots.offline,
+            "snapshots": await loop.run_in_executor(None, snapshots.list)}
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness: 503 until the warm-up model has finished loading"""
+    if warmup_task is not None and not warmup_task.done():
+        response.status_code = 503
+        return {"status": "loading", "model": warmup_model_id}
+    if warmup_task is not None and not warmup_task.cancelled() and warmup_task.exception() is not None:
+        response.status_code = 503
+        return {"status": "error", "model": warmup_model_id, "error": str(warmup_task.exception())}
+    return {"status": "ready", "model": current_model_id}
+
 @app.get("/current-model")
 async def get_current_model():
     """Return currently loaded model"""
@@ -106,7 +208,7 @@ async def get_current_model():
 async def change_model(model_id: str = Form(...)):
     """Change the current model"""
     try:
-        transcriber = load_model(model_id)
+        await ensure_model(model_id)
         return {
             "success": True,
             "model": model_id
@@ -125,9 +227,17 @@ async def create_transcription(
     language: Optional[str] = Form(None),
     prompt: Optional[str] = Form(None),
     response_format: ResponseFormat = Form(ResponseFormat.json),
-    temperature: float = Form(0.0)
+    temperature: float = Form(0.0),
+    long_form: Optional[bool] = Form(None),
+    vad: Optional[bool] = Form(None),
+    precision: Optional[str] = Form(None),
+    profile: bool = Form(False),
+    x_profile_token: Optional[str] = Header(None)
 ):
     """OpenAI-like transcription endpoint"""
+    request_started = time.perf_counter()
+    status = "error"
+    profiled = False
     try:
         if not validate_audio_format(file.filename):
             raise HTTPException(
@@ -138,16 +248,30 @@ async def create_transcription(
                     "param": "file"
                 }
             )
+        if precision is not None and precision not in PRECISIONS:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": f"Unsupported precision; choose from {', '.join(PRECISIONS)}",
+                    "code": "unsupported_precision",
+                    "param": "precision"
+                }
+            )
+        precision = model_pool.resolve_precision(precision)
+        
+        # Requested profiles are sampled; the others run as usual and say why
+        profile_report = None
+        if profile:
+            profile_access(x_profile_token)
+            skipped = profiling.acquire()
+            profiled = skipped is None
+            if not profiled:
+                profile_report = {"skipped": skipped}
 
         start_time = time.time()
-        transcriber = load_model(model_id)
-        
-        # Save uploaded file temporarily
-        temp_path = f"temp_audio{os.path.splitext(file.filename)[1]}"
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
-        
-        file_size = os.path.getsize(temp_path)
+        loop = asyncio.get_running_loop()
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
         
         # Prepare generation kwargs
         generate_kwargs = {
@@ -158,41 +282,94 @@ async def create_transcription(
         if prompt:
             generate_kwargs["prompt"] = prompt
 
-        # Transcribe
-        result = transcriber(
-            temp_path,
-            return_timestamps="word",
-            generate_kwargs=generate_kwargs
-        )
+        # Long recordings (or long_form=true) are windowed and batched by window
+        with stage("upload_io"):
+            duration = await loop.run_in_executor(None, probe_duration, file.file)
+            digest = await loop.run_in_executor(None, audio_digest, file.file)
+        audio = None
+        # The extension lets mp4/m4a uploads reach ffmpeg as a seekable file
+        suffix = os.path.splitext(file.filename)[1]
+        if duration is None and long_form is None:
+            # No header duration (e.g. a compressed upload without a path): decode
+            # first so the long-form choice and the cache key see the real length
+            with stage("decode"):
+                audio = await loop.run_in_executor(None, decode_audio, file.file, SAMPLING_RATE, suffix)
+            duration = len(audio) / SAMPLING_RATE
+        long_form_params = long_form_settings.params(duration, long_form)
+        vad_params = vad_settings.params(vad)
         
-        # Clean up
-        os.remove(temp_path)
+        # Identical audio with identical settings was already transcribed
+        key = cache_key(digest, model_id,
+                        precision_cache_kwargs(
+                            vad_cache_kwargs(cache_kwargs(generate_kwargs, long_form_params), vad_params), precision
+                        ))
+        # A profiled request always runs inference, there is nothing to profile in a cache hit
+        result = None if profiled else await loop.run_in_executor(None, result_cache.get, key)
+        if result is None:
+            # Decode the upload straight into a 16 kHz array
+            if audio is None:
+                with stage("decode"):
+                    audio = await loop.run_in_executor(None, decode_audio, file.file, SAMPLING_RATE, suffix)
+            if not duration:
+                duration = len(audio) / SAMPLING_RATE
+            
+            # Trim to the detected speech; timestamps are mapped back below
+            layout = None
+            if vad_params:
+                with stage("vad"):
+                    audio, layout = await loop.run_in_executor(None, apply_vad, audio, vad_params)
+            
+            if not len(audio):
+                result = dict(NO_SPEECH_RESULT)
+            elif profiled:
+                with stage("inference", model_id):
+                    result, report = await inference_executor.run(transcribe_profiled, model_id, audio,
+                                                                  generate_kwargs, long_form_params, precision)
+                profile_id = await loop.run_in_executor(None, lambda: profiling.save(
+                    report, source="api", model_id=model_id, precision=precision, files=[file.filename],
+                    duration_sec=duration
+                ))
+                profile_report = {"profile_id": profile_id, **report}
+            elif long_form_params:
+                # Already a batch of its own; goes straight to the executor
+                with stage("inference", model_id):
+                    result = await inference_executor.run(transcribe_long, model_id, audio, generate_kwargs,
+                                                          long_form_params, precision)
+            else:
+                # Transcribe via the batching scheduler
+                result = await inference_scheduler.submit(model_id, pipeline_input(audio), generate_kwargs, precision)
+            if layout is not None:
+                result = {**restore_timestamps(result, layout), "speech_sec": layout["speech_sec"]}
+            await loop.run_in_executor(None, result_cache.put, key, result)
         
         # Calculate processing time
         processing_time = round(time.time() - start_time, 4)
+        record_rtf(model_id, "api", processing_time, duration)
+        status = "ok"
         
         # Format response based on requested format
         if response_format == ResponseFormat.text:
             return result["text"]
             
         # Process words and create response
-        words = []
-        if isinstance(result, dict) and "chunks" in result:
-            for chunk in result["chunks"]:
-                if "text" in chunk and "timestamp" in chunk:
-                    words.append({
-                        "text": chunk["text"].strip(),
-                        "start": chunk["timestamp"][0],
-                        "end": chunk["timestamp"][1] if chunk["timestamp"][1] is not None else -1
-                    })
-
-        # Filter and fix timestamps
-        words = [w for w in words if w["text"].strip()]
-        for i in range(len(words)-1):
-            if words[i]["end"] == -1:
-                words[i]["end"] = words[i+1]["start"]
-        if words and words[-1]["end"] == -1:
-            words[-1]["end"] = words[-1]["start"] + 0.5
+        with stage("word_postprocess"):
+            words = []
+            if isinstance(result, dict) and "chunks" in result:
+                for chunk in result["chunks"]:
+                    if "text" in chunk and "timestamp" in chunk:
+                        words.append({
+                            "text": chunk["text"].strip(),
+                            "start": chunk["timestamp"][0],
+                            "end": chunk["timestamp"][1] if chunk["timestamp"][1] is not None else -1
+                        })
+
+            # Filter and fix timestamps
+            words = [w for w in words if w["text"].strip()]
+            for i in range(len(words)-1):
+                if words[i]["end"] == -1:
+                    words[i]["end"] = words[i+1]["start"]
+            if words and words[-1]["end"] == -1:
+                words[-1]["end"] = words[-1]["start"] + 0.5
 
         response = {
             "text": result["text"],
@@ -201,9 +378,14 @@ async def create_transcription(
             "processing_duration_sec": float(format(processing_time, '.4f')),
             "file_size_kb": round(file_size / 1024, 2),
             "model_id": model_id,
+            "precision": precision,
             "prompt": prompt if prompt else None,
             "temperature": float(temperature) if temperature else 0.0,
-            "language": language if language else None
+            "language": language if language else None,
+            "long_form": long_form_params is not None,
+            "vad": vad_params is not None,
+            "speech_sec": result.get("speech_sec"),
+            "profile": profile_report
         }
 
         if response_format == ResponseFormat.text:
@@ -214,6 +396,18 @@ async def create_transcription(
             return response  # Return all data including metadata
         # TODO: Implement SRT and VTT formats
         
+    except HTTPException:
+        status = "rejected"
+        raise
+    except QueueFullError as e:
+        status = "rejected"
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": str(e),
+                "code": "queue_full",
+            }
+        )
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -222,15 +416,29 @@ async def create_transcription(
                 "code": "transcription_error",
             }
         )
+    finally:
+        if profiled:
+            profiling.release()
+        REQUEST_SECONDS.observe(time.perf_counter() - request_started, endpoint="/audio/transcriptions",
+                                status=status)
 
 # Keep the old endpoint for backward compatibility
 @app.post("/transcribe")
 async def transcribe_audio(audio: UploadFile, model_id: str = Form("openai/whisper-small")):
     """Legacy transcription endpoint"""
+    # Called directly, so every parameter needs a real value rather than its Form()/Header() default
     result = await create_transcription(
         file=audio,
         model_id=model_id,
-        response_format=ResponseFormat.verbose_json
+        language=None,
+        prompt=None,
+        response_format=ResponseFormat.verbose_json,
+        temperature=0.0,
+        long_form=None,
+        vad=None,
+        precision=None,
+        profile=False,
+        x_profile_token=None
     )
     return {"success": True, **result}
 
@@ -244,9 +452,162 @@ async def get_config():
         "current_model": current_model_id
     }
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and tier sizes of the transcription result cache"""
+    return await asyncio.get_running_loop().run_in_executor(None, result_cache.stats)
+
+@app.post("/cache/clear")
+async def clear_cache():
+    """Drop every cached transcription"""
+    await asyncio.get_running_loop().run_in_executor(None, result_cache.clear)
+    return {"status": "success"}
+
+@app.get("/scheduler/metrics")
+async def get_scheduler_metrics():
+    """Queue depth, batch size and wait time statistics of the inference scheduler"""
+    return inference_scheduler.metrics()
+
+# State kept elsewhere, read whenever /metrics is scraped
+registry.gauge("asr_queue_depth", "Requests waiting in the batching scheduler").set_function(
+    lambda: inference_scheduler.metrics()["queue_depth"])
+registry.counter("asr_scheduler_requests_total", "Scheduler requests by outcome", ("outcome",)).set_function(
+    lambda: {(outcome,): inference_scheduler.metrics()[f"requests_{outcome}"]
+             for outcome in ("submitted", "completed", "failed", "rejected")})
+registry.counter("asr_scheduler_batches_total", "Batches run by the scheduler").set_function(
+    lambda: inference_scheduler.batches_run)
+registry.gauge("asr_models_loaded", "Models held in the model pool").set_function(
+    lambda: len(model_pool.stats()["loaded"]))
+registry.gauge("asr_model_pool_bytes", "Approximate memory held by pooled models").set_function(
+    model_pool.total_bytes)
+registry.counter("asr_model_pool_events_total", "Model pool hits, misses, loads and evictions", ("event",)).set_function(
+    lambda: {(event,): getattr(model_pool, event) for event in ("hits", "misses", "loads", "evictions")})
+registry.counter("asr_result_cache_lookups_total", "Result cache lookups by outcome", ("outcome",)).set_function(
+    lambda: {("memory_hit",): result_cache.memory_hits, ("disk_hit",): result_cache.disk_hits,
+             ("miss",): result_cache.misses})
+registry.gauge("asr_benchmark_runs", "Benchmark runs held by this worker, by status", ("status",)).set_function(
+    lambda: dict(Counter((run["status"],) for run in list(benchmark_processor.active_benchmarks.values()))))
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage latency, real-time factor, queue and pool metrics in the Prometheus text format"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/profiles")
+async def list_profiles(limit: int = Query(50, ge=1, le=1000),
+                        x_profile_token: Optional[str] = Header(None)):
+    """Profiling settings and the newest profile reports, without their frame and operator tables"""
+    profile_access(x_profile_token)
+    loop = asyncio.get_running_loop()
+    return {**profiling.stats(), "profiles": await loop.run_in_executor(None, profiling.list, limit)}
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """One profile report, as linked from a transcription response or benchmark result row"""
+    profile_access(x_profile_token)
+    report = await asyncio.get_running_loop().run_in_executor(None, profiling.get, profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+# main() hands its settings to uvicorn worker processes through this variable
+SERVER_CONFIG_ENV = "ASR_ABTEST_SERVER_CONFIG"
+
+# Set by --resume-interrupted; checkpointed runs are queued again in startup_event
+resume_interrupted_runs = False
+
+# Set by --prefetch-snapshots; models.json is resolved into snapshots in startup_event
+prefetch_snapshots = False
+
+# Model loaded in the background once the server accepts connections, so
+# replicas pass their health check before torch and the weights are loaded
+warmup_model_id: Optional[str] = None
+warmup_task: Optional[asyncio.Task] = None
+
+def _warmup_done(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Warm-up load of {warmup_model_id} failed: {task.exception()}")
+
+def apply_model_settings(config: dict) -> None:
+    """Model pool limits and snapshot settings, in this process or a process-executor worker"""
+    max_gb = config.get("max_model_memory_gb")
+    model_pool.configure(config["max_models"], int(max_gb * 1024 ** 3) if max_gb else None, config["precision"])
+    snapshots.configure(config["snapshot_dir"], config["offline_models"])
+
+def apply_server_config(config: dict) -> None:
+    """Apply command line settings to this process's model pool, executor and scheduler"""
+    apply_model_settings(config)
+    
+    # Process workers load their own models, so they get the same settings
+    inference_executor.configure(config["executor"], config["executor_workers"],
+                                 initializer=apply_model_settings, initargs=(config,))
+    
+    inference_scheduler.max_batch_size = config["max_batch_size"]
+    inference_scheduler.max_wait_ms = config["max_wait_ms"]
+    inference_scheduler.max_queue_size = config["max_queue_size"]
+    
+    benchmark_processor.export_files = config["export_results"]
+    benchmark_processor.max_finished_runs = config["max_finished_runs"]
+    benchmark_processor.max_concurrent_runs = config["max_concurrent_runs"]
+    benchmark_processor.batch_size = config["benchmark_batch_size"]
+    benchmark_processor.max_finished_idle_sec = config["finished_run_idle_min"] * 60
+    benchmark_processor.max_finished_bytes = int(config["finished_run_memory_mb"] * 1024 ** 2)
+    global resume_interrupted_runs, prefetch_snapshots
+    resume_interrupted_runs = config["resume_interrupted"]
+    prefetch_snapshots = config["prefetch_snapshots"]
+    
+    long_form_settings.configure(
+        threshold_s=config["long_form_threshold_s"],
+        batch_size=config["long_form_batch_size"],
+        window_s=config["long_form_window_s"],
+        overlap_s=config["long_form_overlap_s"],
+    )
+    
+    vad_settings.configure(
+        enabled=config["vad"],
+        margin_db=config["vad_margin_db"],
+        min_silence_ms=config["vad_min_silence_ms"],
+        pad_ms=config["vad_pad_ms"],
+    )
+    
+    profiling.configure(
+        enabled=config["profiling"],
+        token=config["profile_token"],
+        sample_rate=config["profile_sample_rate"],
+        min_interval_sec=config["profile_min_interval_sec"],
+        report_dir=config["profile_dir"],
+        max_reports=config["max_profiles"],
+    )
+    
+    result_cache.configure(
+        cache_dir=config["cache_dir"],
+        max_memory_bytes=int(config["cache_memory_mb"] * 1024 ** 2),
+        max_disk_bytes=int(config["cache_disk_mb"] * 1024 ** 2),
+        enabled=not config["no_cache"],
+    )
+
 @app.on_event("startup")
 async def startup_event():
     """Print all registered routes on startup"""
+    global warmup_model_id, warmup_task
+    worker_config = os.environ.get(SERVER_CONFIG_ENV)
+    if worker_config:
+        # Started as one of several uvicorn workers: configure and warm up this process
+        config = json.loads(worker_config)
+        apply_server_config(config)
+        warmup_model_id = config["model"]
+    if warmup_model_id:
+        # Requests that need the model before this finishes wait on the same load
+        warmup_task = asyncio.create_task(ensure_model(warmup_model_id))
+        warmup_task.add_done_callback(_warmup_done)
+    if prefetch_snapshots:
+        # Downloads run in the background; a model's first load waits on its own resolve
+        asyncio.get_running_loop().run_in_executor(None, prefetch, get_available_models())
+    inference_scheduler.start()
+    if resume_interrupted_runs:
+        resumed = await benchmark_processor.resume_interrupted()
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} interrupted benchmark runs: {', '.join(resumed)}")
     print("\nRegistered routes:")
     for route in app.routes:
         if hasattr(route, "methods"):
@@ -256,6 +617,7 @@ async def startup_event():
     print()
 
 def main():
+    global current_model_id, warmup_model_id
     parser = argparse.ArgumentParser(description='Start ASR server')
     parser.add_argument('--model', type=str, default="openai/whisper-small",
                         help='Initial model to load')
@@ -263,12 +625,113 @@ def main():
                        help='Host to bind to')
     parser.add_argument('--port', type=int, default=8000,
                        help='Port to bind to')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of uvicorn worker processes, each with its own models. '
+                             'Benchmark runs are tracked per worker, so keep benchmark clients on one worker')
+    parser.add_argument('--max-batch-size', type=int, default=8,
+                        help='Maximum number of transcription requests per inference batch')
+    parser.add_argument('--max-wait-ms', type=float, default=50.0,
+                        help='How long to wait for a batch to fill before running it')
+    parser.add_argument('--max-queue-size', type=int, default=256,
+                        help='Maximum number of queued transcription requests before rejecting')
+    parser.add_argument('--executor', type=str, choices=EXECUTOR_MODES, default="thread",
+                        help='Run model loads and inference in a thread pool or a process pool')
+    parser.add_argument('--executor-workers', type=int, default=1,
+                        help='Number of inference workers (each process worker holds its own model copy)')
+    parser.add_argument('--max-models', type=int, default=2,
+                        help='Maximum number of models kept loaded in the model pool')
+    parser.add_argument('--max-model-memory-gb', type=float, default=None,
+                        help='Evict least recently used models above this many GB of weights')
+    parser.add_argument('--precision', type=str, choices=PRECISIONS, default="fp32",
+                        help='Precision models load with unless a request or benchmark asks for another '
+                             '(int8: dynamic quantization on CPU, onnx: needs optimum[onnxruntime])')
+    parser.add_argument('--long-form-threshold-s', type=float, default=60.0,
+                        help='Transcribe recordings longer than this in long-form mode (0: only when requested)')
+    parser.add_argument('--long-form-batch-size', type=int, default=8,
+                        help='Long-form windows decoded per batch')
+    parser.add_argument('--long-form-window-s', type=float, default=30.0,
+                        help='Long-form window length in seconds (at most 30)')
+    parser.add_argument('--long-form-overlap-s', type=float, default=5.0,
+                        help='Overlap between consecutive long-form windows in seconds')
+    parser.add_argument('--vad', action='store_true',
+                        help='Trim silence with energy-based VAD before inference unless a request turns it off')
+    parser.add_argument('--vad-margin-db', type=float, default=12.0,
+                        help='How far above the noise floor a frame must be to count as speech')
+    parser.add_argument('--vad-min-silence-ms', type=float, default=300.0,
+                        help='Pauses shorter than this are kept inside a speech segment')
+    parser.add_argument('--vad-pad-ms', type=float, default=200.0,
+                        help='Audio kept on both sides of each speech segment')
+    parser.add_argument('--snapshot-dir', type=str, default=DEFAULT_SNAPSHOT_DIR,
+                        help='Directory of local model snapshots that models load from, shared by all workers')
+    parser.add_argument('--offline-models', action='store_true',
+                        help='Only load models that already have a snapshot; never download from the Hub')
+    parser.add_argument('--prefetch-snapshots', action='store_true',
+                        help='Resolve every model in models.json into a snapshot in the background at startup')
+    parser.add_argument('--profiling', action='store_true',
+                        help='Allow profile=true on transcription requests and benchmark runs')
+    parser.add_argument('--profile-token', type=str, default=os.environ.get("ASR_ABTEST_PROFILE_TOKEN"),
+                        help='Token profile requests must send in the X-Profile-Token header '
+                             '(default: $ASR_ABTEST_PROFILE_TOKEN; unset: no token needed)')
+    parser.add_argument('--profile-sample-rate', type=float, default=1.0,
+                        help='Fraction of profile requests that are actually profiled')
+    parser.add_argument('--profile-min-interval-sec', type=float, default=10.0,
+                        help='Minimum time between two profiled requests; one runs at a time')
+    parser.add_argument('--profile-dir', type=str, default=DEFAULT_PROFILE_DIR,
+                        help='Directory profile reports are kept in')
+    parser.add_argument('--max-profiles', type=int, default=200,
+                        help='Profile reports kept; the oldest are deleted first')
+    parser.add_argument('--cache-dir', type=str, default="transcription_cache",
+                        help='Directory for the on-disk transcription cache, shared by all workers')
+    parser.add_argument('--cache-memory-mb', type=float, default=64,
+                        help='Size of the in-memory transcription cache')
+    parser.add_argument('--cache-disk-mb', type=float, default=1024,
+                        help='Size of the on-disk transcription cache')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always run inference instead of reusing cached transcriptions')
+    parser.add_argument('--export-results', action='store_true',
+                        help='Also write each finished benchmark run as JSON and Excel files')
+    parser.add_argument('--max-concurrent-runs', type=int, default=1,
+                        help='Benchmark runs processed at once; further runs wait in a priority queue')
+    parser.add_argument('--benchmark-batch-size', type=int, default=8,
+                        help='Files of similar length transcribed per pipeline call in single-model benchmarks')
+    parser.add_argument('--max-finished-runs', type=int, default=20,
+                        help='Finished benchmark runs kept in memory; older ones are served from the benchmark store')
+    parser.add_argument('--finished-run-idle-min', type=float, default=60,
+                        help='Drop finished runs from memory after this many minutes without access')
+    parser.add_argument('--finished-run-memory-mb', type=float, default=256,
+                        help='Approximate memory budget for finished runs kept in memory')
+    parser.add_argument('--resume-interrupted', action='store_true',
+                        help='Resume benchmark runs left unfinished by a previous server (single worker only)')
     args = parser.parse_args()
+    config = vars(args)
+    if args.resume_interrupted and args.workers > 1:
+        parser.error("--resume-interrupted needs --workers 1, otherwise every worker resumes the same runs")
     
-    # Load default model on startup
-    load_model(args.model)
+    if args.workers > 1:
+        # Each worker imports the app fresh and applies the settings in startup_event
+        os.environ[SERVER_CONFIG_ENV] = json.dumps(config)
+        uvicorn.run("asr_abtest.server:app", host=args.host, port=args.port, workers=args.workers)
+        return
+    
+    apply_server_config(config)
+    
+    # Load default model once serving; process workers load their own copy lazily
+    if args.executor == "thread":
+        warmup_model_id = args.model
+    else:
+        current_model_id = args.model
     uvicorn.run(app, host=args.host, port=args.port)
 
+class BenchmarkModelConfig(BaseModel):
+    """One arm of a multi-model benchmark; unset fields inherit from the run config"""
+    model_id: str
+    label: Optional[str] = None
+    language: Optional[str] = None
+    prompt: Optional[str] = None
+    temperature: Optional[float] = None
+    vad: Optional[bool] = None
+    precision: Optional[Literal[PRECISIONS]] = None
+
 class BenchmarkRequest(BaseModel):
     format: str
     pattern: str
@@ -277,12 +740,32 @@ class BenchmarkRequest(BaseModel):
     prompt: Optional[str] = None
     temperature: float = 0.0
     response_format: str = "json"
+    # When set, every file is decoded once and run through each of these models
+    models: Optional[List[BenchmarkModelConfig]] = None
+    # Reuse cached transcriptions of identical audio and settings; disable to measure latency
+    use_cache: bool = True
+    # Queued runs with higher priority start first
+    priority: int = 0
+    # Long-form windowed transcription: None decides per file by duration
+    long_form: Optional[bool] = None
+    # Trim silence before inference: None uses the server's --vad setting
+    vad: Optional[bool] = None
+    # Run every model twice, without and with VAD, as separate arms
+    compare_vad: bool = False
+    # Weights precision: None uses the server's --precision setting
+    precision: Optional[Literal[PRECISIONS]] = None
+    # Run every model once per listed precision, as separate arms
+    compare_precisions: Optional[List[Literal[PRECISIONS]]] = None
+    # Profile inference (sampled like API requests); rows link their report by profile_id.
+    # Cached files aren't profiled, so combine with use_cache=false
+    profile: bool = False
 
 @app.post("/benchmark/start")
 async def start_benchmark(
     audio_files: List[UploadFile] = File(description="Audio files to benchmark"),
     truth_files: List[UploadFile] = File(description="Ground truth transcript files"),
-    config: str = Form(...)
+    config: str = Form(...),
+    x_profile_token: Optional[str] = Header(None)
 ):
     """Start a new benchmark process"""
     try:
@@ -294,49 +777,49 @@ async def start_benchmark(
         if len(audio_files) != len(truth_files):
             raise ValueError("Number of audio files must match number of truth files")
         
-        # Ensure temp directory exists
+        # Ensure temp directory exists. Other runs (possibly in other worker
+        # processes) spool into their own subdirectories, so nothing is swept here.
         os.makedirs(benchmark_processor.temp_dir, exist_ok=True)
         
-        # Clean up any existing files in temp directory
-        try:
-            for filename in os.listdir(benchmark_processor.temp_dir):
-                file_path = os.path.join(benchmark_processor.temp_dir, filename)
-                try:
-                    if os.path.isfile(file_path):
-                        os.unlink(file_path)
-                except Exception as e:
-                    logger.warning(f"Error deleting {file_path}: {e}")
-        except Exception as e:
-            logger.warning(f"Error cleaning temp directory: {e}")
-        
-        # Read all file contents immediately
-        file_contents = []
-        for audio_file, truth_file in zip(audio_files, truth_files):
-            logger.info(f"Reading file contents for {audio_file.filename}")
-            audio_content = await audio_file.read()
-            truth_content = await truth_file.read()
-            file_contents.append({
-                "audio": {
-                    "filename": audio_file.filename,
-                    "content": audio_content
-                },
-                "truth": {
-                    "filename": truth_file.filename,
-                    "content": truth_content
-                }
-            })
-        
         config_dict = json.loads(config)
         logger.info(f"Received benchmark config: {config_dict}")
         config_model = BenchmarkRequest(**config_dict)
         config_dict = config_model.dict()
+        if config_model.profile:
+            profile_access(x_profile_token)
+        
+        # Stream audio to a per-run spool directory; the run references files
+        # by path and deletes each one once it has been processed
+        spool_dir = os.path.join(benchmark_processor.temp_dir, f"upload_{uuid4().hex}")
+        os.makedirs(spool_dir)
+        file_contents = []
+        try:
+            for index, (audio_file, truth_file) in enumerate(zip(audio_files, truth_files)):
+                logger.info(f"Spooling {audio_file.filename}")
+                audio_path = os.path.join(spool_dir, f"{index:05d}_{os.path.basename(audio_file.filename)}")
+                await spool_upload(audio_file, audio_path)
+                file_contents.append({
+                    "audio": {
+                        "filename": audio_file.filename,
+                        "path": audio_path
+                    },
+                    "truth": {
+                        "filename": truth_file.filename,
+                        "content": await truth_file.read()
+                    }
+                })
+        except Exception:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
         
         logger.info("Starting benchmark process...")
         benchmark_id = await benchmark_processor.start_benchmark(
-            file_contents, config_dict
+            file_contents, config_dict, spool_dir=spool_dir, priority=config_model.priority
         )
         logger.info(f"Benchmark started with ID: {benchmark_id}")
         return {"success": True, "benchmark_id": benchmark_id}
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=422, detail=str(e))
@@ -346,22 +829,207 @@ async def start_benchmark(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/benchmark/status/{benchmark_id}")
-async def get_benchmark_status(benchmark_id: str):
-    """Get status of a benchmark process"""
+async def get_benchmark_status(benchmark_id: str, include_results: bool = False):
+    """Status, progress and running metrics of a benchmark; include_results=true returns the full run"""
+    try:
+        await benchmark_processor.ensure_loaded(benchmark_id)
+        if include_results:
+            return benchmark_processor.get_status(benchmark_id)
+        return benchmark_processor.get_summary(benchmark_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Benchmark not found")
+
+def _accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+@app.get("/benchmark/results/{benchmark_id}")
+async def get_benchmark_results(
+    request: Request,
+    benchmark_id: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(100, ge=1),
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    label: Optional[str] = None,
+    output: Literal["json", "ndjson"] = Query("json", alias="format")
+):
+    """A page of per-file results.
+
+    fields is a comma-separated projection (dotted names such as
+    transcription.text or error_analysis.cer reach into nested objects).
+    format=ndjson streams one result per line. Responses are gzipped when
+    the client accepts it.
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
     try:
-        return benchmark_processor.get_status(benchmark_id)
+        await benchmark_processor.ensure_loaded(benchmark_id)
+        page = benchmark_processor.get_results(
+            benchmark_id, offset=offset, limit=limit, fields=field_list, status=status, label=label
+        )
     except KeyError:
         raise HTTPException(status_code=404, detail="Benchmark not found")
+    gzipped = _accepts_gzip(request)
+    headers = {"X-Total-Count": str(page["total"])}
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    headers["Vary"] = "Accept-Encoding"
+    
+    if output == "ndjson":
+        def lines():
+            compressor = zlib.compressobj(wbits=31) if gzipped else None
+            for result in page["results"]:
+                line = (json.dumps(result) + "\n").encode("utf-8")
+                chunk = compressor.compress(line) if compressor else line
+                if chunk:
+                    yield chunk
+            if compressor:
+                yield compressor.flush()
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+    
+    body = json.dumps(page).encode("utf-8")
+    if gzipped:
+        body = gzip.compress(body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+@app.get("/benchmark/events/{benchmark_id}")
+async def benchmark_events(benchmark_id: str):
+    """Server-sent progress events: a snapshot, then file_started/file_finished until run_finished"""
+    try:
+        await benchmark_processor.ensure_loaded(benchmark_id)
+        queue = benchmark_processor.subscribe(benchmark_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Benchmark not found")
+    
+    async def stream():
+        try:
+            snapshot = benchmark_processor.progress_snapshot(benchmark_id)
+            yield _sse(snapshot)
+            if snapshot["status"] not in SSE_LIVE_STATUSES:
+                yield _sse({**snapshot, "event": "run_finished"})
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream; also ends it if the run died silently
+                    snapshot = benchmark_processor.progress_snapshot(benchmark_id)
+                    if snapshot["status"] in SSE_LIVE_STATUSES:
+                        yield ": keep-alive\n\n"
+                        continue
+                    event = {**snapshot, "event": "run_finished"}
+                yield _sse(event)
+                if event["event"] == "run_finished":
+                    return
+        finally:
+            benchmark_processor.unsubscribe(benchmark_id, queue)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/benchmark/stop")
 async def stop_benchmark(benchmark_id: str = Form(...)):
-    """Stop a running benchmark process"""
+    """Stop a queued or running benchmark process"""
     try:
-        benchmark_processor.stop_benchmark(benchmark_id)
+        await benchmark_processor.stop_benchmark(benchmark_id)
         return {"success": True}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Benchmark not found")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/benchmark/resume")
+async def resume_benchmark(benchmark_id: str = Form(...), priority: Optional[int] = Form(None)):
+    """Queue an interrupted benchmark again; files it already finished are not rerun"""
+    try:
+        await benchmark_processor.resume_benchmark(benchmark_id, priority=priority)
+        return {"success": True, "benchmark_id": benchmark_id}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="No checkpoint found for this benchmark")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/benchmark/resumable")
+async def list_resumable_benchmarks():
+    """Interrupted benchmark runs whose checkpoints can be resumed"""
+    return await asyncio.get_running_loop().run_in_executor(None, benchmark_processor.resumable_runs)
+
+def _history_filters(model_id, file, label, run_id, since, until, status, last_runs) -> dict:
+    """Query-string filters for the benchmark store; status=all includes failed files"""
+    return {
+        "model_id": model_id, "file": file, "label": label, "run_id": run_id,
+        "since": since, "until": until, "status": None if status == "all" else status,
+        "last_runs": last_runs,
+    }
+
+@app.get("/benchmark/runs")
+async def list_benchmark_runs(limit: int = 50, offset: int = 0, model_id: Optional[str] = None):
+    """Archived benchmark runs, newest first"""
+    return await asyncio.get_running_loop().run_in_executor(
+        None, lambda: benchmark_processor.store.list_runs(limit=limit, offset=offset, model_id=model_id)
+    )
+
+@app.get("/benchmark/runs/{run_id}")
+async def get_benchmark_run(run_id: str):
+    """One archived run with all of its file results"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, benchmark_processor.store.get_run, run_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Benchmark not found")
+
+@app.get("/benchmark/history")
+async def benchmark_history(
+    model_id: Optional[str] = None,
+    file: Optional[str] = None,
+    label: Optional[str] = None,
+    run_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    status: str = "completed",
+    last_runs: Optional[int] = None,
+    sort: str = "run_date",
+    descending: bool = True,
+    include_text: bool = False,
+    limit: int = 100,
+    offset: int = 0
+):
+    """Per-file results across archived runs, e.g. one model on one file over the last N runs"""
+    filters = _history_filters(model_id, file, label, run_id, since, until, status, last_runs)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: benchmark_processor.store.query_results(
+                limit=limit, offset=offset, sort=sort, descending=descending,
+                include_text=include_text, **filters
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/benchmark/history/aggregate")
+async def benchmark_history_aggregate(
+    group_by: str = "model_id",
+    model_id: Optional[str] = None,
+    file: Optional[str] = None,
+    label: Optional[str] = None,
+    run_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    status: str = "completed",
+    last_runs: Optional[int] = None
+):
+    """Mean and corpus WER/CER and latency across archived runs, grouped by comma-separated columns"""
+    filters = _history_filters(model_id, file, label, run_id, since, until, status, last_runs)
+    columns = [column.strip() for column in group_by.split(",") if column.strip()]
+    try:
+        groups = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: benchmark_processor.store.aggregate(columns, **filters)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"group_by": columns, "groups": groups}
+
 @app.get("/languages")
 async def get_languages():
     """Return list of supported languages"""
@@ -375,6 +1043,7 @@ async def get_languages():
 async def create_excel(data: List[dict]):
     """Create and return an Excel file from the provided data"""
     try:
+        import pandas as pd  # loaded on the first export, not at startup
         df = pd.DataFrame(data)
         output = BytesIO()
         df.to_excel(output, index=False)
@@ -0,0 +1,165 @@
+"""Local snapshots of model repositories for fast cold starts.
+
+Models are resolved once from the Hugging Face Hub into a plain directory
+per model (configs, tokenizer files and safetensors weights only) and
+marked complete. After that a load never talks to the Hub: the pipeline
+is built from the directory, and safetensors weights are memory-mapped,
+so replicas on the same host share the page cache and a restart or a
+switch back to a cached model reads pages rather than deserializing a
+checkpoint. Pre-resolve the models of models.json at image build or in
+an init container with
+
+    python -m asr_abtest.snapshots --models-json models.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = "model_snapshots"
+
+# Written last, so a directory with it holds a complete snapshot
+COMPLETE_MARKER = ".snapshot-complete"
+
+# Everything a pipeline needs except weights; weights come as safetensors
+# when the repository has them and as PyTorch pickles otherwise
+_METADATA_PATTERNS = ["*.json", "*.txt", "*.model", "*.tiktoken"]
+_SAFETENSORS_PATTERNS = ["*.safetensors", "*.safetensors.index.json"]
+_PICKLE_PATTERNS = ["pytorch_model*.bin", "pytorch_model*.bin.index.json"]
+
+
+def _has_safetensors(path: str) -> bool:
+    return any(name.endswith(".safetensors") for name in os.listdir(path))
+
+
+class SnapshotStore:
+    """Directory of resolved model snapshots, one subdirectory per model id.
+
+    With ``offline`` set, models that aren't in the store yet fail instead
+    of being downloaded. Model ids that are already local directories are
+    used as they are.
+    """
+
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR, offline: bool = False):
+        self.root = root
+        self.offline = offline
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def configure(self, root: str, offline: bool = False) -> None:
+        self.root = root
+        self.offline = offline
+
+    def path(self, model_id: str) -> str:
+        return os.path.join(self.root, model_id.replace("/", "--"))
+
+    def is_complete(self, model_id: str) -> bool:
+        return os.path.isfile(os.path.join(self.path(model_id), COMPLETE_MARKER))
+
+    def _lock(self, model_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(model_id, threading.Lock())
+
+    def resolve(self, model_id: str) -> str:
+        """Local directory holding model_id, downloading the snapshot on first use"""
+        if os.path.isdir(model_id):
+            return model_id
+        path = self.path(model_id)
+        if self.is_complete(model_id):
+            return path
+        with self._lock(model_id):
+            if self.is_complete(model_id):
+                return path
+            if self.offline:
+                raise ValueError(f"Model {model_id} has no local snapshot in {self.root} and downloads are off")
+            from huggingface_hub import snapshot_download
+            started = time.perf_counter()
+            os.makedirs(path, exist_ok=True)
+            snapshot_download(model_id, local_dir=path, allow_patterns=_METADATA_PATTERNS + _SAFETENSORS_PATTERNS)
+            if not _has_safetensors(path):
+                logger.warning(f"{model_id} has no safetensors weights; its snapshot holds pickled weights "
+                               f"that are deserialized on every load")
+                snapshot_download(model_id, local_dir=path, allow_patterns=_PICKLE_PATTERNS)
+            with open(os.path.join(path, COMPLETE_MARKER), "w") as f:
+                f.write(json.dumps({"model_id": model_id, "resolved_at": time.time()}))
+            logger.info(f"Resolved {model_id} into {path} in {time.perf_counter() - started:.1f}s")
+        return path
+
+    def uses_safetensors(self, model_id: str) -> bool:
+        path = model_id if os.path.isdir(model_id) else self.path(model_id)
+        return os.path.isdir(path) and _has_safetensors(path)
+
+    def list(self) -> List[Dict]:
+        """The complete snapshots in the store with their size on disk"""
+        if not os.path.isdir(self.root):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            marker = os.path.join(path, COMPLETE_MARKER)
+            if not os.path.isfile(marker):
+                continue
+            with open(marker) as f:
+                model_id = json.load(f).get("model_id", name)
+            size = sum(os.path.getsize(os.path.join(directory, file))
+                       for directory, _, files in os.walk(path) for file in files)
+            snapshots.append({
+                "model_id": model_id,
+                "path": path,
+                "size_mb": round(size / (1024 * 1024), 1),
+                "safetensors": _has_safetensors(path),
+            })
+        return snapshots
+
+
+# --snapshot-dir and --offline-models; the server applies them in its process-executor
+# workers too, and the benchmark CLI in each of its worker processes.
+snapshots = SnapshotStore()
+
+
+def prefetch(model_ids: List[str], store: Optional[SnapshotStore] = None) -> Dict[str, str]:
+    """Resolve every model id; returns model id -> error for the ones that failed"""
+    store = store or snapshots
+    failed = {}
+    for model_id in model_ids:
+        try:
+            store.resolve(model_id)
+        except Exception as e:
+            failed[model_id] = str(e)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve models into local snapshots for fast cold starts')
+    parser.add_argument('--models-json', type=str, default="models.json",
+                        help='JSON file with a "model_id" list of models to resolve')
+    parser.add_argument('--model', type=str, action='append', default=None,
+                        help='Model to resolve instead of the models.json list; repeat for several')
+    parser.add_argument('--snapshot-dir', type=str, default=DEFAULT_SNAPSHOT_DIR,
+                        help='Directory the snapshots are written to')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    model_ids = args.model
+    if not model_ids:
+        with open(args.models_json) as f:
+            model_ids = json.load(f)["model_id"]
+    snapshots.configure(args.snapshot_dir)
+    failed = prefetch(model_ids)
+    for model_id, error in failed.items():
+        print(f"FAIL {model_id}: {error}")
+    for snapshot in snapshots.list():
+        print(f"{snapshot['model_id']:<45} {snapshot['size_mb']:>9.1f} MB"
+              f"{'' if snapshot['safetensors'] else '  (no safetensors)'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,6 @@ import requests
 from datetime import datetime
 from pathlib import Path
 import wave
-from asr_abtest.benchmark.batch_runner import BatchRunner
 from asr_abtest.benchmark.results import BenchmarkResults
 import argparse
 
@@ -228,9 +227,18 @@ def serve_result(filename):
         print(f"Error serving result file: {e}")
         return jsonify({'error': str(e)}), 404
 
-batch_runner = BatchRunner()
 benchmark_results = BenchmarkResults()
 
+# Built on the first benchmark request: it pulls in the inference stack
+batch_runner = None
+
+def get_batch_runner():
+    global batch_runner
+    if batch_runner is None:
+        from asr_abtest.benchmark.batch_runner import BatchRunner
+        batch_runner = BatchRunner()
+    return batch_runner
+
 @app.route('/benchmark/process', methods=['POST'])
 async def process_benchmark():
     try:
@@ -251,7 +259,7 @@ async def process_benchmark():
             })
         
         model_id = request.form['model_id']
-        results = await batch_runner.run_batch(files, model_id)
+        results = await get_batch_runner().run_batch(files, model_id)
         
         # Save results
         results_file = benchmark_results.save_results(results)
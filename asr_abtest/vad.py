@@ -0,0 +1,162 @@
+"""Energy-based voice activity detection ahead of inference.
+
+Frames whose energy is well above the recording's own noise floor count as
+speech. Speech regions are padded, joined with short silent gaps into one
+compacted recording that is transcribed instead of the original, and word
+timestamps are mapped back to original-audio time afterwards. Long silences
+then cost no encoder or decoder time. Steady loud non-speech (hold music)
+is not reliably detected by energy alone and is kept.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio import SAMPLING_RATE
+
+
+def speech_segments(audio: np.ndarray, sampling_rate: int = SAMPLING_RATE,
+                    frame_ms: float = 30.0, margin_db: float = 12.0, floor_db: float = -50.0,
+                    min_speech_ms: float = 250.0, min_silence_ms: float = 300.0,
+                    pad_ms: float = 200.0) -> List[Tuple[int, int]]:
+    """(start, end) sample offsets of the speech regions in audio.
+
+    A frame is speech when its energy is margin_db above the 10th percentile
+    frame energy (the noise floor) and above floor_db dBFS. Pauses shorter
+    than min_silence_ms are bridged, regions shorter than min_speech_ms are
+    dropped and the rest are padded by pad_ms on both sides.
+    """
+    frame = max(1, int(sampling_rate * frame_ms / 1000))
+    count = len(audio) // frame
+    if count == 0:
+        return [(0, len(audio))] if len(audio) else []
+    frames = audio[:count * frame].reshape(count, frame).astype(np.float64)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+    # Continuous speech has no quiet floor; don't let the threshold climb above it
+    threshold = max(floor_db, min(np.percentile(energy_db, 10) + margin_db, energy_db.max() - margin_db))
+    voiced = energy_db > threshold
+
+    # Runs of voiced frames as [start, end) frame indices
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    runs = list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+    min_silence = min_silence_ms / frame_ms
+    merged: List[List[int]] = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    min_speech = min_speech_ms / frame_ms
+    pad = int(sampling_rate * pad_ms / 1000)
+    segments: List[Tuple[int, int]] = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start, end = max(0, start * frame - pad), min(len(audio), end * frame + pad)
+        if segments and start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def compact(audio: np.ndarray, segments: List[Tuple[int, int]], sampling_rate: int = SAMPLING_RATE,
+            gap_ms: float = 200.0) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Join the speech segments with short silent gaps.
+
+    Returns the compacted audio and the layout restore_timestamps needs to
+    map times in it back onto the original recording.
+    """
+    gap = np.zeros(int(sampling_rate * gap_ms / 1000), dtype=audio.dtype)
+    pieces, compact_starts = [], []
+    position = 0
+    for index, (start, end) in enumerate(segments):
+        if index:
+            pieces.append(gap)
+            position += len(gap)
+        compact_starts.append(int(position))
+        pieces.append(audio[start:end])
+        position += end - start
+    compacted = np.concatenate(pieces) if pieces else np.zeros(0, dtype=audio.dtype)
+    layout = {
+        "sampling_rate": sampling_rate,
+        "segments": [(int(start), int(end)) for start, end in segments],
+        "compact_starts": compact_starts,
+        "original_sec": float(len(audio) / sampling_rate),
+        "speech_sec": float(sum(end - start for start, end in segments) / sampling_rate),
+    }
+    return compacted, layout
+
+
+def _to_original(seconds: Optional[float], layout: Dict[str, Any]) -> Optional[float]:
+    if seconds is None:
+        return None
+    sampling_rate = layout["sampling_rate"]
+    position = seconds * sampling_rate
+    starts = layout["compact_starts"]
+    index = max(0, int(np.searchsorted(starts, position, side="right")) - 1)
+    start, end = layout["segments"][index]
+    # Times inside a gap snap to the end of the segment before it
+    return (start + min(max(position - starts[index], 0), end - start)) / sampling_rate
+
+
+def restore_timestamps(result: Dict, layout: Dict[str, Any]) -> Dict:
+    """A pipeline result on compacted audio with word times moved back to original-audio time"""
+    if not layout["segments"] or "chunks" not in result:
+        return result
+    chunks = []
+    for chunk in result["chunks"]:
+        start, end = chunk["timestamp"]
+        chunks.append({**chunk, "timestamp": (_to_original(start, layout), _to_original(end, layout))})
+    return {**result, "chunks": chunks}
+
+
+def apply_vad(audio: np.ndarray, params: Dict[str, Any],
+              sampling_rate: int = SAMPLING_RATE) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """speech_segments + compact with the settings from VadSettings.params"""
+    segments = speech_segments(audio, sampling_rate, **{k: v for k, v in params.items() if k != "gap_ms"})
+    return compact(audio, segments, sampling_rate, params.get("gap_ms", 200.0))
+
+
+NO_SPEECH_RESULT = {"text": "", "chunks": []}
+
+
+class VadSettings:
+    """Whether recordings are trimmed to their speech before inference, and how.
+
+    ``enabled`` is the default for requests and benchmark runs that don't
+    say; both can turn VAD on or off for themselves.
+    """
+
+    def __init__(self,
+                 enabled: bool = False,
+                 margin_db: float = 12.0,
+                 min_silence_ms: float = 300.0,
+                 pad_ms: float = 200.0):
+        self.enabled = enabled
+        self.margin_db = margin_db
+        self.min_silence_ms = min_silence_ms
+        self.pad_ms = pad_ms
+
+    def configure(self, enabled: bool, margin_db: float, min_silence_ms: float, pad_ms: float) -> None:
+        self.enabled = enabled
+        self.margin_db = margin_db
+        self.min_silence_ms = min_silence_ms
+        self.pad_ms = pad_ms
+
+    def params(self, requested: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+        """apply_vad settings, or None when VAD is off for this recording"""
+        if not (self.enabled if requested is None else requested):
+            return None
+        return {"margin_db": self.margin_db, "min_silence_ms": self.min_silence_ms, "pad_ms": self.pad_ms}
+
+
+def cache_kwargs(generate_kwargs: Dict, params: Optional[Dict]) -> Dict:
+    """Options to key a cached result on; results on trimmed audio differ"""
+    return {**generate_kwargs, "vad": params} if params else generate_kwargs
+
+
+# Server defaults from --vad and --vad-*; a request or benchmark config can switch VAD per call.
+# params() is resolved in the calling process, so process-executor workers never read this.
+vad = VadSettings()